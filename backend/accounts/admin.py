@@ -8,8 +8,8 @@ from .models import User
 class UserAdmin(BaseUserAdmin):
     """Admin configuration for User model."""
 
-    list_display = ["email", "is_staff", "is_active", "created_at"]
-    list_filter = ["is_staff", "is_active", "created_at"]
+    list_display = ["email", "is_staff", "is_active", "shard", "created_at"]
+    list_filter = ["is_staff", "is_active", "shard", "created_at"]
     search_fields = ["email"]
     ordering = ["-created_at"]
 
@@ -17,9 +17,10 @@ class UserAdmin(BaseUserAdmin):
         (None, {"fields": ("email", "password")}),
         ("Permissions", {"fields": ("is_active", "is_staff", "is_superuser")}),
         ("Important dates", {"fields": ("last_login", "created_at", "updated_at")}),
+        ("Storage", {"fields": ("shard",)}),
     )
 
-    readonly_fields = ["created_at", "updated_at", "last_login"]
+    readonly_fields = ["shard", "created_at", "updated_at", "last_login"]
 
     add_fieldsets = (
         (
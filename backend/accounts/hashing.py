@@ -0,0 +1,81 @@
+"""
+Bounded executor for password hashing.
+
+Argon2 is deliberately slow and memory-hungry. Running it on request threads
+lets a burst of logins occupy every worker; here it runs on a fixed number of
+threads (argon2-cffi releases the GIL while hashing), with at most
+PASSWORD_HASHING_QUEUE calls waiting. Callers beyond that get HashingBusy
+straight away, which the views turn into 503 with Retry-After.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class HashingBusy(Exception):
+    """Every hashing thread is busy and the queue is full."""
+
+
+class HashingPool:
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on a hashing thread; raises HashingBusy when over capacity."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise HashingBusy
+            self._pending += 1
+        try:
+            call = functools.partial(_run_with_connections, func, *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def _run_with_connections(func, *args, **kwargs):
+    # authenticate() and rehash-on-login query the database from the hashing thread.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process-wide hashing pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+    return _pool
+
+
+def reset_hashing_pool():
+    """Drop the pool so the next call builds one from the current settings."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
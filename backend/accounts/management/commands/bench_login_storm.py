@@ -0,0 +1,97 @@
+import logging
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.hashing import reset_hashing_pool
+from notes.bench import BENCH_PASSWORD, create_categories, create_user, isolated_database, percentile, seed_notes
+
+
+class Command(BaseCommand):
+    """Management command measuring note-list latency while many clients log in at once."""
+
+    help = "Benchmark notes latency during a concurrent login storm, with a bounded and an unbounded hashing pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=16, help="Concurrent clients logging in repeatedly.")
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each phase.")
+        parser.add_argument("--workers", type=int, default=1, help="Hashing threads in the bounded phase.")
+        parser.add_argument("--queue", type=int, default=4, help="Hashing queue size in the bounded phase.")
+
+    def handle(self, *args, **options):
+        """Run a quiet phase, then the storm with an unbounded and a bounded hashing pool."""
+        # Every rejected login would otherwise log a "Service Unavailable" line.
+        logging.getLogger("django.request").setLevel(logging.ERROR)
+        logins = options["logins"]
+        phases = [
+            ("no logins", 0, logins, 0),
+            (f"storm, unbounded pool ({logins} threads)", logins, logins, logins),
+            (f"storm, bounded pool ({options['workers']} + {options['queue']} queued)", logins,
+             options["workers"], options["queue"]),
+        ]
+        with tempfile.TemporaryDirectory() as directory, isolated_database(test_name=str(Path(directory) / "bench.db")):
+            categories = create_categories()
+            reader = create_user(0)
+            seed_notes(reader, categories, 200, random.Random(1))
+            users = [create_user(index) for index in range(1, logins + 1)]
+
+            for label, storm, workers, queue in phases:
+                with override_settings(
+                    PASSWORD_HASHING_WORKERS=workers,
+                    PASSWORD_HASHING_QUEUE=queue,
+                    METRICS_QUERY_BUDGET=0,
+                    METRICS_LATENCY_BUDGET_MS=0,
+                    THROTTLE_ENABLED=False,
+                    LOAD_SHEDDING_ENABLED=False,
+                ):
+                    reset_hashing_pool()
+                    latencies, statuses = self.run_phase(reader, users[:storm], options["seconds"])
+                self.stdout.write(
+                    f"{label:<45} note list p50 {statistics.median(latencies):7.1f} ms, "
+                    f"p95 {percentile(latencies, 95):7.1f} ms, p99 {percentile(latencies, 99):7.1f} ms; "
+                    f"logins {dict(statuses) or '-'}"
+                )
+            reset_hashing_pool()
+
+    def run_phase(self, reader, users, seconds):
+        stop = threading.Event()
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def log_in_repeatedly(user):
+            client = Client()
+            while not stop.is_set():
+                response = client.post(
+                    reverse("accounts:login"),
+                    {"email": user.email, "password": BENCH_PASSWORD},
+                    content_type="application/json",
+                )
+                with lock:
+                    statuses[response.status_code] += 1
+                if response.status_code == 503:
+                    time.sleep(0.05)
+
+        threads = [threading.Thread(target=log_in_repeatedly, args=(user,), daemon=True) for user in users]
+        for thread in threads:
+            thread.start()
+
+        client = Client()
+        client.force_login(reader)
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            client.get(reverse("notes:note-list"))
+            latencies.append((time.perf_counter() - start) * 1000)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return latencies, statuses
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def user_cache_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+def get_cached_user(request):
+    """
+    Return the session's user from the cache, falling back to auth.get_user()
+    (and caching its result) on a miss. The session auth hash is checked on
+    every hit, so a password change still logs other sessions out. With
+    sharding, the user's shard is re-read on every hit.
+    """
+    user_id = request.session.get(auth.SESSION_KEY)
+    backend_path = request.session.get(auth.BACKEND_SESSION_KEY)
+    if user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is not None:
+        session_hash = request.session.get(auth.HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            user.backend = backend_path
+            if not settings.NOTES_SHARDS:
+                return user
+            # Another process may have moved the user's notes since this copy was cached (and a
+            # per-process cache is not told), so the shard is always read from the directory row.
+            shard = type(user).objects.filter(pk=user.pk).values_list("shard", flat=True).first()
+            if shard is not None:
+                user.shard = shard
+                return user
+        # Let Django handle fallback secrets or log the session out.
+        cache.delete(key)
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that serves request.user from the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds (0 disables it). Entries are dropped when
+    the user is saved or deleted and on logout (see accounts.signals).
+    """
+
+    def process_request(self, request):
+        if not settings.AUTH_USER_CACHE_TIMEOUT:
+            return super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
@@ -2,6 +2,8 @@ import uuid
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 
+from notes_project.routers import assign_shard
+
 
 class UserManager(BaseUserManager):
     """Custom user manager for email-based authentication."""
@@ -36,6 +38,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True, max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Database alias holding the user's notes; empty for "default" (see notes_project.routers).
+    shard = models.CharField(max_length=32, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -51,3 +55,9 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.email
+
+    def save(self, *args, **kwargs):
+        """Place a new user on a shard before it is first saved."""
+        if self._state.adding and not self.shard:
+            self.shard = assign_shard(self.id)
+        super().save(*args, **kwargs)
@@ -1,11 +1,12 @@
-from django.contrib.auth import authenticate
 from rest_framework import serializers
 
+from notes_project.metrics import TimedSerializerMixin
+
 from .models import User
 from .validators import validate_password_strength
 
 
-class UserSignUpSerializer(serializers.ModelSerializer):
+class UserSignUpSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for user registration."""
 
     password = serializers.CharField(write_only=True, style={"input_type": "password"})
@@ -30,30 +31,13 @@ class UserSignUpSerializer(serializers.ModelSerializer):
 
 
 class UserLoginSerializer(serializers.Serializer):
-    """Serializer for user login."""
+    """Serializer for login credentials; login_view checks them on the hashing pool."""
 
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True, style={"input_type": "password"})
 
-    def validate(self, data):
-        """Validate user credentials."""
-        email = data.get("email")
-        password = data.get("password")
-
-        if email and password:
-            user = authenticate(username=email, password=password)
-            if not user:
-                raise serializers.ValidationError("Invalid email or password.")
-            if not user.is_active:
-                raise serializers.ValidationError("User account is disabled.")
-        else:
-            raise serializers.ValidationError("Must include email and password.")
-
-        data["user"] = user
-        return data
-
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for user data."""
 
     class Meta:
@@ -1,3 +1,38 @@
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .models import User
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db", AUTH_USER_CACHE_TIMEOUT=60)
+class CachedAuthenticationTests(TestCase):
+    """Session and user lookups served from the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="cached@example.com", password="Passw0rd")
+        self.client.force_login(self.user)
+
+    def test_warm_request_skips_auth_queries(self):
+        url = reverse("accounts:current-user")
+        self.client.get(url)
+        # With sharding, only the user's shard is read from the directory.
+        with self.assertNumQueries(1 if settings.NOTES_SHARDS else 0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["email"], "cached@example.com")
+
+    def test_user_save_invalidates_cache(self):
+        url = reverse("accounts:current-user")
+        self.client.get(url)
+        self.user.email = "renamed@example.com"
+        self.user.save()
+        self.assertEqual(self.client.get(url).json()["email"], "renamed@example.com")
+
+    def test_password_change_logs_out_other_sessions(self):
+        url = reverse("accounts:current-user")
+        self.client.get(url)
+        self.user.set_password("Changed1pass")
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
@@ -1,51 +1,117 @@
-from django.contrib.auth import login, logout
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, login, logout
+from django.db import IntegrityError
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.middleware.csrf import get_token
-from django.utils.decorators import method_decorator
-from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.csrf import ensure_csrf_cookie
 from rest_framework import status
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from .hashing import HashingBusy, get_hashing_pool
+from .models import User
 from .serializers import UserLoginSerializer, UserSerializer, UserSignUpSerializer
 
 
-@api_view(["POST"])
-@permission_classes([AllowAny])
-@authentication_classes([])  # Disable authentication for this view
-def signup_view(request):
-    """Register a new user. CSRF exempt - applied in urls.py"""
-    print(f"DEBUG: signup_view called")
-    print(f"DEBUG: request.data = {request.data}")
-    print(f"DEBUG: request.META['HTTP_ORIGIN'] = {request.META.get('HTTP_ORIGIN', 'None')}")
-    
-    serializer = UserSignUpSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.save()
-        login(request, user)
-        # Set CSRF token for subsequent authenticated requests
-        get_token(request)
-        user_data = UserSerializer(user).data
-        return Response(user_data, status=status.HTTP_201_CREATED)
-    
-    print(f"DEBUG: Validation errors = {serializer.errors}")
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+def _async_post_view(view):
+    """csrf_exempt and require_POST for async views; in Django 4.2 those decorators only wrap sync views."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "POST":
+            return HttpResponseNotAllowed(["POST"])
+        return await view(request, *args, **kwargs)
 
+    wrapper.csrf_exempt = True
+    return wrapper
 
-@api_view(["POST"])
-@permission_classes([AllowAny])
-@authentication_classes([])  # Disable authentication for this view
-def login_view(request):
-    """Authenticate and log in a user. CSRF exempt - applied in urls.py"""
-    serializer = UserLoginSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.validated_data["user"]
-        login(request, user)
-        # Set CSRF token for subsequent authenticated requests
-        get_token(request)
-        user_data = UserSerializer(user).data
-        return Response(user_data, status=status.HTTP_200_OK)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _hashing_busy_response():
+    response = JsonResponse(
+        {"detail": "Too many sign-ins in progress. Please retry shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response["Retry-After"] = str(settings.PASSWORD_HASHING_RETRY_AFTER)
+    return response
+
+
+@_async_post_view
+async def signup_view(request):
+    """
+    Register a new user. Async: the password is hashed on the bounded hashing
+    pool (see accounts.hashing), so the worker is not held during hashing.
+    """
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({"detail": "Malformed JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = UserSignUpSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    user = User(email=User.objects.normalize_email(serializer.validated_data["email"]))
+    try:
+        await get_hashing_pool().run(user.set_password, serializer.validated_data["password"])
+    except HashingBusy:
+        return _hashing_busy_response()
+    try:
+        await user.asave()
+    except IntegrityError:
+        return JsonResponse(
+            {"email": ["user with this email already exists."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    await sync_to_async(login)(request, user)
+    # Set CSRF token for subsequent authenticated requests
+    get_token(request)
+    return JsonResponse(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+
+
+@_async_post_view
+async def login_view(request):
+    """
+    Authenticate and log in a user. Async: credentials are checked on the
+    bounded hashing pool, and a full pool answers 503 with Retry-After.
+    """
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({"detail": "Malformed JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = UserLoginSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user = await get_hashing_pool().run(
+            authenticate,
+            username=serializer.validated_data["email"],
+            password=serializer.validated_data["password"],
+        )
+    except HashingBusy:
+        return _hashing_busy_response()
+    if user is None:
+        return JsonResponse(
+            {"non_field_errors": ["Invalid email or password."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    await sync_to_async(login)(request, user)
+    # Set CSRF token for subsequent authenticated requests
+    get_token(request)
+    return JsonResponse(UserSerializer(user).data, status=status.HTTP_200_OK)
 
 
 @api_view(["POST"])
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Category, Note
+from .search import ADMIN_MAX_RESULTS, get_search_backend
 
 
 @admin.register(Category)
@@ -19,7 +20,7 @@ class NoteAdmin(admin.ModelAdmin):
 
     list_display = ["title", "user", "category", "last_edited_at", "created_at"]
     list_filter = ["category", "created_at", "last_edited_at"]
-    search_fields = ["title", "content", "user__email"]
+    search_fields = ["user__email"]
     readonly_fields = ["created_at", "updated_at", "last_edited_at"]
     ordering = ["-last_edited_at"]
 
@@ -27,3 +28,12 @@ class NoteAdmin(admin.ModelAdmin):
         (None, {"fields": ("user", "category", "title", "content")}),
         ("Timestamps", {"fields": ("created_at", "updated_at", "last_edited_at")}),
     )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Match titles and content through the full-text index, and owner emails as before."""
+        email_matches, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return email_matches, may_have_duplicates
+        hits = get_search_backend().search(search_term, limit=ADMIN_MAX_RESULTS)
+        text_matches = queryset.filter(id__in=[hit.note_id for hit in hits])
+        return email_matches | text_matches, may_have_duplicates
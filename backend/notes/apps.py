@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class NotesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notes'
+
+    def ready(self):
+        from notes_project.metrics import registry
+
+        from . import signals  # noqa: F401
+        from .writebehind import collect_metrics
+
+        registry.register_collector(collect_metrics)
@@ -0,0 +1,329 @@
+"""
+Async versions of the category, note list, detail, create and update endpoints.
+
+Enabled with NOTES_ASYNC_VIEWS=True for ASGI deployments (see notes/urls.py).
+They answer exactly like the DRF views in notes/views.py. DRF 3.14 has no
+async views, so async_api_view re-creates the pieces those views rely on:
+session authentication with CSRF checks, DRF's request parsing, JSON
+rendering and exception responses.
+
+Reads use the async ORM. Writes go through the same synchronous code as the
+sync views (serializer save, signals, transaction.atomic() patches), wrapped
+in sync_to_async: Django 4.2's async ORM has no transactions and runs
+asave() that way itself.
+
+note_events_view streams change events (see notes.events) and is served
+under ASGI whatever NOTES_ASYNC_VIEWS says.
+"""
+import asyncio
+import functools
+import uuid
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import exceptions, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from notes_project.metrics import TimedJSONRenderer
+from notes_project.renderers import dumps
+from notes_project.routers import read_from_replica
+from notes_project.throttling import AutosaveThrottle, ListThrottle
+
+from .events import get_event_broker
+from .models import Category, Note, NoteWatermark
+from .pagination import NoteCursorPagination
+from .patching import InvalidTextOperation, VersionConflict, apply_note_patch, parse_if_match
+from .registry import category_registry
+from .serializers import (
+    CategorySerializer,
+    NoteDetailSerializer,
+    NoteListSerializer,
+    NotePatchSerializer,
+    NoteVersionSerializer,
+)
+from .watermarks import watermark_etag, watermark_last_modified
+from .writebehind import get_write_buffer
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    """Render like a DRF Response with the JSON renderer."""
+    return HttpResponse(TimedJSONRenderer().render(data), status=status_code, content_type="application/json")
+
+
+def async_api_view(methods, throttle_classes=()):
+    """
+    Async counterpart of @api_view(methods) + IsAuthenticated with session auth
+    (and @throttle_classes). The view receives a DRF Request whose user is already resolved.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            response = await _respond(_authenticated(view, methods, throttle_classes), request, *args, **kwargs)
+            response["Allow"] = ", ".join(methods)
+            return response
+
+        # Like DRF, CSRF is checked only for authenticated sessions.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _authenticated(view, methods, throttle_classes):
+    async def call(request, *args, **kwargs):
+        if request.method not in methods:
+            raise exceptions.MethodNotAllowed(request.method)
+        # Session and user lookups are synchronous.
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            raise exceptions.NotAuthenticated
+        if request.method not in SAFE_METHODS:
+            SessionAuthentication().enforce_csrf(request)
+        drf_request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+        drf_request.user = request.user
+        for throttle in (throttle_class() for throttle_class in throttle_classes):
+            # Buckets live in the cache, which may be a network round trip.
+            if not await sync_to_async(throttle.allow_request)(drf_request, None):
+                raise exceptions.Throttled(throttle.wait())
+        return await view(drf_request, *args, **kwargs)
+    return call
+
+
+async def _respond(view, request, *args, **kwargs):
+    """Await the view, turning API exceptions and Http404 into responses as DRF does."""
+    try:
+        return await view(request, *args, **kwargs)
+    except Http404:
+        exc = exceptions.NotFound()
+    except exceptions.APIException as error:
+        exc = error
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    # Session authentication has no WWW-Authenticate challenge, so DRF answers 403 rather than 401.
+    status_code = status.HTTP_403_FORBIDDEN if isinstance(exc, exceptions.NotAuthenticated) else exc.status_code
+    response = render(data, status_code)
+    if getattr(exc, "wait", None):
+        response["Retry-After"] = "%d" % exc.wait
+    return response
+
+
+def async_conditional_on_watermark(view):
+    """Async counterpart of conditional_on_watermark, for views wrapped in async_api_view."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        django_request = request._request
+        django_request._note_watermark = await NoteWatermark.objects.filter(user=request.user).afirst()
+        etag = watermark_etag(django_request)
+        etag = quote_etag(etag) if etag else None
+        last_modified = watermark_last_modified(django_request)
+        last_modified = timegm(last_modified.utctimetuple()) if last_modified else None
+
+        response = get_conditional_response(django_request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await _respond(view, request, *args, **kwargs)
+        if request.method in ("GET", "HEAD"):
+            if last_modified and not response.has_header("Last-Modified"):
+                response.headers["Last-Modified"] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault("ETag", etag)
+        return response
+    return wrapper
+
+
+@read_from_replica
+@async_api_view(["GET"], throttle_classes=[ListThrottle])
+@async_conditional_on_watermark
+async def category_list_view(request):
+    """Get all categories with note counts for the current user."""
+    categories = [category async for category in Category.objects.with_note_counts(request.user)]
+    return render(CategorySerializer(categories, many=True, context={"request": request}).data)
+
+
+@read_from_replica
+@async_api_view(["GET"], throttle_classes=[ListThrottle])
+@async_conditional_on_watermark
+async def note_list_view(request):
+    """
+    Get the current user's notes, newest first, one page at a time.
+    Optional query parameters: categoryId to filter by category,
+    limit for the page size and cursor from the previous page's next link.
+    """
+    notes = Note.objects.filter(user=request.user).only(*NoteListSerializer.list_columns)
+
+    category_id = request.query_params.get("categoryId")
+    if category_id:
+        try:
+            notes = notes.filter(category_id=uuid.UUID(category_id))
+        except ValueError:
+            return render({"categoryId": ["Must be a valid UUID."]}, status.HTTP_400_BAD_REQUEST)
+
+    paginator = NoteCursorPagination()
+    page = await paginator.apaginate_queryset(notes, request)
+    buffer = get_write_buffer()
+    if buffer is not None:
+        page = [buffer.overlay(note) for note in page]
+    categories = await category_registry.asnapshot({note.category_id for note in page})
+    serializer = NoteListSerializer(page, many=True, context={"categories": categories})
+    return render({"next": paginator.get_next_link(), "results": serializer.data})
+
+
+@read_from_replica
+@async_api_view(["GET"])
+@async_conditional_on_watermark
+async def note_detail_view(request, note_id):
+    """Get full details of a specific note."""
+    note = await _aget_note(request, note_id)
+    buffer = get_write_buffer()
+    if buffer is not None:
+        buffer.overlay(note)
+    return render(await _detail_data(note))
+
+
+@async_api_view(["POST"])
+async def note_create_view(request):
+    """Create a new note."""
+    serializer = NoteDetailSerializer(data=request.data, context={"request": request})
+    if not await sync_to_async(serializer.is_valid)():
+        return render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    await sync_to_async(serializer.save)()
+    return render(await _detail_data(serializer.instance), status.HTTP_201_CREATED)
+
+
+@async_api_view(["PATCH"], throttle_classes=[AutosaveThrottle])
+async def note_update_view(request, note_id):
+    """
+    Update an existing note (partial update); see notes.views.note_update_view.
+    Text operations and flushes run the same synchronous, transactional code.
+    """
+    expected_version = parse_if_match(request.headers.get("If-Match"))
+    buffer = get_write_buffer()
+    if buffer is not None:
+        if "ops" in request.data and not request.query_params.get("flush"):
+            return await _patch_note_text(request, note_id, expected_version, buffer)
+        try:
+            await sync_to_async(buffer.flush)(note_id)
+        except VersionConflict as conflict:
+            return _version_conflict_response(conflict.current_version)
+    if "ops" in request.data:
+        return await _patch_note_text(request, note_id, expected_version)
+
+    note = await _aget_note(request, note_id)
+    if not request.data:
+        return render(await _detail_data(note))
+    if expected_version is not None and expected_version != note.version:
+        return _version_conflict_response(note.version)
+    serializer = NoteDetailSerializer(
+        note, data=request.data, partial=True, context={"request": request, "expected_version": expected_version}
+    )
+    if not await sync_to_async(serializer.is_valid)():
+        return render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    try:
+        await sync_to_async(serializer.save)()
+    except Note.DoesNotExist:
+        raise Http404
+    except VersionConflict as conflict:
+        return _version_conflict_response(conflict.current_version)
+    return render(await _detail_data(serializer.instance))
+
+
+@async_api_view(["GET"])
+async def note_events_view(request):
+    """
+    Stream the user's note changes as Server-Sent Events: note.upserted,
+    note.moved, note.deleted, counts and resync (see notes.events). Send
+    Last-Event-ID to resume after a reconnect. Needs an ASGI server; under
+    WSGI the answer is 501, and clients should reload after their own saves.
+    """
+    broker = get_event_broker()
+    if broker is None or not isinstance(request._request, ASGIRequest):
+        return render({"detail": "Change events are not available."}, status.HTTP_501_NOT_IMPLEMENTED)
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_id = None
+
+    response = StreamingHttpResponse(
+        _event_stream(broker.subscribe(request.user.pk, last_id)), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _event_stream(subscription):
+    """
+    SSE messages with keep-alive comments. Django 4.2 does not notice a client
+    going away mid-stream, so streams end after NOTES_EVENTS_MAX_AGE seconds;
+    EventSource reconnects with Last-Event-ID and misses nothing.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.NOTES_EVENTS_MAX_AGE
+    try:
+        yield b"retry: 1000\n\n"
+        while loop.time() < deadline:
+            batch = await subscription.get(min(settings.NOTES_EVENTS_HEARTBEAT, deadline - loop.time()))
+            if not batch:
+                yield b": keep-alive\n\n"
+            for event_id, event in batch:
+                yield b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event["type"].encode(), dumps(event))
+    finally:
+        subscription.close()
+
+
+async def _patch_note_text(request, note_id, expected_version, buffer=None):
+    serializer = NotePatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    version = serializer.validated_data.get("version", expected_version)
+    if version is None:
+        return render(
+            {"version": ["A note version is required, either in the body or an If-Match header."]},
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    ops = serializer.validated_data["ops"]
+    try:
+        if buffer is not None:
+            pending = await sync_to_async(buffer.apply_patch)(note_id, request.user, version, ops)
+            values = {
+                "version": pending.version,
+                "word_count": pending.word_count,
+                "char_count": pending.char_count,
+                "last_edited_at": pending.last_edited_at,
+            }
+        else:
+            values = await sync_to_async(apply_note_patch)(note_id, request.user, version, ops)
+    except Note.DoesNotExist:
+        raise Http404
+    except VersionConflict as conflict:
+        return _version_conflict_response(conflict.current_version)
+    except InvalidTextOperation as error:
+        return render({"ops": [str(error)]}, status.HTTP_400_BAD_REQUEST)
+
+    return render(NoteVersionSerializer({"id": note_id, **values}).data)
+
+
+async def _aget_note(request, note_id):
+    try:
+        return await Note.objects.aget(id=note_id, user=request.user)
+    except Note.DoesNotExist:
+        raise Http404
+
+
+async def _detail_data(note):
+    categories = await category_registry.asnapshot([note.category_id])
+    return NoteDetailSerializer(note, context={"categories": categories}).data
+
+
+def _version_conflict_response(current_version):
+    return render(
+        {"detail": "Note has been modified since this version.", "version": current_version},
+        status.HTTP_409_CONFLICT
+    )
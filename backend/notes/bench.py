@@ -0,0 +1,118 @@
+"""
+Helpers shared by the bench_* management commands.
+
+Benchmarks run against a throwaway test database created for the run, so
+they never read or write real data.
+"""
+import math
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from accounts.models import User
+
+from .bulk import apply_operations, max_batch_size
+from .models import Category
+
+DEFAULT_CATEGORIES = [
+    {"name": "Random Thoughts", "color": "#78aba8", "sort_order": 1},
+    {"name": "School", "color": "#a8a378", "sort_order": 2},
+    {"name": "Personal", "color": "#a878ab", "sort_order": 3},
+]
+
+BENCH_PASSWORD = "BenchPassw0rd"
+
+WORDS = (
+    "the a of to and in is it for on that with as was be this by are from at or an not have but all we can "
+    "lecture exam notes idea meeting plan grocery list project deadline reading chapter draft call remember "
+    "weekend trip budget recipe book movie workout review question answer summary thought tomorrow"
+).split()
+
+
+@contextmanager
+def isolated_database(verbosity=0, test_name=None):
+    """
+    Create fresh test databases for the duration of a benchmark. test_name puts
+    the SQLite test database in that file instead of memory, which threaded
+    benchmarks need: writers to a shared in-memory database fail instead of waiting.
+    """
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_name = test_settings.get("NAME")
+    if test_name:
+        test_settings["NAME"] = test_name
+    setup_test_environment()
+    # Nothing is rolled back by reloading a serialized copy, so skip making one.
+    old_config = setup_databases(verbosity=verbosity, interactive=False, serialized_aliases=set())
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+        test_settings["NAME"] = old_name
+
+
+def create_categories():
+    """Create the populate_categories defaults and return them."""
+    return [Category.objects.create(**data) for data in DEFAULT_CATEGORIES]
+
+
+def create_user(index=0):
+    return User.objects.create_user(email=f"bench{index}@example.com", password=BENCH_PASSWORD)
+
+
+@contextmanager
+def measure():
+    """Measure wall time and queries of a block: `with measure() as result: ...`."""
+    result = {}
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        yield result
+        result["seconds"] = time.perf_counter() - start
+    result["queries"] = len(queries)
+
+
+def random_content(rng):
+    """
+    Note text with a long-tailed length: mostly a few sentences, some empty,
+    occasionally several thousand characters (log-normal, median ~300 chars).
+    """
+    if rng.random() < 0.05:
+        return ""
+    target = min(int(rng.lognormvariate(math.log(300), 1.2)), 50000)
+    words, length = [], 0
+    while length < target:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def seed_notes(user, categories, count, rng):
+    """Create `count` notes for the user through the bulk path, spread across the categories."""
+    operations = [
+        {
+            "op": "create",
+            "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))).capitalize(),
+            "content": random_content(rng),
+            "category": str(rng.choice(categories).id),
+        }
+        for _ in range(count)
+    ]
+    notes = []
+    for start in range(0, count, max_batch_size()):
+        notes += [result["note"] for result in apply_operations(user, operations[start:start + max_batch_size()])]
+    return notes
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
@@ -0,0 +1,174 @@
+"""
+Batch create/update/move of notes in one transaction.
+
+bulk_create() and bulk_update() skip Note.save() and its signals, so this
+module applies the same side effects itself, once per batch: text stats,
+versions, change sequence numbers, revisions, category counters, search entries
+and change events.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from notes_project.routers import shard_for_user, use_shard
+
+from . import events, search
+from .counters import adjust_note_count
+from .models import Note
+from .revisions import REVISION_COLUMNS, TEXT_FIELDS, record_revision, revision_due
+from .serializers import NoteBulkOperationSerializer, NoteDetailSerializer, NoteListSerializer
+from .watermarks import bump_watermark
+
+EDITABLE_FIELDS = ("title", "content", "category")
+
+
+class BulkValidationError(Exception):
+    """At least one operation is invalid; nothing was written."""
+
+    def __init__(self, results):
+        super().__init__("Bulk operations are invalid.")
+        self.results = results
+
+
+def max_batch_size():
+    return settings.NOTES_BULK_MAX_BATCH
+
+
+def validate_operations(user, operations):
+    """
+    Validate every operation and load the notes they target; call it inside the
+    transaction that writes them, so they cannot change in between.
+    Returns (validated operations, {note_id: Note}); raises BulkValidationError.
+    """
+    envelopes = [NoteBulkOperationSerializer(data=operation) for operation in operations]
+    errors = [{} if envelope.is_valid() else dict(envelope.errors) for envelope in envelopes]
+    kinds = [operation.get("op") for operation in operations]
+    fields = [
+        {key: operation[key] for key in (("category",) if kind == "move" else EDITABLE_FIELDS) if key in operation}
+        for kind, operation in zip(kinds, operations)
+    ]
+
+    # Creates need every required field; updates and moves only the ones they send.
+    validated = [None] * len(operations)
+    creates = [index for index, kind in enumerate(kinds) if kind == "create"]
+    changes = [index for index, kind in enumerate(kinds) if kind != "create"]
+    for indexes, partial in ((creates, False), (changes, True)):
+        if not indexes:
+            continue
+        serializer = NoteDetailSerializer(data=[fields[index] for index in indexes], many=True, partial=partial)
+        if serializer.is_valid():
+            for index, data in zip(indexes, serializer.validated_data):
+                validated[index] = data
+        else:
+            for index, item_errors in zip(indexes, serializer.errors):
+                errors[index].update(item_errors)
+
+    ids = {envelope.validated_data["id"] for envelope in envelopes if "id" in getattr(envelope, "validated_data", {})}
+    notes = Note.objects.select_for_update().filter(user=user, id__in=ids).in_bulk()
+    for index, (kind, envelope) in enumerate(zip(kinds, envelopes)):
+        if kind == "move" and "category" not in fields[index]:
+            errors[index].setdefault("category", ["This field is required."])
+        if kind not in ("update", "move") or errors[index]:
+            continue
+        note = notes.get(envelope.validated_data["id"])
+        if note is None:
+            errors[index]["id"] = ["Note not found."]
+        elif envelope.validated_data.get("version", note.version) != note.version:
+            errors[index]["version"] = [f"Note has been modified since this version; it is at {note.version}."]
+
+    if any(errors):
+        raise BulkValidationError(
+            [
+                {"index": index, "status": "error", "errors": item_errors} if item_errors
+                else {"index": index, "status": "valid"}
+                for index, item_errors in enumerate(errors)
+            ]
+        )
+
+    operations = [{**envelope.validated_data, "data": data} for envelope, data in zip(envelopes, validated)]
+    return operations, notes
+
+
+def apply_operations(user, operations):
+    """Validate and apply a batch of operations atomically; returns per-item results."""
+    # Also used outside requests (seeding, benchmarks), so name the owner's shard.
+    with use_shard(shard_for_user(user)) as alias:
+        return _apply_operations(user, operations, alias)
+
+
+def _apply_operations(user, operations, alias):
+    with transaction.atomic(using=alias):
+        operations, notes = validate_operations(user, operations)
+        now = timezone.now()
+        count_deltas = Counter()
+        created, updated = [], {}
+        previous, moved_from, changed_fields = {}, {}, {}
+        results = []
+
+        for index, operation in enumerate(operations):
+            data = operation["data"]
+            if operation["op"] == "create":
+                note = Note(user=user, **data)
+                note.refresh_text_stats()
+                created.append(note)
+                count_deltas[note.category_id] += 1
+                results.append({"index": index, "status": "created", "note": note})
+                continue
+
+            note = notes[operation["id"]]
+            if note.id not in updated:
+                previous[note.id] = {column: getattr(note, column) for column in REVISION_COLUMNS}
+                note.version += 1
+                changed_fields[note.id] = {"version", "change_seq"}
+            fields = changed_fields[note.id]
+            for field, value in data.items():
+                if field == "category":
+                    moved_from.setdefault(note.id, note.category_id)
+                    count_deltas[note.category_id] -= 1
+                    count_deltas[value.pk] += 1
+                setattr(note, field, value)
+                fields.add(field)
+            if "content" in data:
+                note.refresh_text_stats()
+                fields.update(("preview", "word_count", "char_count"))
+            if operation["op"] == "update":
+                # A move only files the note elsewhere; it is not an edit.
+                note.updated_at = note.last_edited_at = now
+                fields.update(("updated_at", "last_edited_at"))
+            updated[note.id] = note
+            results.append({"index": index, "status": "updated", "note": note})
+
+        written = created + list(updated.values())
+        head = bump_watermark(user.pk, by=len(written))
+        for seq, note in enumerate(written, start=head - len(written) + 1):
+            note.change_seq = seq
+        for note in updated.values():
+            before = previous[note.id]
+            text_changed = any(before[field] != getattr(note, field) for field in TEXT_FIELDS)
+            if text_changed and revision_due(before["revised_at"], before["last_edited_at"], now):
+                record_revision(note.id, before)
+                note.revised_at = now
+                changed_fields[note.id].add("revised_at")
+        Note.objects.bulk_create(created, batch_size=500)
+        # Each note writes back only the columns its operations changed, grouped to keep the UPDATEs few.
+        groups = {}
+        for note in updated.values():
+            groups.setdefault(frozenset(changed_fields[note.id]), []).append(note)
+        for fields, group in groups.items():
+            Note.objects.bulk_update(group, sorted(fields), batch_size=500)
+        for category_id, delta in count_deltas.items():
+            adjust_note_count(user.pk, category_id, delta)
+        search.index_notes(written)
+        if events.listening(user.pk):
+            changes = [events.note_upserted(data) for data in NoteListSerializer(written, many=True).data]
+            changes += [
+                events.note_moved(note_id, category_id, updated[note_id].category_id)
+                for note_id, category_id in moved_from.items()
+                if category_id != updated[note_id].category_id
+            ]
+            changes.append(events.counts_changed(count_deltas))
+            events.publish(user.pk, changes)
+
+    return results
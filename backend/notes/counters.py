@@ -0,0 +1,55 @@
+from django.db.models import Count, F
+
+from .models import CategoryNoteCount, Note
+
+
+def adjust_note_count(user_id, category_id, delta):
+    """
+    Apply a delta to the user's note counter for a category.
+    Must run inside the transaction that writes the note itself.
+    """
+    if delta == 0:
+        return
+    counters = CategoryNoteCount.objects.filter(user_id=user_id, category_id=category_id)
+    if delta < 0:
+        # Never create rows on the way down: the owner may be in the middle of a cascade delete.
+        counters.filter(count__gte=-delta).update(count=F("count") + delta)
+        return
+    if not counters.update(count=F("count") + delta):
+        CategoryNoteCount.objects.bulk_create(
+            [CategoryNoteCount(user_id=user_id, category_id=category_id, count=0)],
+            ignore_conflicts=True,
+        )
+        counters.update(count=F("count") + delta)
+
+
+def compute_note_counts(user_ids=None):
+    """Count notes per (user, category) straight from the notes table, for user_ids or everyone."""
+    notes = Note.objects.order_by()
+    if user_ids is not None:
+        notes = notes.filter(user_id__in=user_ids)
+    rows = notes.values("user_id", "category_id").annotate(total=Count("id"))
+    return {(row["user_id"], row["category_id"]): row["total"] for row in rows}
+
+
+def stored_note_counts():
+    """Read the non-zero counters currently stored in the counter table."""
+    rows = CategoryNoteCount.objects.filter(count__gt=0).values_list("user_id", "category_id", "count")
+    return {(user_id, category_id): count for user_id, category_id, count in rows}
+
+
+def rebuild_note_counts(user_ids=None, batch_size=1000):
+    """Replace the counters of user_ids (or every counter) with a fresh count. Call inside a transaction."""
+    expected = compute_note_counts(user_ids)
+    counters = CategoryNoteCount.objects.all()
+    if user_ids is not None:
+        counters = counters.filter(user_id__in=user_ids)
+    counters.delete()
+    CategoryNoteCount.objects.bulk_create(
+        [
+            CategoryNoteCount(user_id=user_id, category_id=category_id, count=count)
+            for (user_id, category_id), count in expected.items()
+        ],
+        batch_size=batch_size,
+    )
+    return expected
@@ -0,0 +1,280 @@
+"""
+Per-user push of note changes to open clients (GET /api/events/, see
+notes.async_views.note_events_view).
+
+The note write paths publish small events once their transaction commits:
+note.upserted (the list representation of a note, or only the changed
+fields of an autosave), note.moved, note.deleted and counts (per-category
+note count deltas). A broker fans them out to the user's subscribers, and
+keeps a short log so a reconnecting client resumes from its Last-Event-ID.
+When that log no longer reaches back far enough, the subscriber gets a
+resync event and should reload. Writers check listening() first, so users
+without an open stream (every user under WSGI) cost nothing.
+
+NOTES_EVENTS_BACKEND picks the broker: "memory" fans out within one
+process; "cache" keeps the log in the Django cache, which every process
+using the same cache (file or redis) polls; "off" disables publishing.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from .models import Note
+
+logger = logging.getLogger(__name__)
+
+# How long a cache subscriber waits for an event whose id is taken but not yet stored.
+CACHE_GAP_GRACE = 5.0
+
+
+def resync_event():
+    return {"type": "resync"}
+
+
+def note_upserted(data):
+    """A note's list representation, or its id and the fields that changed."""
+    return {"type": "note.upserted", "note": data}
+
+
+def note_moved(note_id, from_category_id, to_category_id):
+    return {"type": "note.moved", "id": note_id, "from": from_category_id, "to": to_category_id}
+
+
+def note_deleted(note_id):
+    return {"type": "note.deleted", "id": note_id}
+
+
+def counts_changed(deltas):
+    """Per-category note count deltas; categories whose count did not change are left out."""
+    return {"type": "counts", "deltas": {str(category_id): delta for category_id, delta in deltas.items() if delta}}
+
+
+def listening(user_id):
+    """Whether events for the user may reach a client; when not, there is no need to build them."""
+    broker = get_event_broker()
+    return broker is not None and broker.listening(user_id)
+
+
+def publish(user_id, events):
+    """Send events to the user's subscribers once the current transaction commits."""
+    broker = get_event_broker()
+    events = [event for event in events if event["type"] != "counts" or event["deltas"]]
+    if broker is None or not events:
+        return
+
+    def send():
+        try:
+            broker.publish(user_id, events)
+        except Exception:
+            # The write is committed; a client that misses the event catches up on its next reload.
+            logger.exception("Could not publish note events for user %s", user_id)
+
+    # Notes are written on their owner's shard, so that is the transaction to wait for.
+    transaction.on_commit(send, using=router.db_for_write(Note))
+
+
+class MemoryBroker:
+    """
+    Fans events out to subscribers in this process, keeping the last
+    NOTES_EVENTS_BACKLOG per user. Only users with a subscriber, or whose last
+    one left less than `retention` seconds ago (and may reconnect), have a log.
+    """
+
+    def __init__(self, backlog, retention):
+        self.backlog = backlog
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._ids = defaultdict(itertools.count)
+        self._logs = defaultdict(lambda: deque(maxlen=self.backlog))
+        self._subscribers = defaultdict(set)
+        # {user_id: when their last subscriber left}, oldest first.
+        self._idle_since = {}
+
+    def listening(self, user_id):
+        with self._lock:
+            self._evict_idle()
+            return user_id in self._subscribers or user_id in self._idle_since
+
+    def publish(self, user_id, events):
+        with self._lock:
+            self._evict_idle()
+            if user_id not in self._subscribers and user_id not in self._idle_since:
+                return
+            batch = [(next(self._ids[user_id]) + 1, event) for event in events]
+            self._logs[user_id].extend(batch)
+            subscribers = list(self._subscribers[user_id])
+        # Publishers run on request threads; each subscriber's queue belongs to its event loop.
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, batch)
+
+    def subscribe(self, user_id, last_id=None):
+        subscription = MemorySubscription(self, user_id)
+        with self._lock:
+            log = self._logs.get(user_id, ())
+            latest = log[-1][0] if log else 0
+            if last_id is not None and (last_id > latest or (log and last_id < log[0][0] - 1)):
+                subscription.pending = [(latest, resync_event())]
+            elif last_id is not None:
+                subscription.pending = [item for item in log if item[0] > last_id]
+            subscription.last_id = latest
+            self._subscribers[user_id].add(subscription)
+            self._idle_since.pop(user_id, None)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        user_id = subscription.user_id
+        with self._lock:
+            self._subscribers[user_id].discard(subscription)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+                self._idle_since[user_id] = time.monotonic()
+
+    def _evict_idle(self):
+        """Drop the logs of users idle for `retention` seconds; their clients resync if they come back."""
+        cutoff = time.monotonic() - self.retention
+        for user_id, since in list(self._idle_since.items()):
+            if since > cutoff:
+                break
+            del self._idle_since[user_id]
+            self._logs.pop(user_id, None)
+            self._ids.pop(user_id, None)
+
+
+class MemorySubscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.pending = []
+        self.last_id = 0
+
+    async def get(self, timeout):
+        """The next (id, event) pairs, or [] after `timeout` seconds without any."""
+        if self.pending:
+            batch, self.pending = self.pending, []
+            return batch
+        try:
+            batch = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        # Events published while subscribing are both in the backlog and queued.
+        batch = [item for item in batch if item[0] > self.last_id]
+        if batch:
+            self.last_id = batch[-1][0]
+        return batch
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class CacheBroker:
+    """
+    Keeps each user's events in the Django cache for NOTES_EVENTS_TTL seconds,
+    numbered by a per-user counter; subscribers poll the counter every
+    NOTES_EVENTS_POLL_INTERVAL seconds. Works across processes sharing the cache.
+    """
+
+    def __init__(self, ttl, poll_interval):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def counter_key(user_id):
+        return f"notes:events:{user_id}"
+
+    def listening(self, user_id):
+        # Subscribers may be in any process; the log expires on its own after `ttl`.
+        return True
+
+    def publish(self, user_id, events):
+        key = self.counter_key(user_id)
+        cache.add(key, 0, timeout=None)
+        try:
+            last = cache.incr(key, len(events))
+        except ValueError:
+            # Evicted between add() and incr(); subscribers notice the reset and resync.
+            cache.add(key, 0, timeout=None)
+            last = cache.incr(key, len(events))
+        first = last - len(events) + 1
+        cache.set_many({f"{key}:{first + offset}": event for offset, event in enumerate(events)}, timeout=self.ttl)
+
+    def subscribe(self, user_id, last_id=None):
+        return CacheSubscription(self, user_id, last_id)
+
+
+class CacheSubscription:
+    def __init__(self, broker, user_id, last_id):
+        self.broker = broker
+        self.key = broker.counter_key(user_id)
+        self.last_id = last_id
+        self.gap_since = None
+
+    async def get(self, timeout):
+        """The next (id, event) pairs, or [] after `timeout` seconds without any."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            latest = await cache.aget(self.key) or 0
+            if self.last_id is None:
+                self.last_id = latest
+            elif latest < self.last_id:
+                # The counter was reset (evicted or flushed): the log is gone.
+                self.last_id = latest
+                return [(latest, resync_event())]
+            elif latest > self.last_id:
+                batch = await self._read(latest, loop.time())
+                if batch:
+                    return batch
+            if loop.time() >= deadline:
+                return []
+            await asyncio.sleep(min(self.broker.poll_interval, max(deadline - loop.time(), 0)))
+
+    async def _read(self, latest, now):
+        ids = range(self.last_id + 1, latest + 1)
+        stored = await cache.aget_many([f"{self.key}:{event_id}" for event_id in ids])
+        batch = []
+        for event_id in ids:
+            event = stored.get(f"{self.key}:{event_id}")
+            if event is None:
+                break
+            batch.append((event_id, event))
+        if batch:
+            self.last_id, self.gap_since = batch[-1][0], None
+            return batch
+        # The next event is missing: still being stored by its publisher, or expired.
+        if self.gap_since is None:
+            self.gap_since = now
+        elif now - self.gap_since >= CACHE_GAP_GRACE:
+            self.last_id, self.gap_since = latest, None
+            return [(latest, resync_event())]
+        return []
+
+    def close(self):
+        pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker():
+    """Return the process-wide broker, or None when NOTES_EVENTS_BACKEND is "off"."""
+    global _broker
+    if settings.NOTES_EVENTS_BACKEND == "off":
+        return None
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if settings.NOTES_EVENTS_BACKEND == "cache":
+                    _broker = CacheBroker(settings.NOTES_EVENTS_TTL, settings.NOTES_EVENTS_POLL_INTERVAL)
+                else:
+                    _broker = MemoryBroker(settings.NOTES_EVENTS_BACKLOG, settings.NOTES_EVENTS_MAX_AGE)
+    return _broker
@@ -0,0 +1,125 @@
+"""
+Streaming note exports.
+
+Both formats are generators over QuerySet.iterator(), so only one chunk of
+notes (and, for ZIP, one compressed entry) is held in memory at a time,
+however many notes are exported. The one thing that grows is zipfile's
+central directory, a small record per entry that is written at the end.
+`notes` is a queryset, or a list of querysets when exporting from several shards.
+"""
+import re
+import zipfile
+
+from django.contrib.auth import get_user_model
+
+from notes_project.renderers import dumps
+
+from .registry import category_registry
+
+CHUNK_SIZE = 500
+EXPORT_FIELDS = ("id", "user_id", "title", "content", "category_id", "version", "created_at", "last_edited_at")
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "zip": ("application/zip", "zip"),
+}
+
+
+def note_records(notes, include_user=False):
+    """
+    Yield one dict per note, with the category name resolved from the registry
+    and, with include_user, the owner's email (users may be in another database
+    than their notes, so they are looked up once each rather than joined).
+    """
+    emails, categories = {}, category_registry.snapshot()
+    for queryset in notes if isinstance(notes, list) else [notes]:
+        for values in queryset.values(*EXPORT_FIELDS).iterator(chunk_size=CHUNK_SIZE):
+            category = categories.get(values["category_id"]) or category_registry.get(values["category_id"])
+            yield _record(values, category, _email(emails, values["user_id"]) if include_user else None)
+
+
+def _email(emails, user_id):
+    if user_id not in emails:
+        emails[user_id] = get_user_model().objects.filter(pk=user_id).values_list("email", flat=True).first()
+    return emails[user_id]
+
+
+def _record(values, category, email):
+    return {
+        "id": values["id"],
+        "user": email,
+        "title": values["title"],
+        "content": values["content"],
+        "category": values["category_id"],
+        "category_name": category.name if category else None,
+        "version": values["version"],
+        "created_at": values["created_at"],
+        "last_edited_at": values["last_edited_at"],
+    }
+
+
+def ndjson_chunks(notes, include_user=False):
+    """Yield the notes as newline-delimited JSON, one line per note."""
+    for record in note_records(notes, include_user):
+        if not include_user:
+            del record["user"]
+        yield dumps(record) + b"\n"
+
+
+class _ZipStream:
+    """Write-only file object that hands out what zipfile has written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_chunks(notes, include_user=False):
+    """
+    Yield a ZIP archive with one Markdown file per note, under a folder per
+    category (and per user with include_user). Entries are written with data
+    descriptors, so the archive never needs seeking.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for record in note_records(notes, include_user):
+            folder = _safe_name(record["category_name"] or "Uncategorized")
+            if include_user:
+                folder = f"{_safe_name(record['user'])}/{folder}"
+            # The id prefix keeps names unique without remembering the ones already used.
+            name = f"{folder}/{_safe_name(record['title']) or 'Untitled'} ({record['id'].hex[:12]}).md"
+            archive.writestr(name, markdown(record))
+            yield stream.drain()
+    yield stream.drain()
+
+
+def markdown(record):
+    """Render a note as Markdown with its metadata as front matter."""
+    return (
+        "---\n"
+        f"id: {record['id']}\n"
+        f"category: {record['category_name'] or ''}\n"
+        f"created_at: {record['created_at'].isoformat()}\n"
+        f"last_edited_at: {record['last_edited_at'].isoformat()}\n"
+        "---\n\n"
+        f"# {record['title']}\n\n"
+        f"{record['content']}\n"
+    )
+
+
+def export_chunks(fmt, notes, include_user=False):
+    return (ndjson_chunks if fmt == "ndjson" else zip_chunks)(notes, include_user)
+
+
+def _safe_name(value):
+    return re.sub(r"[^\w\-. @]+", "_", value).strip(" .")[:100]
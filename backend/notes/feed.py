@@ -0,0 +1,72 @@
+"""
+Incremental change feed over a user's notes.
+
+Every note write is stamped with the owner's NoteWatermark counter
+(Note.change_seq) and every delete leaves a NoteTombstone with its own
+sequence number, so "what changed after cursor N" is two range scans on the
+(user, change_seq) indexes.
+"""
+from dataclasses import dataclass
+
+from .models import Note, NoteTombstone, NoteWatermark
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class ResyncRequired(Exception):
+    """The cursor predates pruned tombstones (or is unknown); the client must resync from 0."""
+
+    def __init__(self, cursor):
+        super().__init__("Cursor is too old; resync from 0.")
+        self.cursor = cursor
+
+
+@dataclass
+class Change:
+    seq: int
+    note: Note = None
+    note_id: object = None
+
+    @property
+    def deleted(self):
+        return self.note is None
+
+
+@dataclass
+class ChangePage:
+    changes: list
+    cursor: int
+    has_more: bool
+
+
+def read_changes(user, since, limit=DEFAULT_LIMIT):
+    """
+    Return the changes to the user's notes after `since`, oldest first.
+    since=0 is a full sync: it returns every live note and no tombstones.
+    """
+    watermark = NoteWatermark.objects.filter(user=user).first()
+    if watermark is None:
+        if since:
+            raise ResyncRequired(0)
+        return ChangePage(changes=[], cursor=0, has_more=False)
+    # Read the watermark first and cap both scans with it, so writes committed
+    # meanwhile are left for the next call instead of being skipped.
+    head = watermark.counter
+    if since and (since < watermark.resync_before or since > head):
+        raise ResyncRequired(head)
+
+    notes = Note.objects.filter(user=user, change_seq__gt=since, change_seq__lte=head)
+    changes = [Change(seq=note.change_seq, note=note) for note in notes.order_by("change_seq")[: limit + 1]]
+    if since:
+        tombstones = NoteTombstone.objects.filter(user=user, change_seq__gt=since, change_seq__lte=head)
+        changes += [
+            Change(seq=seq, note_id=note_id)
+            for seq, note_id in tombstones.order_by("change_seq").values_list("change_seq", "note_id")[: limit + 1]
+        ]
+        changes.sort(key=lambda change: change.seq)
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].seq if has_more else head
+    return ChangePage(changes=changes, cursor=cursor, has_more=has_more)
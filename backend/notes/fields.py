@@ -0,0 +1,130 @@
+"""
+CompressedTextField: a TextField stored compressed on SQLite.
+
+A value of at least NOTES_CONTENT_COMPRESS_MIN_BYTES UTF-8 bytes is stored as a
+BLOB: a codec byte, a dictionary id byte, then the zlib (or zstd) stream.
+Shorter values, values that would not shrink and rows written before the
+field existed stay TEXT. Reads tell the two apart by SQLite's storage class,
+so no schema change is needed, and compress_note_content converts existing
+rows in the background. Lookups (content__icontains, ...) only see TEXT rows,
+which is why search goes through the full-text index instead.
+
+On other databases the field is a plain TextField: PostgreSQL already
+compresses large values (TOAST).
+
+Dictionaries are raw-content dictionaries, strings that are common in real
+notes, made by train_content_dictionary and kept in
+notes/dictionaries/<id>.dict. They help short notes most, since those are too
+short to contain many repetitions of their own. Every stored value names its
+dictionary, so a dictionary file must never change or be removed once used;
+train a new id instead.
+"""
+import functools
+import time
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+from notes_project.metrics import registry
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+CODECS = {"zlib": 1, "zstd": 2}
+DICTIONARY_DIR = Path(__file__).resolve().parent / "dictionaries"
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+CODEC_DURATION = registry.histogram(
+    "notes_content_codec_seconds",
+    "Time spent compressing note content on writes (encode) and decompressing it on reads (decode).",
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+    ("operation",),
+)
+COMPRESSION_RATIO = registry.histogram(
+    "notes_content_compression_ratio",
+    "Stored size over original size of note content written compressed.",
+    (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+    ("codec",),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def load_dictionary(dictionary_id):
+    """The bytes of a dictionary; id 0 means none."""
+    if not dictionary_id:
+        return b""
+    path = DICTIONARY_DIR / f"{dictionary_id}.dict"
+    if not path.exists():
+        raise ImproperlyConfigured(f"Note content dictionary {path} is missing.")
+    return path.read_bytes()
+
+
+@functools.lru_cache(maxsize=None)
+def _zstd_dictionary(dictionary_id):
+    if zstandard is None:
+        raise ImproperlyConfigured("Note content is stored with zstd, which needs the zstandard package.")
+    dictionary = load_dictionary(dictionary_id)
+    if not dictionary:
+        return None
+    return zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+
+def compress_text(text):
+    """
+    The stored form of `text`: compressed bytes, or the text itself when it is
+    short or does not shrink.
+    """
+    data = text.encode()
+    if len(data) < settings.NOTES_CONTENT_COMPRESS_MIN_BYTES:
+        return text
+    codec = settings.NOTES_CONTENT_CODEC
+    dictionary_id = settings.NOTES_CONTENT_DICTIONARY
+    start = time.perf_counter()
+    if codec == "zstd":
+        dictionary = _zstd_dictionary(dictionary_id)
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary).compress(data)
+    else:
+        dictionary = load_dictionary(dictionary_id)
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+        payload = compressor.compress(data) + compressor.flush()
+    CODEC_DURATION.observe(time.perf_counter() - start, "encode")
+
+    stored = bytes([CODECS[codec], dictionary_id]) + payload
+    COMPRESSION_RATIO.observe(min(len(stored) / len(data), 1.0), codec)
+    return stored if len(stored) < len(data) else text
+
+
+def decompress_text(stored):
+    """Inverse of compress_text() for a stored BLOB."""
+    start = time.perf_counter()
+    codec, dictionary_id, payload = stored[0], stored[1], bytes(stored[2:])
+    if codec == CODECS["zstd"]:
+        dictionary = _zstd_dictionary(dictionary_id)
+        data = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload)
+    else:
+        dictionary = load_dictionary(dictionary_id)
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        data = decompressor.decompress(payload) + decompressor.flush()
+    CODEC_DURATION.observe(time.perf_counter() - start, "decode")
+    return data.decode()
+
+
+class CompressedTextField(models.TextField):
+    """TextField compressed on SQLite when NOTES_CONTENT_COMPRESSION is on (see the module docstring)."""
+
+    def get_db_prep_save(self, value, connection):
+        value = super().get_db_prep_save(value, connection)
+        if isinstance(value, str) and connection.vendor == "sqlite" and settings.NOTES_CONTENT_COMPRESSION:
+            return compress_text(value)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, (bytes, memoryview)):
+            return decompress_text(value)
+        return value
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import tempfile
+import time
+import types
+from pathlib import Path
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import include, path
+
+from notes.bench import create_categories, create_user, isolated_database, percentile, seed_notes
+from notes.urls import note_urlpatterns
+
+
+def build_urlconf(use_async):
+    """A root URLconf serving the sync or the async notes views."""
+    urlconf = types.ModuleType(f"bench_urls_{'async' if use_async else 'sync'}")
+    urlconf.urlpatterns = [
+        path("api/auth/", include("accounts.urls")),
+        path("api/", include((note_urlpatterns(use_async), "notes"))),
+    ]
+    return urlconf
+
+
+async def asgi_get(application, url, cookie):
+    """Send one GET through the ASGI application in-process; returns the status code."""
+    url_path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": url_path,
+        "raw_path": url_path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    """Management command load-testing the sync and async notes views under ASGI."""
+
+    help = "Compare throughput and tail latency of the sync and async notes views through the ASGI handler"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight at once.")
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run.")
+        parser.add_argument("--users", type=int, default=8, help="Users (and sessions) to spread requests over.")
+        parser.add_argument("--notes", type=int, default=200, help="Notes per user.")
+
+    def handle(self, *args, **options):
+        """Seed a file-backed test database, then run the same request mix against both view sets."""
+        rng = random.Random(1)
+        with tempfile.TemporaryDirectory() as directory, isolated_database(test_name=str(Path(directory) / "bench.db")):
+            categories = create_categories()
+            sessions = []
+            for index in range(options["users"]):
+                user = create_user(index)
+                notes = seed_notes(user, categories, options["notes"], rng)
+                client = Client()
+                client.force_login(user)
+                urls = ["/api/categories/", "/api/notes/", "/api/notes/?limit=20"]
+                urls += [f"/api/notes/{note.id}/" for note in rng.sample(notes, min(len(notes), 20))]
+                sessions.append((f"sessionid={client.cookies['sessionid'].value}", urls))
+
+            application = get_asgi_application()
+            for label, use_async in [("sync views", False), ("async views", True)]:
+                with override_settings(
+                    ROOT_URLCONF=build_urlconf(use_async),
+                    METRICS_LATENCY_BUDGET_MS=0,
+                    THROTTLE_ENABLED=False,
+                    LOAD_SHEDDING_ENABLED=False,
+                ):
+                    latencies, statuses, elapsed = asyncio.run(
+                        self.run_load(application, sessions, options["concurrency"], options["seconds"], rng)
+                    )
+                self.stdout.write(
+                    f"{label:<12} {len(latencies) / elapsed:8.1f} req/s   "
+                    f"p50 {percentile(latencies, 50):7.1f} ms  p95 {percentile(latencies, 95):7.1f} ms  "
+                    f"p99 {percentile(latencies, 99):7.1f} ms   statuses {dict(statuses)}"
+                )
+
+    async def run_load(self, application, sessions, concurrency, seconds, rng):
+        latencies, statuses = [], {}
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                cookie, urls = rng.choice(sessions)
+                start = time.perf_counter()
+                status = await asgi_get(application, rng.choice(urls), cookie)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - start
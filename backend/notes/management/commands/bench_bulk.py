@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from notes.bench import create_categories, create_user, isolated_database, measure
+
+
+class Command(BaseCommand):
+    """Management command comparing the bulk notes endpoint with per-note requests."""
+
+    help = "Benchmark /api/notes/bulk/ against the per-note create and update endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=500, help="Number of notes to create and move.")
+
+    def handle(self, *args, **options):
+        """Create and move the same number of notes both ways and print the timings."""
+        count = options["notes"]
+        # Per-note requests would soon run into the autosave throttle.
+        with isolated_database(), override_settings(THROTTLE_ENABLED=False, LOAD_SHEDDING_ENABLED=False):
+            source, target = create_categories()[:2]
+            client = Client()
+
+            client.force_login(create_user(0))
+            with measure() as per_note_create:
+                ids = [
+                    client.post(
+                        reverse("notes:note-create"),
+                        {"title": f"Note {i}", "content": "Imported content", "category": str(source.id)},
+                        content_type="application/json",
+                    ).json()["id"]
+                    for i in range(count)
+                ]
+            with measure() as per_note_move:
+                for note_id in ids:
+                    client.patch(
+                        reverse("notes:note-update", args=[note_id]),
+                        {"category": str(target.id)},
+                        content_type="application/json",
+                    )
+
+            client.force_login(create_user(1))
+            creates = [
+                {"op": "create", "title": f"Note {i}", "content": "Imported content", "category": str(source.id)}
+                for i in range(count)
+            ]
+            with measure() as bulk_create:
+                response = client.post(reverse("notes:note-bulk"), {"operations": creates}, content_type="application/json")
+            moves = [{"op": "move", "id": result["id"], "category": str(target.id)} for result in response.json()["results"]]
+            with measure() as bulk_move:
+                client.post(reverse("notes:note-bulk"), {"operations": moves}, content_type="application/json")
+
+        report = {
+            "notes": count,
+            "create": {"per_note": per_note_create, "bulk": bulk_create},
+            "move": {"per_note": per_note_move, "bulk": bulk_move},
+        }
+        for operation in ("create", "move"):
+            per_note, bulk = report[operation]["per_note"], report[operation]["bulk"]
+            self.stdout.write(
+                f"{operation:>6}: per-note {per_note['seconds']:.3f}s / {per_note['queries']} queries, "
+                f"bulk {bulk['seconds']:.3f}s / {bulk['queries']} queries "
+                f"({per_note['seconds'] / bulk['seconds']:.1f}x faster)"
+            )
+        self.stdout.write(json.dumps(report, indent=2))
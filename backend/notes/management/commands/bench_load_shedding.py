@@ -0,0 +1,140 @@
+import logging
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from notes.bench import WORDS, create_categories, create_user, isolated_database, percentile, seed_notes
+from notes_project.throttling import load_monitor
+
+SCENARIOS = [
+    ("no abuse", {"THROTTLE_ENABLED": False, "LOAD_SHEDDING_ENABLED": False}, False),
+    ("unprotected", {"THROTTLE_ENABLED": False, "LOAD_SHEDDING_ENABLED": False}, True),
+    ("throttling", {"THROTTLE_ENABLED": True, "LOAD_SHEDDING_ENABLED": False}, True),
+    ("throttling+shedding", {"THROTTLE_ENABLED": True, "LOAD_SHEDDING_ENABLED": True}, True),
+]
+
+
+class Command(BaseCommand):
+    """Management command measuring how well throttling and load shedding protect well-behaved clients."""
+
+    help = (
+        "Run well-behaved clients (list, then autosave, with think time) next to abusive ones "
+        "autosaving and listing in a loop, in threads against a throwaway SQLite file, with and "
+        "without throttling and load shedding, and report the well-behaved clients' latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=4, help="Well-behaved client threads, one user each.")
+        parser.add_argument("--abusers", type=int, default=4, help="Threads hammering the API as a single user.")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each scenario.")
+        parser.add_argument("--think", type=float, default=0.5, help="Seconds a well-behaved client waits between requests.")
+        parser.add_argument("--notes", type=int, default=200, help="Notes per user.")
+        parser.add_argument(
+            "--target-ms", type=float, default=100.0, help="LOAD_SHEDDING_TARGET_MS for the run (p95 latency)."
+        )
+
+    def handle(self, *args, **options):
+        """Seed one database, then run each scenario on it with fresh buckets and load samples."""
+        # Every 429 and 503 would otherwise be logged.
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        rng = random.Random(1)
+        with tempfile.TemporaryDirectory() as directory, isolated_database(test_name=str(Path(directory) / "bench.db")):
+            categories = create_categories()
+            users = [create_user(index) for index in range(options["clients"] + 1)]
+            notes = {user.pk: [note.id for note in seed_notes(user, categories, options["notes"], rng)] for user in users}
+            cookies = {}
+            for user in users:
+                client = Client()
+                client.force_login(user)
+                cookies[user.pk] = client.cookies["sessionid"].value
+
+            self.stdout.write(
+                f"{'scenario':<20} {'req/s':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>8}  well-behaved statuses / abuser statuses"
+            )
+            for label, overrides, abuse in SCENARIOS:
+                cache.clear()
+                load_monitor.reset()
+                with override_settings(
+                    **overrides,
+                    LOAD_SHEDDING_TARGET_MS=options["target_ms"],
+                    LOAD_SHEDDING_DB_TARGET_MS=options["target_ms"] / 2,
+                    METRICS_LATENCY_BUDGET_MS=0,
+                    METRICS_QUERY_BUDGET=0,
+                ):
+                    latencies, statuses, abuser_statuses = self.run_scenario(users, notes, cookies, abuse, options)
+                self.stdout.write(
+                    f"{label:<20} {len(latencies) / options['seconds']:>6.1f} {percentile(latencies, 50):>7.1f} "
+                    f"{percentile(latencies, 95):>7.1f} {percentile(latencies, 99):>8.1f}  "
+                    f"{dict(statuses)} / {dict(abuser_statuses)}"
+                )
+
+    def run_scenario(self, users, notes, cookies, abuse, options):
+        abuser, clients = users[0], users[1:]
+        deadline = time.perf_counter() + options["seconds"]
+        latencies, statuses, abuser_statuses = [], Counter(), Counter()
+        lock = threading.Lock()
+
+        def well_behaved(user, seed):
+            rng = random.Random(seed)
+            client = self.client(cookies[user.pk])
+            while time.perf_counter() < deadline:
+                for method in (self.list_notes, self.autosave):
+                    start = time.perf_counter()
+                    status = method(client, user, notes[user.pk], rng)
+                    with lock:
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        statuses[status] += 1
+                    time.sleep(options["think"])
+            connections.close_all()
+
+        def abusive(seed):
+            rng = random.Random(seed)
+            client = self.client(cookies[abuser.pk])
+            while time.perf_counter() < deadline:
+                method = self.autosave if rng.random() < 0.7 else self.list_notes
+                status = method(client, abuser, notes[abuser.pk], rng)
+                with lock:
+                    abuser_statuses[status] += 1
+            connections.close_all()
+
+        threads = [threading.Thread(target=well_behaved, args=(user, index)) for index, user in enumerate(clients)]
+        if abuse:
+            threads += [threading.Thread(target=abusive, args=(100 + index,)) for index in range(options["abusers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, statuses, abuser_statuses
+
+    @staticmethod
+    def client(session_id):
+        client = Client(raise_request_exception=False)
+        client.cookies["sessionid"] = session_id
+        return client
+
+    @staticmethod
+    def list_notes(client, user, note_ids, rng):
+        return client.get(reverse("notes:note-list")).status_code
+
+    @staticmethod
+    def autosave(client, user, note_ids, rng):
+        """Fetch the version as the editor would have it, then send a small insert."""
+        note_id = rng.choice(note_ids)
+        response = client.get(reverse("notes:note-detail", args=[note_id]))
+        if response.status_code != 200:
+            return response.status_code
+        ops = [{"field": "content", "pos": 0, "delete": 0, "insert": f"{rng.choice(WORDS)} "}]
+        return client.patch(
+            reverse("notes:note-update", args=[note_id]),
+            {"version": response.json()["version"], "ops": ops},
+            content_type="application/json",
+        ).status_code
@@ -0,0 +1,376 @@
+import json
+import random
+import statistics
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from notes.bench import (
+    BENCH_PASSWORD,
+    WORDS,
+    create_categories,
+    create_user,
+    isolated_database,
+    measure,
+    percentile,
+    random_content,
+    seed_notes,
+)
+from notes.patching import apply_note_patch
+from notes_project.routers import use_user_shard
+
+
+class BenchContext:
+    """Seeded data and logged-in clients shared by the scenarios."""
+
+    def __init__(self, users, notes, categories, rng):
+        self.users = users
+        self.notes = notes
+        self.categories = categories
+        self.rng = rng
+        self.clients = {}
+        self.etags = {}
+        self.cursors = {}
+        self.revised = {}
+        self.signups = 0
+
+    def client(self, i):
+        user = self.users[i % len(self.users)]
+        if user.pk not in self.clients:
+            self.clients[user.pk] = Client()
+            self.clients[user.pk].force_login(user)
+        return user, self.clients[user.pk]
+
+    def note(self, i):
+        user = self.users[i % len(self.users)]
+        return self.rng.choice(self.notes[user.pk])
+
+    def revised_note(self, i, edits=30):
+        """A note of the user with a history of edits, each kept as a revision."""
+        user = self.users[i % len(self.users)]
+        if user.pk not in self.revised:
+            note = self.rng.choice(self.notes[user.pk])
+            with use_user_shard(user.pk), override_settings(NOTES_REVISION_INTERVAL=0):
+                for edit in range(edits):
+                    note.refresh_from_db(fields=["version"])
+                    apply_note_patch(note.id, user, note.version, [{"field": "content", "pos": 0, "insert": f"{edit} "}])
+            self.revised[user.pk] = note
+        return self.revised[user.pk]
+
+
+def expect(response, status, name):
+    """Return the response, or fail the run if it does not have the expected status."""
+    if response.status_code != status:
+        raise CommandError(
+            f"{name}: expected HTTP {status}, got {response.status_code}: {response.content[:200]!r}"
+        )
+    return response
+
+
+def csrf_token(ctx, i):
+    client = Client()
+    return lambda: client.get(reverse("accounts:csrf-token"))
+
+
+def signup(ctx, i):
+    ctx.signups += 1
+    client = Client()
+    body = {"email": f"bench-signup{ctx.signups}@example.com", "password": BENCH_PASSWORD}
+    return lambda: client.post(reverse("accounts:signup"), body, content_type="application/json")
+
+
+def login(ctx, i):
+    user = ctx.users[i % len(ctx.users)]
+    client = Client()
+    body = {"email": user.email, "password": BENCH_PASSWORD}
+    return lambda: client.post(reverse("accounts:login"), body, content_type="application/json")
+
+
+def logout(ctx, i):
+    client = Client()
+    client.force_login(ctx.users[i % len(ctx.users)])
+    return lambda: client.post(reverse("accounts:logout"))
+
+
+def current_user(ctx, i):
+    _, client = ctx.client(i)
+    return lambda: client.get(reverse("accounts:current-user"))
+
+
+def category_list(ctx, i):
+    _, client = ctx.client(i)
+    return lambda: client.get(reverse("notes:category-list"))
+
+
+def note_list(ctx, i):
+    _, client = ctx.client(i)
+    return lambda: client.get(reverse("notes:note-list"))
+
+
+def note_list_category(ctx, i):
+    _, client = ctx.client(i)
+    category = ctx.rng.choice(ctx.categories)
+    return lambda: client.get(reverse("notes:note-list"), {"categoryId": str(category.id)})
+
+
+def note_list_next_page(ctx, i):
+    user, client = ctx.client(i)
+    if user.pk not in ctx.cursors:
+        ctx.cursors[user.pk] = expect(client.get(reverse("notes:note-list")), 200, "notes:note-list").json()["next"]
+    next_url = ctx.cursors[user.pk]
+    return lambda: client.get(next_url or reverse("notes:note-list"))
+
+
+def conditional(url_name):
+    def scenario(ctx, i):
+        user, client = ctx.client(i)
+        key = (url_name, user.pk)
+        if key not in ctx.etags:
+            ctx.etags[key] = expect(client.get(reverse(url_name)), 200, url_name)["ETag"]
+        return lambda: client.get(reverse(url_name), HTTP_IF_NONE_MATCH=ctx.etags[key])
+    return scenario
+
+
+def note_search(ctx, i):
+    _, client = ctx.client(i)
+    query = ctx.rng.choice(WORDS)
+    return lambda: client.get(reverse("notes:note-search"), {"q": query})
+
+
+def note_changes(ctx, i):
+    _, client = ctx.client(i)
+    return lambda: client.get(reverse("notes:note-changes"), {"since": 0, "limit": 100})
+
+
+def note_detail(ctx, i):
+    _, client = ctx.client(i)
+    note = ctx.note(i)
+    return lambda: client.get(reverse("notes:note-detail", args=[note.id]))
+
+
+def note_create(ctx, i):
+    _, client = ctx.client(i)
+    body = {"title": "Benchmark", "content": random_content(ctx.rng), "category": str(ctx.categories[0].id)}
+    return lambda: client.post(reverse("notes:note-create"), body, content_type="application/json")
+
+
+def note_update(ctx, i):
+    _, client = ctx.client(i)
+    note = ctx.note(i)
+    body = {"title": f"Edited {i}", "category": str(ctx.rng.choice(ctx.categories).id)}
+    return lambda: client.patch(reverse("notes:note-update", args=[note.id]), body, content_type="application/json")
+
+
+def note_update_ops(ctx, i):
+    _, client = ctx.client(i)
+    note = ctx.note(i)
+    detail = expect(client.get(reverse("notes:note-detail", args=[note.id])), 200, "notes:note-detail")
+    version = detail.json()["version"]
+    body = {"version": version, "ops": [{"field": "content", "pos": 0, "insert": "typing "}]}
+    return lambda: client.patch(reverse("notes:note-update", args=[note.id]), body, content_type="application/json")
+
+
+def workspace_bootstrap(ctx, i):
+    _, client = ctx.client(i)
+    return lambda: client.get(reverse("notes:workspace-bootstrap"))
+
+
+def note_export(fmt):
+    def scenario(ctx, i):
+        _, client = ctx.client(i)
+        return lambda: client.get(reverse("notes:note-export"), {"format": fmt})
+    return scenario
+
+
+def note_revision_list(ctx, i):
+    _, client = ctx.client(i)
+    note = ctx.revised_note(i)
+    return lambda: client.get(reverse("notes:note-revision-list", args=[note.id]))
+
+
+def note_revision_detail(ctx, i):
+    _, client = ctx.client(i)
+    note = ctx.revised_note(i)
+    number = ctx.rng.choice(list(note.revisions.values_list("number", flat=True)))
+    return lambda: client.get(reverse("notes:note-revision-detail", args=[note.id, number]))
+
+
+def note_bulk(ctx, i):
+    user, client = ctx.client(i)
+    notes = ctx.rng.sample(ctx.notes[user.pk], min(50, len(ctx.notes[user.pk])))
+    category = ctx.rng.choice(ctx.categories)
+    operations = [{"op": "move", "id": str(note.id), "category": str(category.id)} for note in notes]
+    return lambda: client.post(reverse("notes:note-bulk"), {"operations": operations}, content_type="application/json")
+
+
+SCENARIOS = {
+    "accounts:csrf-token": csrf_token,
+    "accounts:signup": signup,
+    "accounts:login": login,
+    "accounts:logout": logout,
+    "accounts:current-user": current_user,
+    "notes:category-list": category_list,
+    "notes:category-list (304)": conditional("notes:category-list"),
+    "notes:workspace-bootstrap": workspace_bootstrap,
+    "notes:note-list": note_list,
+    "notes:note-list (category)": note_list_category,
+    "notes:note-list (next page)": note_list_next_page,
+    "notes:note-list (304)": conditional("notes:note-list"),
+    "notes:note-search": note_search,
+    "notes:note-changes": note_changes,
+    "notes:note-detail": note_detail,
+    "notes:note-create": note_create,
+    "notes:note-update": note_update,
+    "notes:note-update (ops)": note_update_ops,
+    "notes:note-bulk": note_bulk,
+    "notes:note-export": note_export("ndjson"),
+    "notes:note-export (zip)": note_export("zip"),
+    "notes:note-revision-list": note_revision_list,
+    "notes:note-revision-detail": note_revision_detail,
+}
+# Status every request of a scenario must get (200 otherwise); anything else fails the run
+# rather than being timed as a served request.
+EXPECTED_STATUS = {
+    "accounts:signup": 201,
+    "notes:category-list (304)": 304,
+    "notes:note-list (304)": 304,
+    "notes:note-create": 201,
+}
+
+
+class Command(BaseCommand):
+    """Management command benchmarking every notes and accounts endpoint on a seeded dataset."""
+
+    help = "Seed users and notes, time every API endpoint and compare with a stored baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5, help="Number of users to seed.")
+        parser.add_argument("--notes", type=int, default=200, help="Notes per user.")
+        parser.add_argument("--iterations", type=int, default=30, help="Requests per endpoint.")
+        parser.add_argument(
+            "--repeats",
+            type=int,
+            default=3,
+            help="Runs of every endpoint; latencies are the medians of the runs (default 3).",
+        )
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for the dataset and requests.")
+        parser.add_argument("--only", nargs="*", help="Run only these scenarios (e.g. notes:note-list).")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", help="Compare against results previously written with --output.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Allowed p95 latency increase over the baseline, as a fraction (default 0.25).",
+        )
+        parser.add_argument(
+            "--min-ms",
+            type=float,
+            default=5.0,
+            help="p95 increases of at most this many milliseconds never count as regressions (default 5).",
+        )
+
+    def handle(self, *args, **options):
+        """Run the scenarios, print a table and fail on regressions against the baseline."""
+        names = options["only"] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        rng = random.Random(options["seed"])
+        # Budget warnings from the metrics middleware would drown the report, and throttled or
+        # shed requests would be timed as if they had been served.
+        with isolated_database(), override_settings(
+            METRICS_QUERY_BUDGET=0, METRICS_LATENCY_BUDGET_MS=0, THROTTLE_ENABLED=False, LOAD_SHEDDING_ENABLED=False
+        ):
+            categories = create_categories()
+            users = [create_user(index) for index in range(options["users"])]
+            notes = {user.pk: seed_notes(user, categories, options["notes"], rng) for user in users}
+            ctx = BenchContext(users, notes, categories, rng)
+            results = {
+                name: self.run_scenario(ctx, name, options["iterations"], options["repeats"]) for name in names
+            }
+
+        report = {
+            "dataset": {key: options[key] for key in ("users", "notes", "iterations", "repeats", "seed")},
+            "results": results,
+        }
+        self.print_table(results)
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2) + "\n")
+            self.stdout.write(f"Results written to {options['output']}")
+        if options["baseline"]:
+            self.compare(
+                report, json.loads(Path(options["baseline"]).read_text()), options["threshold"], options["min_ms"]
+            )
+
+    def run_scenario(self, ctx, name, iterations, repeats):
+        """Run the scenario repeats times; one noisy run moves the median latencies little."""
+        runs = [self.run_once(ctx, name, iterations) for _ in range(max(repeats, 1))]
+        return {
+            "status": sorted({code for run in runs for code in run["status"]}),
+            **{
+                key: round(statistics.median(run[key] for run in runs), 3)
+                for key in ("p50_ms", "p95_ms", "p99_ms", "queries_median", "bytes_median")
+            },
+            "queries_max": max(run["queries_max"] for run in runs),
+        }
+
+    def run_once(self, ctx, name, iterations):
+        scenario, expected = SCENARIOS[name], EXPECTED_STATUS.get(name, 200)
+        latencies, queries, sizes, statuses = [], [], [], set()
+        for i in range(iterations):
+            request = scenario(ctx, i)
+            with measure() as result:
+                response = request()
+                # Streamed bodies (the export) are read, and their queries run, as they are consumed.
+                body = b"".join(response.streaming_content) if response.streaming else response.content
+            expect(response, expected, name)
+            latencies.append(result["seconds"] * 1000)
+            queries.append(result["queries"])
+            sizes.append(len(body))
+            statuses.add(response.status_code)
+        return {
+            "status": sorted(statuses),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "queries_median": statistics.median(queries),
+            "queries_max": max(queries),
+            "bytes_median": statistics.median(sizes),
+        }
+
+    def print_table(self, results):
+        self.stdout.write(
+            f"{'endpoint':<30} {'status':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'bytes':>9}"
+        )
+        for name, result in results.items():
+            status = ",".join(str(code) for code in result["status"])
+            self.stdout.write(
+                f"{name:<30} {status:>8} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                f"{result['queries_max']:>8} {result['bytes_median']:>9.0f}"
+            )
+
+    def compare(self, report, baseline, threshold, min_ms):
+        """
+        Fail on any extra query, or on a p95 slowdown beyond the threshold that
+        is also more than min_ms milliseconds: on endpoints answering in a few
+        milliseconds, timer jitter alone exceeds the relative threshold.
+        """
+        if baseline.get("dataset") != report["dataset"]:
+            self.stdout.write(self.style.WARNING("Baseline was recorded with a different dataset; comparing anyway."))
+        regressions = []
+        for name, result in report["results"].items():
+            before = baseline.get("results", {}).get(name)
+            if before is None:
+                continue
+            slowdown = result["p95_ms"] - before["p95_ms"]
+            if result["p95_ms"] > before["p95_ms"] * (1 + threshold) and slowdown > min_ms:
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f} ms -> {result['p95_ms']:.2f} ms")
+            if result["queries_max"] > before["queries_max"]:
+                regressions.append(f"{name}: queries {before['queries_max']} -> {result['queries_max']}")
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
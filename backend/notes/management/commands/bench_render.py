@@ -0,0 +1,70 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from notes.bench import create_categories, create_user, isolated_database, seed_notes
+from notes_project.compression import ENCODERS
+from notes_project.renderers import orjson
+
+
+class Command(BaseCommand):
+    """Management command comparing JSON backends and response encodings on the notes endpoints."""
+
+    help = (
+        "Report CPU time per request and bytes on the wire for the note list and the NDJSON export "
+        "at several dataset sizes, per JSON backend and Content-Encoding"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="50,200,1000,5000", help="Comma-separated notes per user.")
+        parser.add_argument("--iterations", type=int, default=20, help="Requests per measurement.")
+        parser.add_argument("--limit", type=int, default=200, help="Page size of the note list.")
+
+    def handle(self, *args, **options):
+        """Seed one user per dataset size, then measure each endpoint under every backend/encoding pair."""
+        backends = ["json"] + (["orjson"] if orjson is not None else [])
+        variants = [(backend, "identity") for backend in backends]
+        variants += [(backends[-1], encoding) for encoding in ENCODERS]
+        self.stdout.write(
+            f"{'endpoint':<10} {'notes':>6} {'json':<7} {'encoding':<9} {'CPU ms/req':>11} {'bytes':>10}"
+        )
+        with isolated_database():
+            categories = create_categories()
+            rng = random.Random(1)
+            for index, size in enumerate(int(value) for value in options["sizes"].split(",")):
+                user = create_user(index)
+                seed_notes(user, categories, size, rng)
+                client = Client()
+                client.force_login(user)
+                endpoints = [
+                    ("list", f"{reverse('notes:note-list')}?limit={options['limit']}"),
+                    ("export", reverse("notes:note-export")),
+                ]
+                for name, url in endpoints:
+                    for backend, encoding in variants:
+                        cpu, size_on_wire = self.measure(client, url, backend, encoding, options["iterations"])
+                        self.stdout.write(
+                            f"{name:<10} {size:>6} {backend:<7} {encoding:<9} {cpu:>11.2f} {size_on_wire:>10}"
+                        )
+
+    def measure(self, client, url, backend, encoding, iterations):
+        """Median CPU time of a request (including the test client) and the size of its body."""
+        timings = []
+        with override_settings(
+            JSON_BACKEND=backend,
+            COMPRESSION_ENCODINGS=[encoding],
+            METRICS_QUERY_BUDGET=0,
+            METRICS_LATENCY_BUDGET_MS=0,
+            THROTTLE_ENABLED=False,
+            LOAD_SHEDDING_ENABLED=False,
+        ):
+            for _ in range(iterations):
+                start = time.process_time()
+                response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                body = b"".join(response.streaming_content) if response.streaming else response.content
+                timings.append((time.process_time() - start) * 1000)
+        return statistics.median(timings), len(body)
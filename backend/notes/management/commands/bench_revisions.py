@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import BinaryField, Sum
+from django.db.models.functions import Cast, Coalesce, Length
+from django.test import override_settings
+
+from notes.bench import WORDS, create_categories, create_user, isolated_database, percentile, seed_notes
+from notes.models import NoteRevision
+from notes.patching import apply_note_patch
+from notes.revisions import rebuild_revision
+
+
+class Command(BaseCommand):
+    """Management command comparing revision storage layouts."""
+
+    help = (
+        "Record the same edit history with a full snapshot per revision and with snapshots every "
+        "--snapshot-every revisions plus deltas, and compare storage and rebuild latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--notes", type=int, default=10, help="Notes to edit.")
+        parser.add_argument("--edits", type=int, default=200, help="Autosaves per note, each kept as a revision.")
+        parser.add_argument("--snapshot-every", default="10,50", help="Comma-separated snapshot intervals to compare.")
+        parser.add_argument("--rebuilds", type=int, default=500, help="Random revisions to rebuild per layout.")
+
+    def handle(self, *args, **options):
+        """Replay one seeded edit history per layout on a throwaway database and print the results."""
+        intervals = [1, *(int(value) for value in options["snapshot_every"].split(",") if value)]
+        self.stdout.write(f"{'layout':<18} {'rows':>7} {'bytes':>11} {'per rev':>8} {'p50 ms':>7} {'p95 ms':>7}")
+        with isolated_database():
+            categories = create_categories()
+            for index, interval in enumerate(intervals):
+                rng = random.Random(1)
+                user = create_user(index)
+                notes = seed_notes(user, categories, options["notes"], rng)
+                with override_settings(NOTES_REVISION_INTERVAL=0, NOTES_REVISION_SNAPSHOT_EVERY=interval):
+                    for _ in range(options["edits"]):
+                        for note in notes:
+                            self.edit(note, user, rng)
+
+                revisions = NoteRevision.objects.filter(note__user=user)
+                rows = revisions.count()
+                stored = self.stored_bytes(user)
+                targets = list(revisions.values_list("note_id", "number"))
+                latencies = []
+                for note_id, number in rng.sample(targets, min(len(targets), options["rebuilds"])):
+                    start = time.perf_counter()
+                    rebuild_revision(note_id, number)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+                label = "full snapshots" if interval == 1 else f"snapshot every {interval}"
+                self.stdout.write(
+                    f"{label:<18} {rows:>7} {stored:>11} {stored / max(rows, 1):>8.0f} "
+                    f"{percentile(latencies, 50):>7.2f} {percentile(latencies, 95):>7.2f}"
+                )
+
+    @staticmethod
+    def edit(note, user, rng):
+        """One autosave: usually a few typed words, sometimes a deleted span."""
+        note.refresh_from_db(fields=["content", "version"])
+        pos = rng.randint(0, len(note.content))
+        if note.content and rng.random() < 0.2:
+            op = {"field": "content", "pos": pos, "delete": min(rng.randint(1, 40), len(note.content) - pos), "insert": ""}
+        else:
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8)))
+            op = {"field": "content", "pos": pos, "delete": 0, "insert": f"{words} "}
+        apply_note_patch(note.id, user, note.version, [op])
+
+    @staticmethod
+    def stored_bytes(user):
+        """Bytes of title, content and delta across the user's revisions, as stored."""
+        def size(field):
+            return Coalesce(Length(Cast(field, BinaryField())), 0)
+
+        total = NoteRevision.objects.filter(note__user=user).aggregate(
+            total=Sum(size("title") + size("content") + size("delta"))
+        )["total"]
+        return total or 0
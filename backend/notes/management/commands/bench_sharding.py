@@ -0,0 +1,138 @@
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from accounts.models import User
+from notes.bench import create_categories, create_user, percentile, seed_notes
+from notes.models import Note
+from notes_project.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    """Management command measuring autosave throughput as users are spread over more shards."""
+
+    help = (
+        "Run concurrent autosave writers, each in its own process and for its own user, against "
+        "throwaway SQLite files with NOTES_SHARD_COUNT set to each of --shards in turn, and compare "
+        "write throughput, latency and `database is locked` errors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shards", default="0,2,4", help="Comma-separated NOTES_SHARD_COUNT values to compare (0: unsharded)."
+        )
+        parser.add_argument("--writers", type=int, default=8, help="Processes sending autosave PATCHes.")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run.")
+        parser.add_argument("--notes", type=int, default=50, help="Notes per writer.")
+        # As in bench_sqlite_locking, settings are read once per process: children are started
+        # with NOTES_SHARD_COUNT, DB_PROFILE and SQLITE_PATH set, and these options select their part.
+        parser.add_argument("--role", choices=["setup", "writer"], help=argparse.SUPPRESS)
+        parser.add_argument("--index", type=int, default=0, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        """Seed fresh databases per shard count, then run the writer processes against them together."""
+        if options["role"] == "setup":
+            for alias in shard_aliases():
+                call_command("migrate", database=alias, verbosity=0)
+            rng = random.Random(1)
+            categories = create_categories()
+            users = Counter()
+            for index in range(options["writers"]):
+                user = create_user(index)
+                seed_notes(user, categories, options["notes"], rng)
+                users[user.shard or "default"] += 1
+            self.stdout.write(json.dumps(users))
+            return
+        if options["role"]:
+            self.stdout.write(json.dumps(self.run_writer(options)))
+            return
+
+        try:
+            counts = [int(count) for count in options["shards"].split(",")]
+        except ValueError:
+            raise CommandError("--shards takes comma-separated integers, e.g. 0,2,4.")
+        self.stdout.write(f"{'shards':>6} {'writes/s':>9} {'p50 ms':>7} {'p95 ms':>7} {'locked':>7}  users per database")
+        for count in counts:
+            with tempfile.TemporaryDirectory() as directory:
+                env = {
+                    **os.environ,
+                    "DB_PROFILE": "production",
+                    "NOTES_SHARD_COUNT": str(count),
+                    "SQLITE_PATH": str(Path(directory) / "bench.db"),
+                }
+                setup = self.child(options, "setup", env)
+                placement = json.loads(setup.communicate()[0].strip().splitlines()[-1])
+                children = [self.child(options, "writer", env, index) for index in range(options["writers"])]
+                results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+            self.report(count, placement, results, options["seconds"])
+
+    def child(self, options, role, env, index=0):
+        command = [
+            sys.executable, sys.argv[0], "bench_sharding", "--role", role, "--index", str(index),
+            "--writers", str(options["writers"]), "--seconds", str(options["seconds"]),
+            "--notes", str(options["notes"]),
+        ]
+        return subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+
+    def report(self, count, placement, results, seconds):
+        latencies, locked, errors = [], 0, Counter()
+        for result in results:
+            latencies += result["latencies"]
+            locked += result["locked"]
+            errors.update(result["errors"])
+        writes = len(latencies) - sum(errors.values())
+        self.stdout.write(
+            f"{count:>6} {writes / seconds:>9.1f} {percentile(latencies or [0], 50):>7.1f} "
+            f"{percentile(latencies or [0], 95):>7.1f} {locked:>7}  {placement}"
+            + (f"  other errors {dict(errors)}" if errors else "")
+        )
+
+    def run_writer(self, options):
+        # Failed requests would otherwise each log a traceback.
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        setup_test_environment()
+        rng = random.Random(options["index"])
+        user = User.objects.get(email=f"bench{options['index']}@example.com")
+        notes = dict(Note.objects.for_user(user).values_list("id", "version"))
+        client = Client()
+        client.force_login(user)
+
+        latencies, locked, errors = [], 0, Counter()
+        deadline = time.perf_counter() + options["seconds"]
+        with override_settings(
+            METRICS_QUERY_BUDGET=0, METRICS_LATENCY_BUDGET_MS=0, THROTTLE_ENABLED=False, LOAD_SHEDDING_ENABLED=False
+        ):
+            while time.perf_counter() < deadline:
+                note_id = rng.choice(list(notes))
+                body = {"version": notes[note_id], "ops": [{"pos": 0, "insert": rng.choice("abc")}]}
+                start = time.perf_counter()
+                try:
+                    response = client.patch(
+                        reverse("notes:note-update", args=[note_id]), body, content_type="application/json"
+                    )
+                except OperationalError as error:
+                    if "locked" not in str(error):
+                        raise
+                    locked += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code == 200:
+                    notes[note_id] = response.json()["version"]
+                else:
+                    errors[response.status_code] += 1
+        return {"latencies": latencies, "locked": locked, "errors": errors}
@@ -0,0 +1,157 @@
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from accounts.models import User
+from notes.bench import WORDS, create_categories, create_user, percentile, seed_notes
+from notes.models import Category, Note
+
+PROFILES = ["development", "production"]
+
+
+class Command(BaseCommand):
+    """Management command measuring SQLite lock errors under concurrent autosaves and reads."""
+
+    help = (
+        "Run concurrent autosave writers and list/detail readers, each in its own process like "
+        "server workers, against a throwaway SQLite file once per DB_PROFILE, and compare "
+        "`database is locked` errors and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4, help="Processes sending autosave PATCHes.")
+        parser.add_argument("--readers", type=int, default=4, help="Processes reading categories, lists and notes.")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run.")
+        parser.add_argument("--notes", type=int, default=100, help="Notes per writer.")
+        parser.add_argument(
+            "--busy-timeout",
+            type=int,
+            help="Milliseconds a connection waits for a lock in both profiles (default: each profile's own, "
+            "5000); lower it to stand in for a busier server.",
+        )
+        # Settings are read once per process, so the workload runs in child processes started
+        # with DB_PROFILE and SQLITE_PATH set; these options select a child's part.
+        parser.add_argument("--role", choices=["setup", "writer", "reader"], help=argparse.SUPPRESS)
+        parser.add_argument("--index", type=int, default=0, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        """Seed a fresh database per profile, then run writer and reader processes against it together."""
+        if options["role"] == "setup":
+            call_command("migrate", verbosity=0)
+            rng = random.Random(1)
+            categories = create_categories()
+            for index in range(options["writers"]):
+                seed_notes(create_user(index), categories, options["notes"], rng)
+            return
+        if options["role"]:
+            self.stdout.write(json.dumps(self.run_client(options)))
+            return
+
+        for profile in PROFILES:
+            with tempfile.TemporaryDirectory() as directory:
+                env = {**os.environ, "DB_PROFILE": profile, "SQLITE_PATH": str(Path(directory) / "bench.db")}
+                self.child(options, "setup", env).communicate()
+                children = [self.child(options, "writer", env, index) for index in range(options["writers"])]
+                children += [self.child(options, "reader", env, index) for index in range(options["readers"])]
+                results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+            self.report(profile, results, options["seconds"])
+
+    def child(self, options, role, env, index=0):
+        command = [
+            sys.executable, sys.argv[0], "bench_sqlite_locking", "--role", role, "--index", str(index),
+            "--writers", str(options["writers"]), "--seconds", str(options["seconds"]),
+            "--notes", str(options["notes"]),
+        ]
+        if options["busy_timeout"] is not None:
+            command += ["--busy-timeout", str(options["busy_timeout"])]
+        return subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+
+    @staticmethod
+    def set_busy_timeout(milliseconds):
+        for alias in connections:
+            connection_options = connections[alias].settings_dict["OPTIONS"]
+            if "pragmas" in connection_options:
+                connection_options["pragmas"]["busy_timeout"] = milliseconds
+            else:
+                connection_options["timeout"] = milliseconds / 1000
+
+    def report(self, profile, results, seconds):
+        latencies = {"writer": [], "reader": []}
+        locked, errors = Counter(), Counter()
+        for result in results:
+            latencies[result["role"]] += result["latencies"]
+            locked[result["role"]] += result["locked"]
+            errors.update(result["errors"])
+        requests = sum(len(values) for values in latencies.values()) + sum(locked.values())
+        self.stdout.write(
+            f"{profile:<12} {requests / seconds:7.1f} req/s   "
+            f"`database is locked`: writes {locked['writer']:4d}, reads {locked['reader']:4d}   "
+            f"write p95 {percentile(latencies['writer'] or [0], 95):7.1f} ms, "
+            f"read p95 {percentile(latencies['reader'] or [0], 95):7.1f} ms   "
+            f"other errors {dict(errors) or '-'}"
+        )
+
+    def run_client(self, options):
+        # Failed requests would otherwise each log a traceback.
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        setup_test_environment()
+        role = options["role"]
+        rng = random.Random(f"{role}{options['index']}")
+        user = User.objects.get(email=f"bench{options['index'] % options['writers']}@example.com")
+        notes = {note_id: version for note_id, version in Note.objects.filter(user=user).values_list("id", "version")}
+        categories = list(Category.objects.values_list("id", flat=True))
+        client = Client()
+        client.force_login(user)
+        reads = [reverse("notes:category-list"), reverse("notes:note-list")]
+        reads += [reverse("notes:note-detail", args=[note_id]) for note_id in list(notes)[:20]]
+        if options["busy_timeout"] is not None:
+            # Only the measured requests run with it; reconnect to apply it.
+            self.set_busy_timeout(options["busy_timeout"])
+            connections.close_all()
+
+        latencies, locked, errors = [], 0, Counter()
+        deadline = time.perf_counter() + options["seconds"]
+        with override_settings(
+            METRICS_QUERY_BUDGET=0, METRICS_LATENCY_BUDGET_MS=0, THROTTLE_ENABLED=False, LOAD_SHEDDING_ENABLED=False
+        ):
+            while time.perf_counter() < deadline:
+                note_id = rng.choice(list(notes))
+                start = time.perf_counter()
+                try:
+                    if role == "writer":
+                        # Mostly delta autosaves; some full saves, which read the note before writing it.
+                        if rng.random() < 0.7:
+                            body = {"version": notes[note_id], "ops": [{"pos": 0, "insert": rng.choice("abc")}]}
+                        else:
+                            body = {"title": rng.choice(WORDS), "category": str(rng.choice(categories))}
+                        response = client.patch(
+                            reverse("notes:note-update", args=[note_id]), body, content_type="application/json"
+                        )
+                        if response.status_code == 200:
+                            notes[note_id] = response.json()["version"]
+                    else:
+                        response = client.get(rng.choice(reads))
+                except OperationalError as error:
+                    if "locked" not in str(error):
+                        raise
+                    locked += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors[response.status_code] += 1
+        return {"role": role, "latencies": latencies, "locked": locked, "errors": errors}
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from notes.models import NoteRevision
+from notes.revisions import compact_revisions
+from notes_project.routers import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    """Management command thinning out old note revisions."""
+
+    help = (
+        "Keep one revision per day (the last) of revisions older than --days, and at most "
+        "--max-revisions per note, re-encoding the survivors as snapshots and deltas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Keep every revision from the last N days.")
+        parser.add_argument(
+            "--max-revisions",
+            type=int,
+            default=0,
+            help="Then keep at most this many revisions per note, the newest (default: no limit).",
+        )
+
+    def handle(self, *args, **options):
+        """Compact each note with revisions to drop, one transaction per note."""
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        compacted = deleted = 0
+        for alias in shard_aliases():
+            with use_shard(alias):
+                for note_id in self.notes_to_compact(cutoff, options["max_revisions"]):
+                    with transaction.atomic(using=alias):
+                        rows = NoteRevision.objects.filter(note_id=note_id).order_by("number")
+                        numbers = rows.values_list("number", "created_at")
+                        keep = self.survivors(numbers, cutoff, options["max_revisions"])
+                        if len(keep) < rows.count():
+                            deleted += compact_revisions(note_id, keep)
+                            compacted += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} revisions of {compacted} notes"))
+
+    @staticmethod
+    def notes_to_compact(cutoff, max_revisions):
+        revisions = NoteRevision.objects.order_by()
+        note_ids = set(revisions.filter(created_at__lt=cutoff).values_list("note_id", flat=True).distinct())
+        if max_revisions:
+            note_ids.update(
+                revisions.values("note_id")
+                .annotate(total=Count("id"))
+                .filter(total__gt=max_revisions)
+                .values_list("note_id", flat=True)
+            )
+        return note_ids
+
+    @staticmethod
+    def survivors(rows, cutoff, max_revisions):
+        """Numbers to keep from (number, created_at) rows in number order."""
+        days = {}
+        keep = []
+        for number, created_at in rows:
+            if created_at < cutoff:
+                # Later revisions of the same day replace earlier ones.
+                days[created_at.date()] = number
+            else:
+                keep.append(number)
+        keep = sorted(days.values()) + keep
+        if max_revisions:
+            keep = keep[-max_revisions:]
+        return set(keep)
@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Func, Value, When
+
+from notes.fields import CODECS, compress_text
+from notes.models import Note
+from notes_project.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    """Management command converting stored note content to or from the compressed format."""
+
+    help = (
+        "Compress existing note content in small batches, while the app keeps serving "
+        "(see notes.fields). --decompress stores everything as plain text again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Notes per transaction.")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between batches.")
+        parser.add_argument(
+            "--recompress",
+            action="store_true",
+            help="Also re-encode content stored with another codec or dictionary than the current settings.",
+        )
+        parser.add_argument("--decompress", action="store_true", help="Store all content as plain text.")
+
+    def handle(self, *args, **options):
+        """Walk the notes table of each shard by primary key, rewriting only the rows whose storage needs to change."""
+        if connection.vendor != "sqlite":
+            self.stdout.write("Nothing to do: only SQLite stores note content compressed.")
+            return
+
+        current_header = bytes([CODECS[settings.NOTES_CONTENT_CODEC], settings.NOTES_CONTENT_DICTIONARY])
+        rewritten, before, after = 0, 0, 0
+        for alias in shard_aliases():
+            last_pk = None
+            notes = Note.objects.using(alias).order_by("pk").annotate(
+                storage=Func(F("content"), function="typeof", output_field=models.CharField()),
+                header=Func(F("content"), 1, 2, function="substr", output_field=models.BinaryField()),
+            )
+            while True:
+                batch = notes if last_pk is None else notes.filter(pk__gt=last_pk)
+                rows = list(batch.values_list("pk", "version", "storage", "header", "content")[:options["batch_size"]])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+
+                updates = []
+                for pk, version, storage, header, content in rows:
+                    if options["decompress"]:
+                        if storage == "blob":
+                            updates.append((pk, version, content))
+                    elif storage == "text" or (options["recompress"] and bytes(header) != current_header):
+                        stored = compress_text(content)
+                        if stored != content or storage == "blob":
+                            updates.append((pk, version, stored))
+                            before += len(content.encode())
+                            after += len(stored)
+                if updates:
+                    self.rewrite(updates, alias)
+                    rewritten += len(updates)
+                self.stdout.write(f"{rewritten} notes rewritten (up to {last_pk} on {alias})")
+                if options["sleep"]:
+                    time.sleep(options["sleep"])
+
+        summary = f"Done; {rewritten} notes rewritten"
+        if before:
+            summary += f", {before} bytes stored in {after} ({after / before:.0%})"
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    @staticmethod
+    def rewrite(updates, alias):
+        """
+        Store new values in one UPDATE. A note written since it was read keeps its
+        content: the version condition fails, and the write stored it compressed anyway.
+        Timestamps, version and watermarks stay as they are, since the text is unchanged.
+        """
+        whens = [
+            When(
+                pk=pk,
+                version=version,
+                then=Value(stored, output_field=models.BinaryField() if isinstance(stored, bytes) else models.TextField()),
+            )
+            for pk, version, stored in updates
+        ]
+        with transaction.atomic(using=alias):
+            Note.objects.using(alias).filter(pk__in=[pk for pk, _, _ in updates]).update(
+                content=Case(*whens, default=F("content"), output_field=models.TextField())
+            )
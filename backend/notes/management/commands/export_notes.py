@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from notes.export import FORMATS, export_chunks
+from notes.models import Note
+from notes_project.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    """Management command streaming every user's notes to NDJSON or a ZIP of Markdown files."""
+
+    help = "Export notes of all users (or --user) as NDJSON or a ZIP of Markdown files, one user per folder"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(FORMATS), default="ndjson", help="Export format.")
+        parser.add_argument("--output", default="-", help="Output file; - writes NDJSON to standard output.")
+        parser.add_argument("--user", action="append", help="Only export this user's notes (email; repeatable).")
+
+    def handle(self, *args, **options):
+        """Write the export chunk by chunk."""
+        fmt, output = options["format"], options["output"]
+        if fmt == "zip" and output == "-":
+            raise CommandError("--output is required for ZIP exports")
+
+        notes = [Note.objects.using(alias).order_by("user_id", "created_at") for alias in shard_aliases()]
+        if options["user"]:
+            user_ids = list(User.objects.filter(email__in=options["user"]).values_list("id", flat=True))
+            notes = [queryset.filter(user_id__in=user_ids) for queryset in notes]
+
+        stream = sys.stdout.buffer if output == "-" else open(output, "wb")
+        try:
+            for chunk in export_chunks(fmt, notes, include_user=True):
+                stream.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+        if output != "-":
+            self.stdout.write(self.style.SUCCESS(f"Exported notes to {output}"))
@@ -0,0 +1,176 @@
+import csv
+import json
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from accounts.models import User
+from notes.counters import rebuild_note_counts
+from notes.models import Category, Note
+from notes.search import index_notes
+from notes.watermarks import bump_watermark
+from notes_project.routers import use_shard
+
+# Imported notes without an id get uuid5(IMPORT_NAMESPACE, "<source id>:<row number>"), so
+# re-running an interrupted import skips the rows it already inserted instead of duplicating them.
+IMPORT_NAMESPACE = uuid.UUID("5d1d8f7e-2b0a-4c55-9a57-4f0b7e1c2a9d")
+
+
+class InvalidRow(ValueError):
+    """A row that cannot be turned into a note."""
+
+
+class Command(BaseCommand):
+    """Management command streaming notes from NDJSON or CSV into the database."""
+
+    help = (
+        "Import notes from an NDJSON or CSV file (or - for stdin). Each row needs `user` (email), "
+        "`category` (name or id) and `title`/`content`; `id` is optional."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - to read standard input.")
+        parser.add_argument("--format", choices=["ndjson", "csv"], help="Input format (default: from the extension).")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per bulk INSERT.")
+        parser.add_argument("--chunks-per-transaction", type=int, default=10, help="Chunks committed together.")
+        parser.add_argument("--progress-file", help="Where to record committed rows (default: <path>.progress).")
+        parser.add_argument("--restart", action="store_true", help="Ignore recorded progress and start over.")
+        parser.add_argument("--skip-invalid", action="store_true", help="Skip rows that fail validation.")
+        parser.add_argument(
+            "--source-id",
+            help="Identifies the input when deriving note ids (default: the file name).",
+        )
+
+    def handle(self, *args, **options):
+        """Stream the rows in, indexing them and recounting their owners' categories as each batch commits."""
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        if options["progress_file"]:
+            progress_path = Path(options["progress_file"])
+        else:
+            progress_path = None if path == "-" else Path(f"{path}.progress")
+        self.source_id = options["source_id"] or ("stdin" if path == "-" else Path(path).name)
+        self.users, self.shards = {}, {}
+        for email, pk, shard in User.objects.values_list("email", "id", "shard"):
+            self.users[email.lower()] = pk
+            self.shards[pk] = shard or DEFAULT_DB_ALIAS
+        self.categories = {}
+        for category in Category.objects.all():
+            self.categories[category.name.lower()] = category.pk
+            self.categories[str(category.pk)] = category.pk
+
+        done = 0
+        if progress_path and progress_path.exists() and not options["restart"]:
+            done = json.loads(progress_path.read_text())["rows"]
+            self.stdout.write(f"Resuming after {done} committed rows")
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            rows = enumerate(self.read_rows(stream, fmt), start=1)
+            for _ in islice(rows, done):
+                pass
+            imported, skipped, elapsed = self.import_rows(rows, done, progress_path, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f"Inserted {imported} notes in {elapsed:.1f}s ({rate:.0f} rows/sec), skipped {skipped}")
+        if progress_path and progress_path.exists():
+            progress_path.unlink()
+        self.stdout.write(self.style.SUCCESS("Import complete"))
+
+    def read_rows(self, stream, fmt):
+        if fmt == "csv":
+            yield from csv.DictReader(stream)
+            return
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield error
+
+    def import_rows(self, rows, done, progress_path, options):
+        chunk_size = options["chunk_size"]
+        per_transaction = chunk_size * options["chunks_per_transaction"]
+        imported = skipped = 0
+        start = time.perf_counter()
+        while True:
+            batch = list(islice(rows, per_transaction))
+            if not batch:
+                break
+            notes = []
+            for row_number, row in batch:
+                try:
+                    notes.append(self.build_note(row_number, row))
+                except InvalidRow as error:
+                    if not options["skip_invalid"]:
+                        raise CommandError(f"Row {row_number}: {error} (use --skip-invalid to skip such rows)")
+                    skipped += 1
+            by_shard = defaultdict(list)
+            for note in notes:
+                by_shard[self.shards[note.user_id]].append(note)
+            # A batch spanning shards commits once per shard; a re-run skips the rows already in.
+            # The search entries and counters commit with the notes, so searches and counts never
+            # see part of a batch, and only the imported notes and their owners are touched.
+            for alias, shard_notes in by_shard.items():
+                with use_shard(alias), transaction.atomic(using=alias):
+                    self.stamp_change_seqs(shard_notes)
+                    for offset in range(0, len(shard_notes), chunk_size):
+                        chunk = shard_notes[offset:offset + chunk_size]
+                        Note.objects.using(alias).bulk_create(chunk, ignore_conflicts=True)
+                        # Index the rows as stored: a conflicting id keeps the note already there.
+                        stored = Note.objects.using(alias).filter(id__in=[note.id for note in chunk])
+                        index_notes(stored.only("id", "user", "category", "title", "content"), using=alias)
+                    rebuild_note_counts({note.user_id for note in shard_notes})
+
+            done += len(batch)
+            imported += len(notes)
+            if progress_path:
+                progress_path.write_text(json.dumps({"rows": done}))
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{done} rows committed ({imported / elapsed:.0f} rows/sec)")
+        return imported, skipped, time.perf_counter() - start
+
+    def build_note(self, row_number, row):
+        if not isinstance(row, dict):
+            raise InvalidRow(f"not an object ({row})")
+        user_id = self.users.get(str(row.get("user") or "").strip().lower())
+        if user_id is None:
+            raise InvalidRow(f"unknown user {row.get('user')!r}")
+        category_id = self.categories.get(str(row.get("category") or "").strip().lower())
+        if category_id is None:
+            raise InvalidRow(f"unknown category {row.get('category')!r}")
+        title = row.get("title") or "Note Title:"
+        if len(title) > Note._meta.get_field("title").max_length:
+            raise InvalidRow("title is too long")
+        try:
+            note_id = uuid.UUID(row["id"]) if row.get("id") else uuid.uuid5(
+                IMPORT_NAMESPACE, f"{self.source_id}:{row_number}"
+            )
+        except ValueError:
+            raise InvalidRow(f"invalid id {row['id']!r}")
+
+        note = Note(id=note_id, user_id=user_id, category_id=category_id, title=title, content=row.get("content") or "")
+        note.refresh_text_stats()
+        return note
+
+    @staticmethod
+    def stamp_change_seqs(notes):
+        """Reserve one block of change sequence numbers per user, so the change feed picks the notes up."""
+        per_user = Counter(note.user_id for note in notes)
+        next_seq = {
+            user_id: bump_watermark(user_id, by=count) - count + 1
+            for user_id, count in per_user.items()
+        }
+        for note in notes:
+            note.change_seq = next_seq[note.user_id]
+            next_seq[note.user_id] += 1
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from notes.models import NoteTombstone, NoteWatermark
+from notes_project.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    """Management command to prune old change-feed tombstones."""
+
+    help = "Delete note tombstones older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Keep tombstones from the last N days.")
+
+    def handle(self, *args, **options):
+        """Delete old tombstones and make clients with older cursors resync."""
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        deleted = 0
+        for alias in shard_aliases():
+            with transaction.atomic(using=alias):
+                expired = NoteTombstone.objects.using(alias).filter(deleted_at__lt=cutoff)
+                pruned_through = expired.order_by().values("user_id").annotate(seq=Max("change_seq"))
+                for row in pruned_through:
+                    NoteWatermark.objects.using(alias).filter(user_id=row["user_id"]).update(
+                        resync_before=Greatest("resync_before", row["seq"])
+                    )
+                deleted += expired.delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tombstones older than {options['days']} days"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+
+from accounts.models import User
+from notes.models import Note
+from notes.sharding import move_user
+from notes_project.routers import shard_aliases, shard_for_user
+
+
+class Command(BaseCommand):
+    """Management command showing how users are spread over the shards and moving users between them."""
+
+    help = (
+        "Show users and notes per shard, or move --user to the shard --to (default: the one with the "
+        "fewest notes). The user's writes wait while its notes are copied"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", help="Email of a user to move (repeatable).")
+        parser.add_argument("--to", choices=shard_aliases(), help="Database to move the users to.")
+
+    def handle(self, *args, **options):
+        """Move the given users one at a time, then print where everyone is."""
+        for email in options["user"] or []:
+            user = User.objects.filter(email__iexact=email).first()
+            if user is None:
+                raise CommandError(f"Unknown user {email}")
+            target = options["to"] or min(self.note_counts().items(), key=lambda item: item[1])[0]
+            source = shard_for_user(user)
+            moved = move_user(user, target)
+            if source == target:
+                self.stdout.write(f"{user.email} is already on {target}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Moved {user.email} and {moved} notes from {source} to {target}"))
+
+        users = {
+            shard or DEFAULT_DB_ALIAS: total
+            for shard, total in User.objects.order_by().values_list("shard").annotate(total=Count("id"))
+        }
+        for alias, notes in self.note_counts().items():
+            self.stdout.write(f"{alias:<12} {users.get(alias, 0):>8} users {notes:>10} notes")
+
+    @staticmethod
+    def note_counts():
+        return {alias: Note.objects.using(alias).count() for alias in shard_aliases()}
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notes.counters import compute_note_counts, rebuild_note_counts, stored_note_counts
+from notes_project.routers import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    """Management command to rebuild and verify per-user category note counters."""
+
+    help = "Rebuild the per-user category note counters from the notes table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the counters; exit with an error if any have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        """Report drifted counters, then rebuild them unless --check is given; one transaction per shard."""
+        checked = rebuilt = drifted = 0
+        for alias in shard_aliases():
+            with use_shard(alias), transaction.atomic(using=alias):
+                expected = compute_note_counts()
+                drift = self.find_drift(expected, stored_note_counts())
+                drifted += len(drift)
+
+                for (user_id, category_id), (stored, actual) in sorted(drift.items(), key=str):
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"Counter drift for user {user_id}, category {category_id}: "
+                            f"stored {stored}, actual {actual}"
+                        )
+                    )
+
+                if options["check"]:
+                    checked += len(expected)
+                    continue
+
+                counts = rebuild_note_counts()
+                if stored_note_counts() != counts:
+                    raise CommandError("Category note counters still differ after rebuild")
+                rebuilt += len(counts)
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(f"{drifted} category note counter(s) out of sync")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} category note counters are in sync"))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rebuilt} category note counters ({drifted} had drifted)")
+        )
+
+    @staticmethod
+    def find_drift(expected, stored):
+        """Return {(user_id, category_id): (stored, actual)} for every mismatched counter."""
+        keys = expected.keys() | stored.keys()
+        return {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in keys
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
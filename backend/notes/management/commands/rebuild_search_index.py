@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from notes.search import get_search_backend
+from notes_project.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    """Management command to rebuild the notes full-text search index."""
+
+    help = "Rebuild the full-text search index from the notes table"
+
+    def handle(self, *args, **kwargs):
+        """Re-index every note, in one transaction per shard."""
+        indexed = 0
+        for alias in shard_aliases():
+            backend = get_search_backend(alias)
+            with transaction.atomic(using=alias):
+                backend.create_index()
+                indexed += backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} notes"))
@@ -0,0 +1,66 @@
+import re
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.fields import DICTIONARY_DIR
+from notes.models import Note
+from notes_project.routers import shard_aliases
+
+# zlib only looks back 32 KiB, so a larger dictionary would not help it.
+MAX_SIZE = 32 * 1024
+_TOKENS = re.compile(r"\S+\s*")
+
+
+class Command(BaseCommand):
+    """Management command building a shared compression dictionary from existing notes."""
+
+    help = (
+        "Train a raw-content dictionary for compressed note content from a sample of notes and save it "
+        "as notes/dictionaries/<next id>.dict; set NOTES_CONTENT_DICTIONARY to that id to use it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=5000, help="Notes to sample.")
+        parser.add_argument("--size", type=int, default=16 * 1024, help=f"Dictionary size in bytes (max {MAX_SIZE}).")
+
+    def handle(self, *args, **options):
+        """Pick the word sequences that save the most bytes across the sample, most valuable last."""
+        size = min(options["size"], MAX_SIZE)
+        aliases = shard_aliases()
+        per_shard = -(-options["samples"] // len(aliases))
+        samples = []
+        for alias in aliases:
+            samples += Note.objects.using(alias).order_by("?").values_list("content", flat=True)[:per_shard]
+        if not samples:
+            raise CommandError("There are no notes to train on.")
+
+        # A sequence of 1-4 words is worth what it would save: its length, once per note it appears in.
+        scores = Counter()
+        for content in samples:
+            tokens = _TOKENS.findall(content)
+            grams = {"".join(tokens[start:start + length]) for length in range(1, 5) for start in range(len(tokens))}
+            for gram in grams:
+                if len(gram) > 3:
+                    scores[gram] += len(gram)
+        chosen, total = [], 0
+        for gram, score in scores.most_common():
+            if score <= 2 * len(gram):
+                break  # appears in fewer than three notes
+            if total + len(gram) > size or any(gram in longer for longer in chosen):
+                continue
+            chosen.append(gram)
+            total += len(gram)
+
+        # zlib and zstd reach the end of the dictionary with the shortest distances.
+        dictionary = "".join(reversed(chosen)).encode()[:size]
+        DICTIONARY_DIR.mkdir(exist_ok=True)
+        dictionary_id = max((int(path.stem) for path in DICTIONARY_DIR.glob("*.dict")), default=0) + 1
+        if dictionary_id > 255:
+            raise CommandError("Dictionary ids are stored in one byte; there is no id left.")
+        path = DICTIONARY_DIR / f"{dictionary_id}.dict"
+        path.write_bytes(dictionary)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(dictionary)} bytes from {len(samples)} notes to {path}. Commit it and set "
+            f"NOTES_CONTENT_DICTIONARY={dictionary_id}, then run compress_note_content --recompress."
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_note_counts(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Note = apps.get_model("notes", "Note")
+    CategoryNoteCount = apps.get_model("notes", "CategoryNoteCount")
+    rows = Note.objects.using(db_alias).order_by().values("user_id", "category_id").annotate(total=models.Count("id"))
+    CategoryNoteCount.objects.using(db_alias).bulk_create(
+        [
+            CategoryNoteCount(user_id=row["user_id"], category_id=row["category_id"], count=row["total"])
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryNoteCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_counts', to='notes.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_note_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Category note count',
+                'verbose_name_plural': 'Category note counts',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='categorynotecount',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='unique_user_category_note_count'),
+        ),
+        migrations.RunPython(backfill_note_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+from notes.text import build_preview, count_words
+
+BATCH_SIZE = 500
+
+
+def backfill_previews(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Note = apps.get_model("notes", "Note")
+    batch = []
+    for note in Note.objects.using(db_alias).only("id", "content").iterator(chunk_size=BATCH_SIZE):
+        note.preview = build_preview(note.content, length=200)
+        note.word_count = count_words(note.content)
+        note.char_count = len(note.content)
+        batch.append(note)
+        if len(batch) == BATCH_SIZE:
+            Note.objects.using(db_alias).bulk_update(batch, ["preview", "word_count", "char_count"])
+            batch = []
+    if batch:
+        Note.objects.using(db_alias).bulk_update(batch, ["preview", "word_count", "char_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_categorynotecount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='char_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_previews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_watermarks(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Note = apps.get_model("notes", "Note")
+    NoteWatermark = apps.get_model("notes", "NoteWatermark")
+    rows = Note.objects.using(db_alias).order_by().values("user_id").annotate(changed_at=models.Max("last_edited_at"))
+    NoteWatermark.objects.using(db_alias).bulk_create(
+        [NoteWatermark(user_id=row["user_id"], counter=1, changed_at=row["changed_at"]) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0004_note_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteWatermark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='note_watermark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('counter', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Note watermark',
+                'verbose_name_plural': 'Note watermarks',
+            },
+        ),
+        migrations.RunPython(create_watermarks, migrations.RunPython.noop),
+    ]
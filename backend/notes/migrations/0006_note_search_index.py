@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE notes_note_fts USING fts5("
+            "title, content, note_id, user_id, category_id UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO notes_note_fts (title, content, note_id, user_id, category_id) "
+            "SELECT title, content, id, user_id, category_id FROM notes_note"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX notes_note_search_idx ON notes_note USING GIN (("
+            "setweight(to_tsvector('english'::regconfig, COALESCE(title, '')), 'A') || "
+            "setweight(to_tsvector('english'::regconfig, COALESCE(content, '')), 'B')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS notes_note_fts")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS notes_note_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_notewatermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def stamp_existing_notes(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    # Every owner's watermark counter is at least 1, so existing notes sort first in the feed.
+    Note = apps.get_model("notes", "Note")
+    Note.objects.using(db_alias).update(change_seq=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0006_note_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note_id', models.UUIDField()),
+                ('change_seq', models.PositiveBigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Note tombstone',
+                'verbose_name_plural': 'Note tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='notewatermark',
+            name='resync_before',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', 'change_seq'], name='notes_note_user_id_6ceb5f_idx'),
+        ),
+        migrations.AddField(
+            model_name='notetombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notetombstone',
+            index=models.Index(fields=['user', 'change_seq'], name='notes_notet_user_id_e4e19d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notetombstone',
+            index=models.Index(fields=['deleted_at'], name='notes_notet_deleted_d6c69d_idx'),
+        ),
+        migrations.RunPython(stamp_existing_notes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:51
+
+from django.db import migrations
+import notes.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0007_note_change_feed'),
+    ]
+
+    # The column stays TEXT: compressed values are stored as BLOBs in it (see notes.fields),
+    # so only the model state changes and SQLite does not rebuild the table. Existing rows
+    # are compressed in batches by the compress_note_content command.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='note',
+                    name='content',
+                    field=notes.fields.CompressedTextField(blank=True),
+                ),
+            ],
+        ),
+    ]
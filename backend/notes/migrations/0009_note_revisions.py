@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-18 01:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import notes.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_note_content_compressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='revised_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('version', models.PositiveIntegerField()),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('title', models.CharField(blank=True, max_length=500)),
+                ('content', notes.fields.CompressedTextField(blank=True)),
+                ('delta', models.JSONField(blank=True, null=True)),
+                ('edited_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='notes.note')),
+            ],
+            options={
+                'verbose_name': 'Note revision',
+                'verbose_name_plural': 'Note revisions',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='noterevision',
+            constraint=models.UniqueConstraint(fields=('note', 'number'), name='unique_note_revision_number'),
+        ),
+    ]
@@ -1,6 +1,30 @@
 import uuid
 from django.conf import settings
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from notes_project.routers import shard_for_user, shard_for_user_id, use_shard
+
+from .fields import CompressedTextField
+from .text import PREVIEW_LENGTH, build_preview, count_words
+
+
+class VersionConflict(Exception):
+    """The note changed after the version the client edited."""
+
+    def __init__(self, current_version):
+        super().__init__(f"Note is at version {current_version}.")
+        self.current_version = current_version
+
+
+class CategoryQuerySet(models.QuerySet):
+    """QuerySet helpers for Category."""
+
+    def with_note_counts(self, user):
+        """Annotate each category with the user's note count from the counter table."""
+        counts = CategoryNoteCount.objects.filter(user=user, category=OuterRef("pk")).values("count")[:1]
+        return self.annotate(note_count=Coalesce(Subquery(counts), 0))
 
 
 class Category(models.Model):
@@ -11,6 +35,8 @@ class Category(models.Model):
     color = models.CharField(max_length=7, help_text="Hex color code (e.g., #78aba8)")
     sort_order = models.IntegerField(default=0)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Category"
         verbose_name_plural = "Categories"
@@ -20,13 +46,36 @@ class Category(models.Model):
         return self.name
 
 
+class NoteQuerySet(models.QuerySet):
+    """QuerySet helpers for Note."""
+
+    def for_user(self, user):
+        """The user's notes, on the user's shard whatever the routing context of the caller."""
+        return self.using(shard_for_user(user)).filter(user=user)
+
+    def create(self, **kwargs):
+        """Create the note on its owner's shard (see Note.save) unless using() picked a database."""
+        note = self.model(**kwargs)
+        note.save(force_insert=True, using=self._db)
+        return note
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert the notes on their owner's shard unless using() picked a database; they share one owner."""
+        objs = list(objs)
+        if self._db is None and objs:
+            return self.using(shard_for_user_id(objs[0].user_id)).bulk_create(objs, *args, **kwargs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Note(models.Model):
     """Note model for storing user notes."""
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # No database constraint on user foreign keys: with sharding, users live in another database.
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name="notes"
     )
     category = models.ForeignKey(
@@ -35,11 +84,21 @@ class Note(models.Model):
         related_name="notes"
     )
     title = models.CharField(max_length=500, default="Note Title:")
-    content = models.TextField(blank=True)
+    content = CompressedTextField(blank=True)
+    preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    char_count = models.PositiveIntegerField(default=0, editable=False)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # Value of the owner's NoteWatermark counter when the note was last written.
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+    # When the last revision was taken; throttles revisions (see notes.revisions).
+    revised_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_edited_at = models.DateTimeField(auto_now=True)
 
+    objects = NoteQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Note"
         verbose_name_plural = "Notes"
@@ -47,7 +106,176 @@ class Note(models.Model):
         indexes = [
             models.Index(fields=["user", "-last_edited_at"]),
             models.Index(fields=["category", "-last_edited_at"]),
+            models.Index(fields=["user", "change_seq"]),
         ]
 
     def __str__(self):
         return f"{self.title} ({self.user.email})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the category the note was loaded with to detect recategorization."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get("category_id")
+        return instance
+
+    def refresh_text_stats(self):
+        """Recompute the stored preview and word/character counts from the content."""
+        self.preview = build_preview(self.content)
+        self.word_count = count_words(self.content)
+        self.char_count = len(self.content)
+
+    def save(self, *args, expected_version=None, **kwargs):
+        """
+        Save the note and its denormalized counters in one transaction. With
+        expected_version, the UPDATE only applies while the stored note is still
+        at that version; otherwise VersionConflict is raised and nothing is written.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.refresh_text_stats()
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = {*update_fields, "preview", "word_count", "char_count"}
+        if not self._state.adding:
+            self.version += 1
+            if update_fields is not None:
+                # change_seq (and revised_at) are stamped by pre_save signals.
+                kwargs["update_fields"] = {*update_fields, "version", "change_seq", "revised_at"}
+        # The signal receivers write counters, revisions and the like on the note's own shard.
+        alias = kwargs.get("using") or router.db_for_write(Note, instance=self)
+        self._expected_version = expected_version
+        try:
+            with use_shard(alias), transaction.atomic(using=alias):
+                super().save(*args, **kwargs)
+        finally:
+            self._expected_version = None
+        self._loaded_category_id = self.category_id
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected_version = getattr(self, "_expected_version", None)
+        if expected_version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(
+            base_qs.filter(version=expected_version), using, pk_val, values, update_fields, forced_update
+        ):
+            return True
+        # Raised inside save()'s transaction, so the signal receivers' writes are rolled back too.
+        current_version = base_qs.filter(pk=pk_val).values_list("version", flat=True).first()
+        if current_version is None:
+            raise self.DoesNotExist
+        raise VersionConflict(current_version)
+
+    def delete(self, using=None, keep_parents=False):
+        alias = using or router.db_for_write(Note, instance=self)
+        with use_shard(alias):
+            return super().delete(using=alias, keep_parents=keep_parents)
+
+
+class CategoryNoteCount(models.Model):
+    """Denormalized number of notes a user has in a category."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="category_note_counts"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="note_counts"
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Category note count"
+        verbose_name_plural = "Category note counts"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "category"], name="unique_user_category_note_count"),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id}: {self.count} ({self.user_id})"
+
+
+class NoteWatermark(models.Model):
+    """
+    Per-user change watermark for notes.
+    The counter is bumped on every note write (and on any category change),
+    so it identifies one state of everything the notes endpoints return.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_constraint=False,
+        related_name="note_watermark"
+    )
+    counter = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField()
+    # Change-feed cursors below this value may have missed pruned tombstones.
+    resync_before = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Note watermark"
+        verbose_name_plural = "Note watermarks"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.counter}"
+
+
+class NoteTombstone(models.Model):
+    """Record of a deleted note, kept so change-feed clients learn about the deletion."""
+
+    note_id = models.UUIDField()
+    # No database constraint: tombstones are written while the owner may be mid-deletion.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+"
+    )
+    change_seq = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Note tombstone"
+        verbose_name_plural = "Note tombstones"
+        indexes = [
+            models.Index(fields=["user", "change_seq"]),
+            models.Index(fields=["deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.note_id} (deleted at {self.change_seq})"
+
+
+class NoteRevision(models.Model):
+    """
+    An earlier title and content of a note (see notes.revisions).
+    Snapshots store the text; every revision after a note's first also stores
+    a delta from the previous one, which can be applied forwards or backwards.
+    """
+
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="revisions")
+    number = models.PositiveIntegerField()
+    version = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    title = models.CharField(max_length=500, blank=True)
+    content = CompressedTextField(blank=True)
+    # {"title": [pos, removed, inserted], "content": [...]} for the fields that changed
+    delta = models.JSONField(null=True, blank=True)
+    # When this text was written, and when it was kept as a revision.
+    edited_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Note revision"
+        verbose_name_plural = "Note revisions"
+        constraints = [
+            models.UniqueConstraint(fields=["note", "number"], name="unique_note_revision_number"),
+        ]
+
+    def __str__(self):
+        return f"{self.note_id} #{self.number}"
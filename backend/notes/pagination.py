@@ -0,0 +1,93 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class NoteCursorPagination(BasePagination):
+    """
+    Keyset pagination over (last_edited_at, id), newest first.
+
+    The cursor encodes the sort key of the last note on the page, so every page
+    is a range scan on the (user, -last_edited_at) / (category, -last_edited_at)
+    indexes and costs the same as the first one. Notes edited while a client is
+    paging move ahead of the cursor instead of shifting the remaining pages.
+    """
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    default_limit = 50
+    max_limit = 200
+    ordering = ("-last_edited_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return one page of notes after the request's cursor."""
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views: the page is fetched with async iteration."""
+        return self._set_page([note async for note in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            last_edited_at, note_id = self.decode_cursor(encoded)
+            queryset = queryset.filter(last_edited_at__lte=last_edited_at).exclude(
+                last_edited_at=last_edited_at, id__gte=note_id
+            )
+
+        # Fetch one extra row to learn whether another page exists.
+        return queryset[: self.limit + 1]
+
+    def _set_page(self, results):
+        self.has_next = len(results) > self.limit
+        self.page = results[: self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        """Wrap page data with the link to the next page."""
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_limit(self, request):
+        """Read the requested page size, clamped to max_limit."""
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def get_next_link(self, path=None):
+        """Link to the next page, at `path` (default: the requested URL) with the cursor added."""
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri(path)
+        last = self.page[-1]
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last.last_edited_at, last.id))
+
+    @staticmethod
+    def encode_cursor(last_edited_at, note_id):
+        """Build an opaque cursor from a note's sort key."""
+        raw = f"{last_edited_at.isoformat()}|{note_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, encoded):
+        """Parse a cursor back into (last_edited_at, id), or raise NotFound."""
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            timestamp, note_id = raw.split("|", 1)
+            return datetime.fromisoformat(timestamp), uuid.UUID(note_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -0,0 +1,139 @@
+from django.db import transaction
+from django.utils import timezone
+
+from notes_project.routers import use_user_shard
+
+from . import events
+from .models import Note, VersionConflict
+from .revisions import REVISION_COLUMNS, record_revision, revision_due
+from .search import get_search_backend
+from .text import build_preview, count_words
+from .watermarks import bump_watermark
+
+PATCHABLE_FIELDS = ("title", "content")
+
+
+class InvalidTextOperation(ValueError):
+    """A text operation does not fit the text it is applied to."""
+
+
+def apply_text_ops(text, ops):
+    """
+    Apply splice operations to a string in order.
+    Each op replaces `delete` characters at `pos` with `insert`; positions refer
+    to the text produced by the previous op.
+    """
+    for op in ops:
+        pos, delete = op["pos"], op.get("delete", 0)
+        if pos > len(text) or pos + delete > len(text):
+            raise InvalidTextOperation(
+                f"Operation at {pos} deleting {delete} is out of range for text of length {len(text)}."
+            )
+        text = text[:pos] + op.get("insert", "") + text[pos + delete:]
+    return text
+
+
+def load_note_text(note_id, user_id):
+    """Read the columns a text patch works from; raises Note.DoesNotExist."""
+    current = (
+        Note.objects.filter(id=note_id, user_id=user_id)
+        .values("category_id", "word_count", "char_count", *REVISION_COLUMNS)
+        .first()
+    )
+    if current is None:
+        raise Note.DoesNotExist
+    return current
+
+
+def patch_text_values(current, ops):
+    """Apply ops to the loaded title/content; returns the changed columns, including text stats."""
+    values = {}
+    for field in PATCHABLE_FIELDS:
+        field_ops = [op for op in ops if op.get("field", "content") == field]
+        if field_ops:
+            values[field] = apply_text_ops(current[field], field_ops)
+    if "content" in values:
+        content = values["content"]
+        values.update(preview=build_preview(content), word_count=count_words(content), char_count=len(content))
+    return values
+
+
+def write_note_text(note_id, user_id, current, values, expected_version, new_version, previous=None):
+    """
+    Write changed text columns and stamp the note with `new_version` in a single
+    UPDATE conditioned on `expected_version`, together with the watermark bump,
+    revision, search index refresh and change event. Raises VersionConflict (rolling everything
+    back) if the note has moved on.
+    `previous` holds the note's REVISION_COLUMNS before the write, if the caller
+    has them. Returns the write timestamp.
+    """
+    notes = Note.objects.filter(id=note_id, user_id=user_id)
+    now = timezone.now()
+    # The write-behind flusher calls this outside any request, so name the owner's shard.
+    with use_user_shard(user_id) as alias, transaction.atomic(using=alias):
+        # Rolled back together with the write if the version check fails.
+        change_seq = bump_watermark(user_id)
+        if previous is None:
+            previous = notes.values(*REVISION_COLUMNS).first()
+        if previous is not None and revision_due(previous["revised_at"], previous["last_edited_at"], now):
+            record_revision(note_id, previous)
+            values = {**values, "revised_at": now}
+        updated = notes.filter(version=expected_version).update(
+            **values,
+            version=new_version,
+            change_seq=change_seq,
+            updated_at=now,
+            last_edited_at=now,
+        )
+        if not updated:
+            current_version = notes.values_list("version", flat=True).first()
+            if current_version is None:
+                raise Note.DoesNotExist
+            raise VersionConflict(current_version)
+        get_search_backend().index_note(
+            note_id,
+            user_id,
+            current["category_id"],
+            values.get("title", current["title"]),
+            values.get("content", current["content"]),
+        )
+        summary = {field: value for field, value in values.items() if field not in ("content", "revised_at")}
+        events.publish(user_id, [events.note_upserted({"id": note_id, **summary, "last_edited_at": now})])
+    return now
+
+
+def apply_note_patch(note_id, user, version, ops):
+    """
+    Apply text operations to a note the user owns, provided it is still at `version`.
+
+    The new text is written with a single UPDATE conditioned on the version, so a
+    concurrent writer between the read and the write surfaces as VersionConflict
+    rather than a lost update. Returns the updated column values.
+    """
+    current = load_note_text(note_id, user.pk)
+    if current["version"] != version:
+        raise VersionConflict(current["version"])
+
+    values = patch_text_values(current, ops)
+    now = write_note_text(note_id, user.pk, current, values, version, version + 1, previous=current)
+    return {
+        "word_count": current["word_count"],
+        "char_count": current["char_count"],
+        **values,
+        "version": version + 1,
+        "updated_at": now,
+        "last_edited_at": now,
+    }
+
+
+def parse_if_match(header):
+    """Read a note version from an If-Match header such as `"7"`; None when absent or not a version."""
+    if not header:
+        return None
+    tag = header.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        return None
@@ -0,0 +1,101 @@
+"""
+Process-local registry of categories.
+
+Categories are a handful of rows that change only through the admin or
+populate_categories, so every process keeps them all in memory. Changes bump
+a version key in the Django cache; processes compare it on access and reload
+when it moves. Without a shared cache (the default LocMemCache is per
+process) the TTL bounds how long another process can serve stale entries.
+Serializers take one snapshot() per serialization rather than checking the
+version for every note, which would be a cache round trip each with redis.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+VERSION_KEY = "notes:category-registry-version"
+
+
+class CategoryRegistry:
+    """All categories by id, reloaded when the shared version key or the TTL says so."""
+
+    def __init__(self):
+        self._categories = None
+        self._version = None
+        self._loaded_at = 0.0
+        # Ids looked up in vain since the last load, so a bad id does not reload every time.
+        self._missing = set()
+        self._lock = threading.Lock()
+
+    def get(self, category_id):
+        """Return the Category with this id, or None."""
+        category = self._current().get(category_id)
+        if category is None and category_id not in self._missing:
+            # Possibly created moments ago in another process; reload once.
+            category = self._reload().get(category_id)
+            if category is None:
+                with self._lock:
+                    self._missing.add(category_id)
+        return category
+
+    def snapshot(self):
+        """Return the current {id: Category} map, checking the version key once."""
+        return self._current()
+
+    def all(self):
+        """Return every category in display order."""
+        return sorted(self._current().values(), key=lambda category: (category.sort_order, category.name))
+
+    async def asnapshot(self, category_ids=()):
+        """
+        Return the current {id: Category} map, reloading with the async ORM if
+        needed. Async views pass it to serializers (context["categories"]) so
+        serialization never reaches the database from the event loop. As with
+        get(), category_ids missing from the map reload it once.
+        """
+        version = await cache.aget_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+        categories = self._categories
+        missing = set()
+        if categories is not None:
+            missing = {category_id for category_id in category_ids if category_id not in categories} - self._missing
+        if categories is None or version != self._version or self._expired() or missing:
+            categories = {category.pk: category async for category in Category.objects.all()}
+            self._store(categories, version)
+            with self._lock:
+                self._missing.update(category_id for category_id in missing if category_id not in categories)
+        return categories
+
+    def invalidate(self):
+        """Make every process reload on its next access."""
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        with self._lock:
+            self._categories = None
+
+    def _current(self):
+        version = cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None)
+        categories = self._categories
+        if categories is None or version != self._version or self._expired():
+            categories = self._reload(version)
+        return categories
+
+    def _expired(self):
+        return time.monotonic() - self._loaded_at > settings.NOTES_CATEGORY_REGISTRY_TTL
+
+    def _reload(self, version=None):
+        version = version or cache.get(VERSION_KEY)
+        categories = {category.pk: category for category in Category.objects.all()}
+        self._store(categories, version)
+        return categories
+
+    def _store(self, categories, version):
+        with self._lock:
+            self._categories, self._version, self._loaded_at = categories, version, time.monotonic()
+            self._missing = set()
+
+
+category_registry = CategoryRegistry()
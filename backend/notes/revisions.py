@@ -0,0 +1,175 @@
+"""
+Note revision history.
+
+Before a write replaces a note's title or content, the old text is kept as a
+NoteRevision, at most once per editing session and NOTES_REVISION_INTERVAL
+seconds (see revision_due). A revision is a full snapshot every
+NOTES_REVISION_SNAPSHOT_EVERY revisions. Every revision but a note's first
+stores one splice per changed field against the previous revision: the
+position plus the removed and inserted text. A splice can be applied both
+ways, so rebuild_revision starts from the nearer snapshot, before or after
+the wanted revision, and applies at most about half a snapshot interval of
+deltas.
+
+Numbers are never reused. compact_note_revisions thins out old revisions and
+re-encodes the survivors, so the numbers of a note can have gaps.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import NoteRevision
+
+TEXT_FIELDS = ("title", "content")
+# Note columns record_revision needs, read together with the pre-write text.
+REVISION_COLUMNS = ("title", "content", "version", "last_edited_at", "revised_at")
+
+
+def revision_due(revised_at, last_edited_at, now=None):
+    """
+    Whether a write at `now` should first keep the current text: the note has
+    no revision yet, or was not edited for NOTES_REVISION_SESSION_GAP seconds
+    (a new editing session), or its last revision is NOTES_REVISION_INTERVAL old.
+    """
+    now = now or timezone.now()
+    return (
+        revised_at is None
+        or now - last_edited_at >= timedelta(seconds=settings.NOTES_REVISION_SESSION_GAP)
+        or now - revised_at >= timedelta(seconds=settings.NOTES_REVISION_INTERVAL)
+    )
+
+
+def record_revision(note_id, previous):
+    """
+    Keep `previous`, the note's REVISION_COLUMNS before a write, as its next
+    revision. Returns the revision, or None when the text equals the latest one.
+    Call it inside the write's transaction.
+    """
+    if previous["revised_at"] is None:
+        # Never revised, so there is nothing to diff against.
+        latest = {"last": None, "last_snapshot": None}
+    else:
+        latest = NoteRevision.objects.filter(note_id=note_id).aggregate(
+            last=Max("number"), last_snapshot=Max("number", filter=Q(is_snapshot=True))
+        )
+    revision = NoteRevision(
+        note_id=note_id,
+        number=(latest["last"] or 0) + 1,
+        version=previous["version"],
+        edited_at=previous["last_edited_at"],
+    )
+    text = {field: previous[field] for field in TEXT_FIELDS}
+    if latest["last"] is not None:
+        revision.delta = make_delta(rebuild_revision(note_id, latest["last"]), text)
+        if not revision.delta:
+            return None
+    if latest["last"] is None or revision.number - latest["last_snapshot"] >= settings.NOTES_REVISION_SNAPSHOT_EVERY:
+        revision.is_snapshot = True
+        revision.title, revision.content = text["title"], text["content"]
+    revision.save()
+    return revision
+
+
+def rebuild_revision(note_id, number):
+    """
+    The {"title", "content"} of a revision, from the nearer snapshot in two
+    queries. Raises NoteRevision.DoesNotExist.
+    """
+    bounds = NoteRevision.objects.filter(note_id=note_id, is_snapshot=True).aggregate(
+        before=Max("number", filter=Q(number__lte=number)),
+        after=Min("number", filter=Q(number__gte=number)),
+    )
+    before, after = bounds["before"], bounds["after"]
+    if before is None:
+        raise NoteRevision.DoesNotExist
+    forwards = after is None or number - before <= after - number
+    chain = list(
+        NoteRevision.objects.filter(
+            note_id=note_id, number__range=(before, number) if forwards else (number, after)
+        ).order_by("number" if forwards else "-number")
+    )
+    if chain[-1].number != number:
+        raise NoteRevision.DoesNotExist
+
+    text = {"title": chain[0].title, "content": chain[0].content}
+    if forwards:
+        for revision in chain[1:]:
+            text = apply_delta(text, revision.delta)
+    else:
+        # Undo each delta, stepping back from the later snapshot.
+        for revision in chain[:-1]:
+            text = apply_delta(text, revision.delta, reverse=True)
+    return text
+
+
+def compact_revisions(note_id, keep):
+    """
+    Delete a note's revisions whose numbers are not in `keep` and re-encode the
+    rest: the first becomes a snapshot, then every NOTES_REVISION_SNAPSHOT_EVERY
+    revisions, with deltas between the survivors. Numbers stay as they are.
+    Returns the number of revisions deleted. Call it inside a transaction.
+    """
+    revisions = list(NoteRevision.objects.filter(note_id=note_id).order_by("number"))
+    survivors, text = [], None
+    for revision in revisions:
+        if revision.is_snapshot:
+            text = {"title": revision.title, "content": revision.content}
+        else:
+            text = apply_delta(text, revision.delta)
+        if revision.number in keep:
+            survivors.append((revision, text))
+
+    previous, last_snapshot = None, None
+    for index, (revision, text) in enumerate(survivors):
+        revision.delta = None if previous is None else make_delta(previous, text)
+        revision.is_snapshot = last_snapshot is None or index - last_snapshot >= settings.NOTES_REVISION_SNAPSHOT_EVERY
+        if revision.is_snapshot:
+            last_snapshot = index
+            revision.title, revision.content = text["title"], text["content"]
+        else:
+            revision.title = revision.content = ""
+        previous = text
+
+    deleted, _ = NoteRevision.objects.filter(note_id=note_id).exclude(number__in=keep).delete()
+    NoteRevision.objects.bulk_update(
+        [revision for revision, _ in survivors], ["is_snapshot", "title", "content", "delta"], batch_size=500
+    )
+    return deleted
+
+
+def make_delta(old, new):
+    """One [pos, removed, inserted] splice per field that differs between two texts."""
+    delta = {}
+    for field in TEXT_FIELDS:
+        if old[field] != new[field]:
+            delta[field] = _splice(old[field], new[field])
+    return delta
+
+
+def apply_delta(text, delta, reverse=False):
+    text = dict(text)
+    for field, (pos, removed, inserted) in delta.items():
+        if reverse:
+            removed, inserted = inserted, removed
+        text[field] = text[field][:pos] + inserted + text[field][pos + len(removed):]
+    return text
+
+
+def _splice(old, new):
+    prefix = _common_prefix(old, new)
+    suffix = _common_prefix(old[prefix:][::-1], new[prefix:][::-1])
+    return [prefix, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]]
+
+
+def _common_prefix(a, b):
+    # Binary search with slice comparisons, which run in C, rather than a loop over characters.
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
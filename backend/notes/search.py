@@ -0,0 +1,248 @@
+"""
+Full-text search over notes.
+
+SQLite uses an FTS5 table that is written alongside the note in the same
+transaction (see notes.signals). PostgreSQL uses a GIN index on the note's
+weighted tsvector, which the database keeps current on its own.
+"""
+import re
+import uuid
+from dataclasses import dataclass
+
+from django.db import connections, router
+
+from .models import Note
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_TOKENS = 16
+MAX_RESULTS = 50
+ADMIN_MAX_RESULTS = 1000
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@dataclass
+class SearchHit:
+    """One ranked match. Highlights wrap matched terms in HIGHLIGHT_START/END and are not HTML-escaped."""
+
+    note_id: uuid.UUID
+    score: float
+    title_highlight: str
+    snippet: str
+
+
+def _tokens(query):
+    return _TOKEN_RE.findall(query)
+
+
+class SQLiteSearchBackend:
+    """FTS5 index keyed by indexed note/user id tokens so single-note updates stay cheap."""
+
+    table = "notes_note_fts"
+    batch_size = 500
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "title, content, note_id, user_id, category_id UNINDEXED, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index_note(self, note_id, user_id, category_id, title, content):
+        """Insert or replace one note's entry."""
+        self.remove_note(note_id)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (title, content, note_id, user_id, category_id) VALUES (%s, %s, %s, %s, %s)",
+                [title, content, note_id.hex, user_id.hex, category_id.hex],
+            )
+
+    def index_notes(self, rows):
+        """Insert or replace many entries from (note_id, user_id, category_id, title, content) rows."""
+        rows = list(rows)
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            self.remove_notes([row[0] for row in batch])
+            with self.connection.cursor() as cursor:
+                self._insert_batch(
+                    cursor,
+                    [[title, content, note_id.hex, user_id.hex, category_id.hex]
+                     for note_id, user_id, category_id, title, content in batch],
+                )
+
+    def remove_note(self, note_id):
+        self.remove_notes([note_id])
+
+    def remove_notes(self, note_ids):
+        # An empty `note_id : ()` is not valid FTS5 query syntax.
+        if not note_ids:
+            return
+        terms = " OR ".join(f'"{note_id.hex}"' for note_id in note_ids)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE {self.table} MATCH %s", [f"note_id : ({terms})"])
+
+    def rebuild(self):
+        """Re-index every note; returns the number of notes indexed."""
+        indexed = 0
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            notes = Note.objects.using(self.connection.alias).values_list(
+                "title", "content", "id", "user_id", "category_id"
+            )
+            batch = []
+            for title, content, note_id, user_id, category_id in notes.iterator(chunk_size=self.batch_size):
+                batch.append([title, content, note_id.hex, user_id.hex, category_id.hex])
+                if len(batch) == self.batch_size:
+                    indexed += self._insert_batch(cursor, batch)
+                    batch = []
+            if batch:
+                indexed += self._insert_batch(cursor, batch)
+        return indexed
+
+    def _insert_batch(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {self.table} (title, content, note_id, user_id, category_id) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+        return len(rows)
+
+    def search(self, query, user=None, category_id=None, limit=MAX_RESULTS):
+        """Return the best-ranked SearchHits for `query`, optionally scoped to a user and category."""
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+        terms = " ".join(f'"{token}"' for token in tokens) + "*"
+        match = f"{{title content}} : ({terms})"
+        if user is not None:
+            match = f'user_id : "{user.pk.hex}" AND {match}'
+
+        sql = (
+            f"SELECT note_id, "
+            f"highlight({self.table}, 0, %s, %s), "
+            f"snippet({self.table}, 1, %s, %s, '…', {SNIPPET_TOKENS}), "
+            f"bm25({self.table}, 10.0, 1.0, 0.0, 0.0, 0.0) AS rank "
+            f"FROM {self.table} WHERE {self.table} MATCH %s"
+        )
+        params = [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, match]
+        if category_id is not None:
+            sql += " AND category_id = %s"
+            params.append(category_id.hex)
+        sql += " ORDER BY rank LIMIT %s"
+        params.append(limit)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                SearchHit(note_id=uuid.UUID(note_id), score=-rank, title_highlight=title, snippet=snippet)
+                for note_id, title, snippet, rank in cursor.fetchall()
+            ]
+
+
+class PostgresSearchBackend:
+    """tsvector search over a GIN expression index; the index needs no explicit syncing."""
+
+    config = "english"
+    index_name = "notes_note_search_idx"
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector("title", weight="A", config=self.config) + SearchVector(
+            "content", weight="B", config=self.config
+        )
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.index_name} ON notes_note USING GIN (("
+                f"setweight(to_tsvector('{self.config}'::regconfig, COALESCE(title, '')), 'A') || "
+                f"setweight(to_tsvector('{self.config}'::regconfig, COALESCE(content, '')), 'B')))"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {self.index_name}")
+
+    def index_note(self, note_id, user_id, category_id, title, content):
+        pass
+
+    def index_notes(self, rows):
+        pass
+
+    def remove_note(self, note_id):
+        pass
+
+    def remove_notes(self, note_ids):
+        pass
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {self.index_name}")
+        return Note.objects.using(self.connection.alias).count()
+
+    def search(self, query, user=None, category_id=None, limit=MAX_RESULTS):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+        if not _tokens(query):
+            return []
+        search_query = SearchQuery(query, search_type="websearch", config=self.config)
+        notes = Note.objects.using(self.connection.alias).annotate(search=self._vector()).filter(search=search_query)
+        if user is not None:
+            notes = notes.filter(user=user)
+        if category_id is not None:
+            notes = notes.filter(category_id=category_id)
+        highlight = {"start_sel": HIGHLIGHT_START, "stop_sel": HIGHLIGHT_END, "config": self.config}
+        notes = notes.annotate(
+            rank=SearchRank(self._vector(), search_query),
+            title_highlight=SearchHeadline("title", search_query, highlight_all=True, **highlight),
+            snippet=SearchHeadline("content", search_query, max_words=SNIPPET_TOKENS, **highlight),
+        ).order_by("-rank")[:limit]
+        return [
+            SearchHit(note_id=note_id, score=rank, title_highlight=title, snippet=snippet)
+            for note_id, rank, title, snippet in notes.values_list("id", "rank", "title_highlight", "snippet")
+        ]
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend(using=None):
+    """Return the search backend for a database alias (defaults to where notes are written)."""
+    connection = connections[using or router.db_for_write(Note)]
+    try:
+        return BACKENDS[connection.vendor](connection)
+    except KeyError:
+        raise NotImplementedError(f"Full-text search is not supported on {connection.vendor}")
+
+
+def index_note(note):
+    """Refresh the search entry of a saved note."""
+    get_search_backend(note._state.db).index_note(
+        note.id, note.user_id, note.category_id, note.title, note.content
+    )
+
+
+def index_notes(notes, using=None):
+    """Refresh the search entries of notes written without signals (bulk paths)."""
+    get_search_backend(using).index_notes(
+        (note.id, note.user_id, note.category_id, note.title, note.content) for note in notes
+    )
+
+
+def remove_note(note):
+    get_search_backend(note._state.db).remove_note(note.id)
@@ -1,52 +1,108 @@
 from rest_framework import serializers
 
-from .models import Category, Note
+from notes_project.metrics import TimedSerializerMixin
 
+from .models import Category, Note, NoteRevision
+from .patching import PATCHABLE_FIELDS
+from .registry import category_registry
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class RegistryCategoryField(serializers.PrimaryKeyRelatedField):
+    """Category primary key field resolved through the in-process category registry."""
+
+    def to_internal_value(self, data):
+        try:
+            category = category_registry.get(serializers.UUIDField().to_internal_value(data))
+        except serializers.ValidationError:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if category is None:
+            self.fail("does_not_exist", pk_value=data)
+        return category
+
+
+class CategoryDisplayMixin(serializers.Serializer):
+    """Adds category_name and category_color from the registry instead of a join per note."""
+
+    category_name = serializers.SerializerMethodField()
+    category_color = serializers.SerializerMethodField()
+
+    def get_category_name(self, obj):
+        category = self._category(obj)
+        return category.name if category else None
+
+    def get_category_color(self, obj):
+        category = self._category(obj)
+        return category.color if category else None
+
+    def _category(self, obj):
+        # Async views pass a registry snapshot, so serializing never queries.
+        categories = self.context.get("categories")
+        if categories is not None:
+            return categories.get(obj.category_id)
+        # Otherwise take one snapshot for the whole serialization (a list shares one child serializer).
+        if getattr(self, "_categories", None) is None:
+            self._categories = category_registry.snapshot()
+        return self._categories.get(obj.category_id) or category_registry.get(obj.category_id)
+
+
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Category model."""
 
-    note_count = serializers.SerializerMethodField()
+    note_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Category
         fields = ["id", "name", "color", "sort_order", "note_count"]
         read_only_fields = ["id"]
 
-    def get_note_count(self, obj):
-        """Get the count of notes in this category for the current user."""
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return obj.notes.filter(user=request.user).count()
-        return 0
-
 
-class NoteListSerializer(serializers.ModelSerializer):
+class NoteListSerializer(TimedSerializerMixin, CategoryDisplayMixin, serializers.ModelSerializer):
     """Serializer for Note list view (preview only)."""
 
-    category_name = serializers.CharField(source="category.name", read_only=True)
-    category_color = serializers.CharField(source="category.color", read_only=True)
+    # Columns the list query needs to load; keep in sync with Meta.fields.
+    list_columns = [
+        "id",
+        "title",
+        "preview",
+        "word_count",
+        "char_count",
+        "category",
+        "created_at",
+        "last_edited_at",
+    ]
 
     class Meta:
         model = Note
         fields = [
             "id",
             "title",
-            "content",
+            "preview",
+            "word_count",
+            "char_count",
             "category",
             "category_name",
             "category_color",
             "created_at",
             "last_edited_at",
         ]
-        read_only_fields = ["id", "created_at", "last_edited_at"]
+        read_only_fields = ["id", "preview", "word_count", "char_count", "created_at", "last_edited_at"]
+
+
+class NoteSearchResultSerializer(NoteListSerializer):
+    """Serializer for a full-text search hit: the list fields plus highlighted matches."""
 
+    title_highlight = serializers.CharField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+    score = serializers.FloatField(read_only=True)
 
-class NoteDetailSerializer(serializers.ModelSerializer):
+    class Meta(NoteListSerializer.Meta):
+        fields = NoteListSerializer.Meta.fields + ["title_highlight", "snippet", "score"]
+
+
+class NoteDetailSerializer(TimedSerializerMixin, CategoryDisplayMixin, serializers.ModelSerializer):
     """Serializer for Note detail view (full content)."""
 
-    category_name = serializers.CharField(source="category.name", read_only=True)
-    category_color = serializers.CharField(source="category.color", read_only=True)
+    category = RegistryCategoryField(queryset=Category.objects.all())
 
     class Meta:
         model = Note
@@ -54,16 +110,94 @@ class NoteDetailSerializer(serializers.ModelSerializer):
             "id",
             "title",
             "content",
+            "word_count",
+            "char_count",
             "category",
             "category_name",
             "category_color",
             "created_at",
             "updated_at",
             "last_edited_at",
+            "version",
+        ]
+        read_only_fields = [
+            "id",
+            "word_count",
+            "char_count",
+            "created_at",
+            "updated_at",
+            "last_edited_at",
+            "version",
         ]
-        read_only_fields = ["id", "created_at", "updated_at", "last_edited_at"]
 
     def create(self, validated_data):
         """Create a new note with the current user."""
         validated_data["user"] = self.context["request"].user
         return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        """Save the changes, conditioned on context["expected_version"] when given (raises VersionConflict)."""
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(expected_version=self.context.get("expected_version"))
+        return instance
+
+
+class NoteTextOpSerializer(serializers.Serializer):
+    """Serializer for one splice operation on a note's title or content."""
+
+    field = serializers.ChoiceField(choices=PATCHABLE_FIELDS, default="content")
+    pos = serializers.IntegerField(min_value=0)
+    delete = serializers.IntegerField(min_value=0, default=0)
+    insert = serializers.CharField(allow_blank=True, trim_whitespace=False, default="")
+
+
+class NotePatchSerializer(serializers.Serializer):
+    """Serializer for a delta autosave: text operations against a note version."""
+
+    version = serializers.IntegerField(min_value=1, required=False)
+    ops = NoteTextOpSerializer(many=True, allow_empty=False)
+
+
+class NoteVersionSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Serializer for the compact response to a delta autosave."""
+
+    id = serializers.UUIDField()
+    version = serializers.IntegerField()
+    word_count = serializers.IntegerField()
+    char_count = serializers.IntegerField()
+    last_edited_at = serializers.DateTimeField()
+
+
+class NoteRevisionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for a revision in a note's history, without its text."""
+
+    class Meta:
+        model = NoteRevision
+        fields = ["number", "version", "edited_at", "created_at"]
+
+
+class NoteRevisionDetailSerializer(NoteRevisionSerializer):
+    """Serializer for a revision with its rebuilt title and content."""
+
+    title = serializers.CharField()
+    content = serializers.CharField()
+
+    class Meta(NoteRevisionSerializer.Meta):
+        fields = [*NoteRevisionSerializer.Meta.fields, "title", "content"]
+
+
+class NoteBulkOperationSerializer(serializers.Serializer):
+    """Serializer for the envelope of one bulk operation; note fields are validated by NoteDetailSerializer."""
+
+    OPERATIONS = ("create", "update", "move")
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.UUIDField(required=False)
+    # Version the client last saw; updates and moves of a note that has moved on are rejected.
+    version = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, data):
+        if data["op"] != "create" and "id" not in data:
+            raise serializers.ValidationError({"id": "This field is required."})
+        return data
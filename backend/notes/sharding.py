@@ -0,0 +1,123 @@
+"""
+Keeping notes data in place across shards (see notes_project.routers).
+
+Categories are written to "default" and copied to every shard by signal
+receivers, and to a shard as soon as it is migrated, so notes keep a foreign
+key to them within their own database. move_user() relocates one user's notes
+data to another shard, for `rebalance_shards`.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+
+from notes_project.routers import shard_aliases, shard_for_user, use_shard
+
+from .models import Category, CategoryNoteCount, Note, NoteRevision, NoteTombstone, NoteWatermark
+from .search import get_search_backend, index_notes
+from .watermarks import bump_watermark
+
+CATEGORY_FIELDS = ("name", "color", "sort_order")
+BATCH_SIZE = 500
+
+
+def replicate_category(category):
+    """Create or update the category on every shard."""
+    for alias in settings.NOTES_SHARDS:
+        Category.objects.using(alias).update_or_create(
+            pk=category.pk, defaults={field: getattr(category, field) for field in CATEGORY_FIELDS}
+        )
+
+
+def check_category_unused(category):
+    """Raise ProtectedError when notes on a shard still belong to the category, as on "default"."""
+    for alias in settings.NOTES_SHARDS:
+        notes = Note.objects.using(alias).filter(category=category)
+        if notes.exists():
+            raise models.ProtectedError(
+                f"Cannot delete category {category.name!r}: notes on {alias} belong to it.", set(notes[:10])
+            )
+
+
+def delete_category_replicas(category):
+    for alias in settings.NOTES_SHARDS:
+        Category.objects.using(alias).filter(pk=category.pk).delete()
+
+
+def sync_categories(alias):
+    """Make the categories of a shard match those on "default"."""
+    categories = list(Category.objects.using(DEFAULT_DB_ALIAS))
+    for category in categories:
+        Category.objects.using(alias).update_or_create(
+            pk=category.pk, defaults={field: getattr(category, field) for field in CATEGORY_FIELDS}
+        )
+    Category.objects.using(alias).exclude(pk__in=[category.pk for category in categories]).delete()
+
+
+def user_data(user_id, alias):
+    """Querysets of everything stored for the user on one database, parents first."""
+    return [
+        Note.objects.using(alias).filter(user_id=user_id),
+        NoteRevision.objects.using(alias).filter(note__user_id=user_id),
+        CategoryNoteCount.objects.using(alias).filter(user_id=user_id),
+        NoteWatermark.objects.using(alias).filter(user_id=user_id),
+        NoteTombstone.objects.using(alias).filter(user_id=user_id),
+    ]
+
+
+def copy_user_data(user_id, source, target):
+    """
+    Copy the user's rows from `source` to `target`, replacing what `target`
+    already holds for the user, and index the notes there. Returns the number of notes.
+    """
+    with transaction.atomic(using=target):
+        # Leftovers of an interrupted move would collide with the copies.
+        delete_user_data(user_id, target)
+        for queryset in user_data(user_id, source):
+            for row in queryset.iterator(chunk_size=BATCH_SIZE):
+                if isinstance(row._meta.pk, models.AutoField):
+                    # Auto-increment ids are per database; nothing refers to these rows by id.
+                    row.pk = None
+                # Like loaddata: raw saves keep the timestamps and skip the note signals.
+                row.save_base(using=target, raw=True, force_insert=True)
+        notes = Note.objects.using(target).filter(user_id=user_id)
+        index_notes(notes.iterator(chunk_size=BATCH_SIZE), using=target)
+        return notes.count()
+
+
+def delete_user_data(user_id, alias):
+    """
+    Delete the user's rows on one database without sending signals: the notes
+    live on elsewhere, or their owner is gone, so there is nothing to count,
+    tombstone or announce.
+    """
+    note_ids = list(Note.objects.using(alias).filter(user_id=user_id).values_list("id", flat=True))
+    with transaction.atomic(using=alias):
+        backend = get_search_backend(alias)
+        for start in range(0, len(note_ids), BATCH_SIZE):
+            backend.remove_notes(note_ids[start:start + BATCH_SIZE])
+        for queryset in reversed(user_data(user_id, alias)):
+            queryset._raw_delete(alias)
+
+
+def move_user(user, target):
+    """
+    Move the user's notes data to the `target` database and point the user at it.
+    The old shard's write lock is held from start to finish, so writes arriving
+    meanwhile wait (up to the busy timeout) rather than land on the old copy.
+    Returns the number of notes moved. Moving a user to the shard it is on
+    deletes any of its rows left on other databases by an interrupted move.
+    """
+    source = shard_for_user(user)
+    if source == target:
+        # Finish an interrupted move: drop the copies left elsewhere.
+        for alias in shard_aliases():
+            if alias != target:
+                delete_user_data(user.pk, alias)
+        return 0
+    with use_shard(source), transaction.atomic(using=source):
+        # The user's first write of the move takes the lock; it also changes the notes ETags.
+        bump_watermark(user.pk, create=False)
+        moved = copy_user_data(user.pk, source, target)
+        user.shard = "" if target == DEFAULT_DB_ALIAS else target
+        user.save(update_fields=["shard"])
+        delete_user_data(user.pk, source)
+    return moved
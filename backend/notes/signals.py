@@ -0,0 +1,171 @@
+"""
+Signal receivers keeping denormalized note data in sync.
+
+Note.save() wraps the save in a transaction, so these receivers run in the
+same transaction as the note write. QuerySet.update() and bulk_create() do
+not send signals; callers using them must update counters and watermarks
+explicitly, and refresh the search index.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from notes_project.routers import shard_for_user
+
+from . import events, search, sharding
+from .counters import adjust_note_count
+from .models import Category, Note, NoteTombstone
+from .registry import category_registry
+from .revisions import REVISION_COLUMNS, TEXT_FIELDS, record_revision, revision_due
+from .serializers import NoteListSerializer
+from .watermarks import bump_all_watermarks, bump_watermark
+
+
+@receiver(pre_save, sender=Note)
+def remember_previous_category(sender, instance, raw, **kwargs):
+    """Look up the stored category when the instance was loaded with it deferred."""
+    if raw or instance._state.adding or getattr(instance, "_loaded_category_id", None) is not None:
+        return
+    instance._loaded_category_id = (
+        Note.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first()
+    )
+
+
+@receiver(pre_save, sender=Note)
+def capture_revision(sender, instance, raw, **kwargs):
+    """Keep the stored text as a revision before a save changes it, when one is due."""
+    if raw or instance._state.adding:
+        return
+    now = timezone.now()
+    if not {"revised_at", "last_edited_at"} & instance.get_deferred_fields():
+        if not revision_due(instance.revised_at, instance.last_edited_at, now):
+            return
+    previous = Note.objects.filter(pk=instance.pk).values(*REVISION_COLUMNS).first()
+    if previous is None or not revision_due(previous["revised_at"], previous["last_edited_at"], now):
+        return
+    if any(previous[field] != getattr(instance, field) for field in TEXT_FIELDS):
+        record_revision(instance.pk, previous)
+        instance.revised_at = now
+
+
+@receiver(post_save, sender=Note)
+def update_counts_on_save(sender, instance, created, raw, **kwargs):
+    """Count new notes and move the count when a note changes category."""
+    if raw:
+        return
+    if created:
+        adjust_note_count(instance.user_id, instance.category_id, 1)
+        return
+    previous_category_id = instance._loaded_category_id
+    if previous_category_id is not None and previous_category_id != instance.category_id:
+        adjust_note_count(instance.user_id, previous_category_id, -1)
+        adjust_note_count(instance.user_id, instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Note)
+def update_counts_on_delete(sender, instance, **kwargs):
+    """Decrement the counter of a deleted note's category."""
+    adjust_note_count(instance.user_id, instance.category_id, -1)
+
+
+@receiver(pre_save, sender=Note)
+def stamp_change_seq(sender, instance, raw, **kwargs):
+    """Advance the owner's watermark and stamp the note with the new change sequence."""
+    if not raw:
+        instance.change_seq = bump_watermark(instance.user_id)
+
+
+@receiver(post_delete, sender=Note)
+def record_tombstone(sender, instance, **kwargs):
+    """Advance the owner's watermark and leave a tombstone for change-feed clients."""
+    change_seq = bump_watermark(instance.user_id, create=False)
+    if change_seq is not None:
+        NoteTombstone.objects.create(note_id=instance.id, user_id=instance.user_id, change_seq=change_seq)
+
+
+@receiver(post_save, sender=Note)
+def index_note_on_save(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_note(instance)
+
+
+@receiver(post_delete, sender=Note)
+def remove_note_from_index(sender, instance, **kwargs):
+    search.remove_note(instance)
+
+
+@receiver(post_save, sender=Note)
+def publish_note_saved(sender, instance, created, raw, **kwargs):
+    """Push the saved note, and any category move, to the owner's open clients."""
+    if raw or not events.listening(instance.user_id):
+        return
+    changes = [events.note_upserted(NoteListSerializer(instance).data)]
+    if created:
+        changes.append(events.counts_changed({instance.category_id: 1}))
+        events.publish(instance.user_id, changes)
+        return
+    previous_category_id = instance._loaded_category_id
+    if previous_category_id is not None and previous_category_id != instance.category_id:
+        changes.append(events.note_moved(instance.id, previous_category_id, instance.category_id))
+        changes.append(events.counts_changed({previous_category_id: -1, instance.category_id: 1}))
+    events.publish(instance.user_id, changes)
+
+
+@receiver(post_delete, sender=Note)
+def publish_note_deleted(sender, instance, **kwargs):
+    if not events.listening(instance.user_id):
+        return
+    events.publish(
+        instance.user_id, [events.note_deleted(instance.id), events.counts_changed({instance.category_id: -1})]
+    )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_watermarks_on_category_change(sender, using, **kwargs):
+    """Category names and colors appear in every notes response, so invalidate them all."""
+    if not kwargs.get("raw"):
+        bump_all_watermarks(using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_registry(sender, using, **kwargs):
+    """Reload categories everywhere once the change is committed."""
+    transaction.on_commit(category_registry.invalidate, using=using)
+
+
+@receiver(post_save, sender=Category)
+def replicate_category(sender, instance, using, **kwargs):
+    """Categories are written to "default"; copy them to every shard."""
+    if using == DEFAULT_DB_ALIAS:
+        sharding.replicate_category(instance)
+
+
+@receiver(pre_delete, sender=Category)
+def protect_category_on_shards(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        sharding.check_category_unused(instance)
+
+
+@receiver(post_delete, sender=Category)
+def delete_category_replicas(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        sharding.delete_category_replicas(instance)
+
+
+@receiver(post_migrate)
+def sync_shard_categories(sender, using, **kwargs):
+    """Give a newly migrated shard the categories of "default"."""
+    if sender.name == "notes" and using in settings.NOTES_SHARDS:
+        sharding.sync_categories(using)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_notes(sender, instance, using, **kwargs):
+    """Deleting a user cascades on "default" only; remove the user's notes from its shard too."""
+    alias = shard_for_user(instance)
+    if alias != using:
+        sharding.delete_user_data(instance.pk, alias)
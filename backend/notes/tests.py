@@ -1,3 +1,1160 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+import uuid
+import zipfile
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from accounts.middleware import user_cache_key
+from accounts.models import User
+from notes_project.routers import (
+    REPLICA,
+    ReadReplicaRouter,
+    ShardRouter,
+    assign_shard,
+    read_from_replica,
+    shard_for_user,
+    use_shard,
+)
+from notes_project.sqlite.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from notes_project.throttling import LOW, NORMAL, LoadMonitor
+
+from . import events, export, registry, writebehind
+from .models import Category, CategoryNoteCount, Note, NoteWatermark, VersionConflict
+from .patching import parse_if_match
+from .text import PREVIEW_LENGTH, build_preview
+from .urls import note_urlpatterns
+from .registry import category_registry
+from .search import get_search_backend
+from .sharding import move_user
+
+
+# With sharding, the session's cached user costs one more query: its shard is re-read from the directory.
+SHARD_LOOKUPS = 1 if settings.NOTES_SHARDS else 0
+# Query counts below include one session lookup, which cached or signed-cookie sessions would skip.
+DB_SESSIONS = "django.contrib.sessions.backends.db"
+
+
+class NotesTestCase(TestCase):
+    """With NOTES_SHARD_COUNT set, notes live on the shard databases, so the tests may query them all."""
+
+    databases = "__all__"
+
+    @contextmanager
+    def capture_queries(self):
+        """Capture the queries run on every database, the shards included."""
+        queries = []
+        databases = {id(connections[alias]): connections[alias] for alias in connections}
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(database)) for database in databases.values()]
+            yield queries
+        queries.extend(query for context in contexts for query in context.captured_queries)
+
+    @contextmanager
+    def assertNumQueriesEverywhere(self, num):
+        with self.capture_queries() as queries:
+            yield
+        self.assertEqual(len(queries), num, "\n".join(query["sql"] for query in queries))
+
+
+@override_settings(SESSION_ENGINE=DB_SESSIONS)
+class ConditionalGetTests(NotesTestCase):
+    """ETag/304 handling of the read endpoints."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="reader@example.com", password="Passw0rd")
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(user=self.user, category=self.category, title="Notes", content="Body")
+        self.client.force_login(self.user)
+
+    def test_not_modified_skips_view_queries(self):
+        """A matching If-None-Match costs the session and watermark lookups only (the user is cached)."""
+        for url in [
+            reverse("notes:category-list"),
+            reverse("notes:note-list"),
+            reverse("notes:note-detail", args=[self.note.id]),
+        ]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with self.assertNumQueriesEverywhere(2 + SHARD_LOOKUPS):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_compressed_responses_still_match_if_none_match(self):
+        """Compression weakens the ETag; a client sending it back still gets 304."""
+        Note.objects.bulk_create(
+            Note(user=self.user, category=self.category, title=f"Note {index}", content="Body " * 50)
+            for index in range(20)
+        )
+        url = reverse("notes:note-list")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(gzip.decompress(response.content), self.client.get(url).content)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_note_write_changes_etag(self):
+        url = reverse("notes:note-list")
+        etag = self.client.get(url)["ETag"]
+
+        self.client.patch(
+            reverse("notes:note-update", args=[self.note.id]),
+            {"version": self.note.version, "ops": [{"pos": 0, "insert": "New "}]},
+            content_type="application/json",
+        )
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_category_change_changes_etag(self):
+        url = reverse("notes:category-list")
+        etag = self.client.get(url)["ETag"]
+
+        self.category.color = "#000000"
+        self.category.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+
+@override_settings(SESSION_ENGINE=DB_SESSIONS)
+class WorkspaceBootstrapTests(NotesTestCase):
+    """The workspace loads in one request with a fixed number of queries."""
+
+    def test_bootstrap_queries_do_not_grow_with_data(self):
+        user = User.objects.create_user(email="opener@example.com", password="Passw0rd")
+        categories = [
+            Category.objects.create(name=name, color="#a8a378", sort_order=index)
+            for index, name in enumerate(["Random Thoughts", "School", "Personal"])
+        ]
+        for index in range(30):
+            Note.objects.create(user=user, category=categories[index % 3], title=f"Note {index}", content="Body")
+        self.client.force_login(user)
+        url = reverse("notes:workspace-bootstrap")
+        self.client.get(url)
+
+        # Session, categories with counts, notes.
+        with self.assertNumQueriesEverywhere(3 + SHARD_LOOKUPS):
+            response = self.client.get(url, {"limit": 20})
+        data = response.json()
+        self.assertEqual(data["user"]["email"], "opener@example.com")
+        self.assertTrue(data["csrfToken"])
+        self.assertEqual([category["note_count"] for category in data["categories"]], [10, 10, 10])
+        self.assertEqual(len(data["notes"]["results"]), 20)
+        self.assertTrue(data["notes"]["next"].startswith("http://testserver/api/notes/?"))
+
+
+class CategoryCounterTests(NotesTestCase):
+    """Per-user category counters follow note writes and can be rebuilt from the notes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="counter@example.com", password="Passw0rd")
+        self.school = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.personal = Category.objects.create(name="Personal", color="#a878ab", sort_order=2)
+
+    def counts(self):
+        counters = CategoryNoteCount.objects.using(shard_for_user(self.user)).filter(user=self.user, count__gt=0)
+        return dict(counters.values_list("category", "count"))
+
+    def test_counters_follow_create_move_and_delete(self):
+        note = Note.objects.create(user=self.user, category=self.school, title="One")
+        other = Note.objects.create(user=self.user, category=self.school, title="Two")
+        self.assertEqual(self.counts(), {self.school.id: 2})
+
+        note.category = self.personal
+        note.save()
+        self.assertEqual(self.counts(), {self.school.id: 1, self.personal.id: 1})
+
+        other.delete()
+        self.assertEqual(self.counts(), {self.personal.id: 1})
+
+    def test_rebuild_fixes_drifted_counters(self):
+        Note.objects.create(user=self.user, category=self.school, title="One")
+        Note.objects.create(user=self.user, category=self.personal, title="Two")
+        CategoryNoteCount.objects.using(shard_for_user(self.user)).filter(category=self.school).update(count=5)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_category_counts", "--check", stdout=io.StringIO())
+        output = io.StringIO()
+        call_command("rebuild_category_counts", stdout=output)
+        self.assertIn("(1 had drifted)", output.getvalue())
+        self.assertEqual(self.counts(), {self.school.id: 1, self.personal.id: 1})
+        call_command("rebuild_category_counts", "--check", stdout=io.StringIO())
+
+
+class CursorPaginationTests(NotesTestCase):
+    """Keyset pages of the note list neither skip nor repeat notes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="pager@example.com", password="Passw0rd")
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.client.force_login(self.user)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data["next"], [note["id"] for note in data["results"]]
+
+    def test_pages_are_stable_across_inserts_and_ties(self):
+        notes = [
+            Note.objects.create(user=self.user, category=self.category, title=f"Note {index}") for index in range(7)
+        ]
+        # Four notes share one sort timestamp; the id breaks the tie.
+        tied = Note.objects.for_user(self.user).filter(id__in=[note.id for note in notes[2:6]])
+        tied.update(last_edited_at=notes[2].last_edited_at)
+
+        url, seen = self.page(reverse("notes:note-list") + "?limit=3")
+        while url:
+            Note.objects.create(user=self.user, category=self.category, title="Inserted while paging")
+            url, ids = self.page(url)
+            seen += ids
+        self.assertEqual(sorted(seen), sorted(str(note.id) for note in notes))
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse("notes:note-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class NoteSearchTests(NotesTestCase):
+    """The full-text index follows note writes and search only returns the user's own notes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="searcher@example.com", password="Passw0rd")
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(
+            user=self.user, category=self.category, title="Biology lecture", content="Chlorophyll absorbs light."
+        )
+        self.client.force_login(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse("notes:note-search"), {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_index_follows_note_writes(self):
+        other = User.objects.create_user(email="other@example.com", password="Passw0rd")
+        Note.objects.create(user=other, category=self.category, title="Chlorophyll", content="Not yours")
+
+        results = self.search("chlorophyll")
+        self.assertEqual([result["id"] for result in results], [str(self.note.id)])
+        self.assertIn("<mark>Chlorophyll</mark>", results[0]["snippet"])
+        self.assertEqual(self.search("biology")[0]["title_highlight"], "<mark>Biology</mark> lecture")
+
+        self.note.content = "Mitochondria make energy."
+        self.note.save()
+        self.assertEqual(self.search("chlorophyll"), [])
+        self.assertEqual(len(self.search("mitochondria")), 1)
+
+        self.note.delete()
+        self.assertEqual(self.search("mitochondria"), [])
+
+    def test_category_filter_and_required_query(self):
+        personal = Category.objects.create(name="Personal", color="#a878ab", sort_order=2)
+        self.assertEqual(self.search("chlorophyll", categoryId=str(personal.id)), [])
+        self.assertEqual(len(self.search("chlorophyll", categoryId=str(self.category.id))), 1)
+        self.assertEqual(self.client.get(reverse("notes:note-search"), {"q": " "}).status_code, 400)
+
+    def test_rebuild_search_index(self):
+        with connections[self.note._state.db].cursor() as cursor:
+            cursor.execute("DELETE FROM notes_note_fts")
+        self.assertEqual(self.search("chlorophyll"), [])
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        self.assertEqual(len(self.search("chlorophyll")), 1)
+
+    def test_empty_batches_leave_the_index_alone(self):
+        backend = get_search_backend(self.note._state.db)
+        backend.remove_notes([])
+        backend.index_notes([])
+        self.assertEqual(len(self.search("chlorophyll")), 1)
+
+
+class ChangeFeedTests(NotesTestCase):
+    """The change feed returns upserts and tombstones after a cursor, and 410 once tombstones are pruned."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="syncer@example.com", password="Passw0rd")
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(user=self.user, category=self.category, title="Kept")
+        self.other = Note.objects.create(user=self.user, category=self.category, title="Deleted")
+        self.client.force_login(self.user)
+
+    def changes(self, since):
+        return self.client.get(reverse("notes:note-changes"), {"since": since})
+
+    def test_changes_after_cursor_include_tombstones(self):
+        data = self.changes(0).json()
+        self.assertEqual({change["note"]["title"] for change in data["changes"]}, {"Kept", "Deleted"})
+
+        self.note.title = "Edited"
+        self.note.save()
+        other_id = self.other.id
+        self.other.delete()
+        created = Note.objects.create(user=self.user, category=self.category, title="Created")
+
+        data = self.changes(data["cursor"]).json()
+        self.assertEqual(
+            [(change["type"], change.get("id") or change["note"]["id"]) for change in data["changes"]],
+            [("upsert", str(self.note.id)), ("delete", str(other_id)), ("upsert", str(created.id))],
+        )
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self.changes(data["cursor"]).json()["changes"], [])
+
+    def test_pruned_tombstones_require_resync(self):
+        cursor = self.changes(0).json()["cursor"]
+        self.other.delete()
+        call_command("prune_tombstones", "--days", "0", stdout=io.StringIO())
+
+        response = self.changes(cursor)
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["resync"])
+        self.assertEqual(self.changes(int(response.json()["cursor"]) + 1).status_code, 410)
+        data = self.changes(0).json()
+        self.assertEqual([change["note"]["title"] for change in data["changes"]], ["Kept"])
+
+
+class ImportNotesTests(NotesTestCase):
+    """import_notes records committed rows and resumes an interrupted run without duplicates."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="importer@example.com", password="Passw0rd")
+        Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "notes.ndjson"
+
+    def write_rows(self, users):
+        rows = [{"user": user, "category": "school", "title": f"Row {index}"} for index, user in enumerate(users, 1)]
+        self.path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+    def import_notes(self, *args):
+        output = io.StringIO()
+        call_command("import_notes", str(self.path), "--chunk-size", "1", "--chunks-per-transaction", "2", *args,
+                     stdout=output)
+        return output.getvalue()
+
+    def titles(self):
+        return sorted(Note.objects.for_user(self.user).values_list("title", flat=True))
+
+    def test_interrupted_import_resumes_after_committed_rows(self):
+        email = self.user.email
+        self.write_rows([email, email, email, "nobody@example.com", email])
+        with self.assertRaisesMessage(CommandError, "Row 4: unknown user"):
+            self.import_notes()
+        self.assertEqual(self.titles(), ["Row 1", "Row 2"])
+        self.assertEqual(json.loads(Path(f"{self.path}.progress").read_text()), {"rows": 2})
+
+        self.write_rows([email] * 5)
+        self.assertIn("Resuming after 2 committed rows", self.import_notes())
+        self.assertEqual(self.titles(), [f"Row {index}" for index in range(1, 6)])
+        self.assertFalse(Path(f"{self.path}.progress").exists())
+        counts = CategoryNoteCount.objects.using(shard_for_user(self.user)).filter(user=self.user)
+        self.assertEqual(list(counts.values_list("count", flat=True)), [5])
+
+        # Without the progress file, derived ids keep a re-run from duplicating notes.
+        self.import_notes("--restart")
+        self.assertEqual(len(self.titles()), 5)
+
+    def test_import_indexes_and_counts_only_the_imported_notes(self):
+        other = User.objects.create_user(email="bystander@example.com", password="Passw0rd")
+        note = Note.objects.create(user=other, category=Category.objects.get(), title="Row kept", content="")
+        other_counts = CategoryNoteCount.objects.using(note._state.db).filter(user=other)
+        # A counter a full rebuild would have reset.
+        other_counts.update(count=7)
+
+        self.write_rows([self.user.email] * 3)
+        with self.capture_queries() as queries:
+            self.import_notes()
+        self.assertNotIn("DELETE FROM notes_note_fts", [query["sql"] for query in queries])
+
+        alias = shard_for_user(self.user)
+        hits = get_search_backend(alias).search("row", user=self.user)
+        self.assertEqual(len(hits), 3)
+        self.assertEqual([hit.note_id for hit in get_search_backend(note._state.db).search("kept")], [note.id])
+        counts = CategoryNoteCount.objects.using(alias).filter(user=self.user)
+        self.assertEqual(list(counts.values_list("count", flat=True)), [3])
+        self.assertEqual(list(other_counts.values_list("count", flat=True)), [7])
+
+
+class NoteExportTests(NotesTestCase):
+    """Exports stream every one of the user's notes as a complete archive."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="exporter@example.com", password="Passw0rd")
+        school = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        personal = Category.objects.create(name="Personal", color="#a878ab", sort_order=2)
+        self.notes = [
+            Note.objects.create(user=self.user, category=[school, personal][index % 2], title=f"Note {index}",
+                                content=f"Body {index}")
+            for index in range(5)
+        ]
+        self.notes.append(Note.objects.create(user=self.user, category=school, title="a/b: c", content="Slashes"))
+        other = User.objects.create_user(email="other@example.com", password="Passw0rd")
+        Note.objects.create(user=other, category=school, title="Not yours")
+        self.client.force_login(self.user)
+
+    def export(self, fmt):
+        # Several database chunks per export, as with a large account.
+        with mock.patch.object(export, "CHUNK_SIZE", 2):
+            response = self.client.get(reverse("notes:note-export"), {"format": fmt})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            return response, b"".join(response)
+
+    def test_ndjson_export(self):
+        response, content = self.export("ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertTrue(response["Content-Disposition"].startswith('attachment; filename="notes-'))
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(sorted(record["id"] for record in records), sorted(str(note.id) for note in self.notes))
+        record = next(record for record in records if record["title"] == "Note 1")
+        self.assertEqual((record["content"], record["category_name"]), ("Body 1", "Personal"))
+        self.assertNotIn("user", record)
+
+    def test_zip_export(self):
+        response, content = self.export("zip")
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            names = archive.namelist()
+            self.assertEqual(len(names), len(self.notes))
+            name = next(name for name in names if name.startswith("School/a_b_ c ("))
+            self.assertIn("# a/b: c\n\nSlashes\n", archive.read(name).decode())
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get(reverse("notes:note-export"), {"format": "pdf"}).status_code, 400)
+
+
+class SyncNoteURLs:
+    urlpatterns = [path("api/", include((note_urlpatterns(use_async=False), "notes")))]
+
+
+class AsyncNoteURLs:
+    urlpatterns = [path("api/", include((note_urlpatterns(use_async=True), "notes")))]
+
+
+class AsyncViewParityTests(NotesTestCase):
+    """The async views answer exactly like the sync views they stand in for."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="parity@example.com", password="Passw0rd")
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(user=self.user, category=self.category, title="Draft", content="hello")
+        self.client.force_login(self.user)
+
+    def request(self, urlconf, method, name, args=(), **kwargs):
+        with override_settings(ROOT_URLCONF=urlconf):
+            return getattr(self.client, method)(reverse(f"notes:{name}", args=args), **kwargs)
+
+    def assertSameResponses(self, method, name, args=(), **kwargs):
+        sync = self.request(SyncNoteURLs, method, name, args, **kwargs)
+        response = self.request(AsyncNoteURLs, method, name, args, **kwargs)
+        self.assertEqual(response.status_code, sync.status_code)
+        for header in ["Content-Type", "ETag", "Last-Modified"]:
+            self.assertEqual(response.get(header), sync.get(header), header)
+        self.assertEqual(response.content and response.json(), sync.content and sync.json())
+        return response
+
+    def test_reads_match(self):
+        for name, args, params in [
+            ("category-list", (), {}),
+            ("note-list", (), {"limit": 1}),
+            ("note-list", (), {"cursor": "not-a-cursor"}),
+            ("note-detail", (self.note.id,), {}),
+            ("note-detail", (uuid.uuid4(),), {}),
+        ]:
+            with self.subTest(name=name, params=params):
+                response = self.assertSameResponses("get", name, args, data=params)
+                if response.has_header("ETag"):
+                    response = self.assertSameResponses("get", name, args, data=params,
+                                                        HTTP_IF_NONE_MATCH=response["ETag"])
+                    self.assertEqual(response.status_code, 304)
+
+    def test_rejected_writes_match(self):
+        for args, body, headers in [
+            ((self.note.id,), {"version": 7, "ops": [{"pos": 0, "insert": "x"}]}, {}),
+            ((self.note.id,), {"version": 1, "ops": [{"pos": 99, "insert": "x"}]}, {}),
+            ((self.note.id,), {"title": "Renamed"}, {"HTTP_IF_MATCH": '"7"'}),
+            ((self.note.id,), {"category": "not-a-category"}, {}),
+            ((uuid.uuid4(),), {"title": "Renamed"}, {}),
+        ]:
+            with self.subTest(body=body, headers=headers):
+                self.assertSameResponses(
+                    "patch", "note-update", args, data=body, content_type="application/json", **headers
+                )
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.title, self.note.version), ("Draft", 1))
+
+        self.client.logout()
+        self.assertSameResponses("get", "note-list")
+
+    def test_accepted_writes_match(self):
+        twin = Note.objects.create(user=self.user, category=self.category, title="Draft", content="hello")
+        body = {"version": 1, "ops": [{"pos": 5, "insert": " world"}]}
+        responses = [
+            self.request(urlconf, "patch", "note-update", [note.id], data=body, content_type="application/json")
+            for urlconf, note in [(SyncNoteURLs, self.note), (AsyncNoteURLs, twin)]
+        ]
+        body = {"title": "Created", "content": "Body", "category": str(self.category.id)}
+        responses += [
+            self.request(urlconf, "post", "note-create", data=body, content_type="application/json")
+            for urlconf in [SyncNoteURLs, AsyncNoteURLs]
+        ]
+        for sync, response in [responses[:2], responses[2:]]:
+            self.assertEqual(response.status_code, sync.status_code)
+            unique = {"id", "created_at", "updated_at", "last_edited_at"}
+            self.assertEqual(
+                {key: value for key, value in response.json().items() if key not in unique},
+                {key: value for key, value in sync.json().items() if key not in unique},
+            )
+        twin.refresh_from_db()
+        self.assertEqual(twin.content, "hello world")
+
+
+@override_settings(
+    NOTES_CONTENT_COMPRESSION=True,
+    NOTES_CONTENT_COMPRESS_MIN_BYTES=256,
+    NOTES_CONTENT_CODEC="zlib",
+    NOTES_CONTENT_DICTIONARY=0,
+)
+class CompressedContentTests(NotesTestCase):
+    """Note content is stored compressed on SQLite and read back unchanged."""
+
+    def test_long_content_is_stored_compressed(self):
+        user = User.objects.create_user(email="writer@example.com", password="Passw0rd")
+        category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        long_note = Note.objects.create(user=user, category=category, title="Long", content="lecture notes " * 100)
+        short_note = Note.objects.create(user=user, category=category, title="Short", content="a short note")
+
+        with connections[long_note._state.db].cursor() as cursor:
+            cursor.execute("SELECT id, typeof(content) FROM notes_note")
+            storage = dict(cursor.fetchall())
+        self.assertEqual(storage[long_note.id.hex], "blob")
+        self.assertEqual(storage[short_note.id.hex], "text")
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("notes:note-detail", args=[long_note.id]))
+        self.assertEqual(response.json()["content"], "lecture notes " * 100)
+
+
+@override_settings(NOTES_REVISION_INTERVAL=0, NOTES_REVISION_SNAPSHOT_EVERY=3, SESSION_ENGINE=DB_SESSIONS)
+class NoteRevisionTests(NotesTestCase):
+    """Revisions rebuild every earlier text, also after compaction."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="editor@example.com", password="Passw0rd")
+        category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(user=self.user, category=category, title="Draft", content="one")
+        self.client.force_login(self.user)
+
+    def edit(self, ops):
+        self.note.refresh_from_db()
+        self.client.patch(
+            reverse("notes:note-update", args=[self.note.id]),
+            {"version": self.note.version, "ops": ops},
+            content_type="application/json",
+        )
+
+    def revision_texts(self):
+        url = reverse("notes:note-revision-list", args=[self.note.id])
+        numbers = [revision["number"] for revision in self.client.get(url).json()["results"]]
+        texts = {}
+        for number in numbers:
+            data = self.client.get(reverse("notes:note-revision-detail", args=[self.note.id, number])).json()
+            texts[number] = (data["title"], data["content"])
+        return texts
+
+    def test_revisions_rebuild_earlier_texts(self):
+        history = [("Draft", "one")]
+        for index in range(7):
+            self.edit([{"pos": 0, "insert": f"{index} "}, {"field": "title", "pos": 5, "insert": "!"}])
+            self.note.refresh_from_db()
+            history.append((self.note.title, self.note.content))
+
+        texts = self.revision_texts()
+        self.assertEqual([texts[number] for number in sorted(texts)], history[:-1])
+
+        call_command("compact_note_revisions", "--max-revisions", "4", stdout=open(os.devnull, "w"))
+        self.assertEqual(self.revision_texts(), {number: history[number - 1] for number in (4, 5, 6, 7)})
+        missing = reverse("notes:note-revision-detail", args=[self.note.id, 1])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_revision_list_queries_do_not_grow_with_revisions(self):
+        for index in range(5):
+            self.edit([{"pos": 0, "insert": f"{index} "}])
+        url = reverse("notes:note-revision-list", args=[self.note.id])
+        self.client.get(url)
+
+        # Session, note, revisions.
+        with self.assertNumQueriesEverywhere(3 + SHARD_LOOKUPS):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()["results"]), 5)
+
+
+@override_settings(NOTES_EVENTS_BACKEND="memory")
+class NoteEventTests(NotesTestCase):
+    """Committed note writes reach the owner's open event streams."""
+
+    def setUp(self):
+        # A fresh broker per test, whatever the process-wide one is.
+        patcher = mock.patch.object(events, "_broker", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_saves_are_pushed_and_resumed(self):
+        user = await sync_to_async(User.objects.create_user)(email="tabs@example.com", password="Passw0rd")
+        category = await Category.objects.acreate(name="School", color="#a8a378", sort_order=1)
+        await sync_to_async(self.async_client.force_login)(user)
+
+        def create_note():
+            with self.captureOnCommitCallbacks(execute=True, using=shard_for_user(user)):
+                return Note.objects.create(user=user, category=category, title="Pushed", content="Body")
+
+        response = await self.async_client.get(reverse("notes:events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b"retry: 1000\n\n")
+        note = await sync_to_async(create_note)()
+        messages = [await anext(stream), await anext(stream)]
+        await stream.aclose()
+
+        upserted = json.loads(messages[0].split(b"data: ")[1])
+        self.assertEqual(upserted["note"]["id"], str(note.id))
+        self.assertEqual(upserted["note"]["title"], "Pushed")
+        self.assertIn(b"event: counts", messages[1])
+
+        # A reconnecting client gets what it missed after its last event id.
+        last_id = messages[0].split(b"\n")[0].removeprefix(b"id: ").decode()
+        response = await self.async_client.get(reverse("notes:events"), headers={"Last-Event-ID": last_id})
+        stream = response.streaming_content
+        await anext(stream)
+        self.assertEqual(await anext(stream), messages[1])
+        await stream.aclose()
+
+    async def test_logs_of_idle_users_are_dropped(self):
+        broker = events.MemoryBroker(backlog=10, retention=60)
+        user_id = uuid.uuid4()
+        broker.publish(user_id, [events.note_deleted(1)])
+        self.assertFalse(broker.listening(user_id))
+        self.assertNotIn(user_id, broker._logs)
+
+        broker.subscribe(user_id).close()
+        broker.publish(user_id, [events.note_deleted(2)])
+        # A client reconnecting soon after resumes from its last event.
+        subscription = broker.subscribe(user_id, last_id=0)
+        self.assertEqual(subscription.pending, [(1, events.note_deleted(2))])
+        subscription.close()
+
+        with mock.patch.object(events.time, "monotonic", return_value=time.monotonic() + 60):
+            self.assertFalse(broker.listening(user_id))
+        self.assertNotIn(user_id, broker._logs)
+        subscription = broker.subscribe(user_id, last_id=1)
+        self.assertEqual(subscription.pending, [(0, events.resync_event())])
+        subscription.close()
+
+    def test_writes_without_listeners_build_no_events(self):
+        user = User.objects.create_user(email="offline@example.com", password="Passw0rd")
+        category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        with mock.patch("notes.signals.NoteListSerializer") as serializer, \
+                mock.patch.object(events, "publish") as publish:
+            Note.objects.create(user=user, category=category, title="Unseen").delete()
+        serializer.assert_not_called()
+        publish.assert_not_called()
+
+    def test_unavailable_under_wsgi(self):
+        user = User.objects.create_user(email="wsgi@example.com", password="Passw0rd")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("notes:events")).status_code, 501)
+
+
+class PreviewTests(SimpleTestCase):
+    """List previews are the first PREVIEW_LENGTH characters with whitespace collapsed."""
+
+    def test_whitespace_heavy_content_still_fills_the_preview(self):
+        content = "".join(f"line {index}\n" + " " * 40 + "\n\n" for index in range(100))
+        preview = build_preview(content)
+        self.assertEqual(len(preview), PREVIEW_LENGTH)
+        self.assertTrue(preview.startswith("line 0 line 1 line 2"))
+        self.assertEqual(build_preview("  short \n\n note  "), "short note")
+        self.assertEqual(build_preview(" " * 5000), "")
+
+
+class NotePatchTests(NotesTestCase):
+    """Delta autosaves and version checks of PATCH /api/notes/<id>/update/."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="patcher@example.com", password="Passw0rd")
+        category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(user=self.user, category=category, title="Draft", content="hello")
+        self.url = reverse("notes:note-update", args=[self.note.id])
+        self.client.force_login(self.user)
+
+    def patch(self, body, **headers):
+        return self.client.patch(self.url, body, content_type="application/json", headers=headers)
+
+    def test_ops_are_applied_at_the_expected_version(self):
+        response = self.patch(
+            {"version": 1, "ops": [{"pos": 5, "insert": " world"}, {"field": "title", "pos": 0, "delete": 5,
+                                                                      "insert": "Final"}]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["version"], response.json()["char_count"]), (2, 11))
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.title, self.note.content, self.note.version), ("Final", "hello world", 2))
+
+        # The version may come from If-Match instead of the body.
+        response = self.patch({"ops": [{"pos": 0, "delete": 1, "insert": "H"}]}, **{"If-Match": '"2"'})
+        self.assertEqual(response.json()["version"], 3)
+
+    def test_stale_versions_are_rejected(self):
+        response = self.patch({"version": 4, "ops": [{"pos": 0, "insert": "x"}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["version"], 1)
+        response = self.patch({"title": "Renamed"}, **{"If-Match": 'W/"7"'})
+        self.assertEqual(response.status_code, 409)
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.title, self.note.content, self.note.version), ("Draft", "hello", 1))
+
+    def test_full_save_is_conditioned_on_the_version_in_the_update(self):
+        note = Note.objects.for_user(self.user).get(id=self.note.id)
+        # Another save lands after this copy was loaded and checked.
+        Note.objects.for_user(self.user).filter(id=self.note.id).update(version=2, title="Theirs")
+        note.title = "Mine"
+        with self.assertRaises(VersionConflict) as conflict:
+            note.save(expected_version=1)
+        self.assertEqual(conflict.exception.current_version, 2)
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.title, self.note.version), ("Theirs", 2))
+
+    def test_malformed_ops_are_rejected(self):
+        for body in [
+            {"version": 1, "ops": [{"pos": 6, "insert": "x"}]},
+            {"version": 1, "ops": [{"pos": 0, "delete": 9}]},
+            {"version": 1, "ops": [{"insert": "x"}]},
+            {"version": 1, "ops": [{"field": "category", "pos": 0, "insert": "x"}]},
+            {"ops": [{"pos": 0, "insert": "x"}]},
+        ]:
+            with self.subTest(body=body):
+                self.assertEqual(self.patch(body).status_code, 400)
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.content, self.note.version), ("hello", 1))
+
+    def test_if_match_parsing(self):
+        self.assertEqual(parse_if_match('"7"'), 7)
+        self.assertEqual(parse_if_match('W/"7"'), 7)
+        self.assertEqual(parse_if_match('"3", "4"'), 3)
+        self.assertIsNone(parse_if_match(None))
+        self.assertIsNone(parse_if_match("*"))
+        self.assertIsNone(parse_if_match('"abc"'))
+
+
+class CategoryRegistryTests(NotesTestCase):
+    """Category names and colors come from the in-process registry, not a query per note."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="lister@example.com", password="Passw0rd")
+        self.categories = [
+            Category.objects.create(name="School", color="#a8a378", sort_order=1),
+            Category.objects.create(name="Personal", color="#a878ab", sort_order=2),
+        ]
+        self.client.force_login(self.user)
+
+    def add_notes(self, count):
+        for index in range(count):
+            Note.objects.create(
+                user=self.user, category=self.categories[index % 2], title=f"Note {index}", content="Body"
+            )
+
+    def test_note_list_queries_do_not_grow_with_notes(self):
+        url = reverse("notes:note-list")
+        self.add_notes(2)
+        self.client.get(url)
+        with self.capture_queries() as few:
+            self.client.get(url)
+        self.add_notes(20)
+        with self.capture_queries() as many, mock.patch.object(
+            registry.cache, "get_or_set", wraps=registry.cache.get_or_set
+        ) as version_checks, mock.patch.object(
+            registry.cache, "aget_or_set", wraps=registry.cache.aget_or_set
+        ) as async_version_checks:
+            response = self.client.get(url)
+
+        results = response.json()["results"]
+        self.assertEqual(len(results), 22)
+        self.assertEqual({note["category_name"] for note in results}, {"School", "Personal"})
+        self.assertEqual(len(many), len(few))
+        self.assertFalse([query for query in many if "notes_category" in query["sql"]])
+        # The registry version is checked once per list, not once per note.
+        self.assertEqual(version_checks.call_count + async_version_checks.call_count, 1)
+
+    async def test_async_snapshot_reloads_for_unknown_ids(self):
+        await category_registry.asnapshot()
+        # Created without invalidating the registry, like a category another process has just added.
+        category = await Category.objects.acreate(name="Work", color="#78aba8", sort_order=3)
+        self.assertIn(category.pk, await category_registry.asnapshot([category.pk]))
+
+    def test_unknown_ids_reload_once(self):
+        unknown = uuid.uuid4()
+        with self.assertNumQueries(1):
+            self.assertIsNone(category_registry.get(unknown))
+        with self.assertNumQueries(0):
+            self.assertIsNone(category_registry.get(unknown))
+
+
+class BulkOperationTests(NotesTestCase):
+    """Batches of creates, updates and moves, applied all together or not at all."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="sorter@example.com", password="Passw0rd")
+        self.school = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.personal = Category.objects.create(name="Personal", color="#a878ab", sort_order=2)
+        self.note = Note.objects.create(user=self.user, category=self.school, title="Draft", content="hello")
+        self.other = Note.objects.create(user=self.user, category=self.school, title="Other", content="text")
+        self.client.force_login(self.user)
+
+    def bulk(self, operations):
+        return self.client.post(reverse("notes:note-bulk"), {"operations": operations}, content_type="application/json")
+
+    def test_batch_is_applied_with_counters_and_versions(self):
+        edited_at = self.other.last_edited_at
+        response = self.bulk([
+            {"op": "create", "title": "New", "content": "fresh", "category": str(self.personal.id)},
+            {"op": "update", "id": str(self.note.id), "version": 1, "content": "hello world"},
+            {"op": "move", "id": str(self.other.id), "version": 1, "category": str(self.personal.id)},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["status"] for result in response.json()["results"]], ["created", "updated", "updated"])
+
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.content, self.note.version, self.note.char_count), ("hello world", 2, 11))
+        self.other.refresh_from_db()
+        # A move changes the category and version only.
+        self.assertEqual((self.other.category, self.other.version), (self.personal, 2))
+        self.assertEqual((self.other.content, self.other.last_edited_at), ("text", edited_at))
+        counts = CategoryNoteCount.objects.using(shard_for_user(self.user)).filter(user=self.user)
+        counts = dict(counts.values_list("category", "count"))
+        self.assertEqual(counts, {self.school.id: 1, self.personal.id: 2})
+
+    def test_invalid_batch_writes_nothing(self):
+        response = self.bulk([
+            {"op": "create", "title": "New", "content": "fresh", "category": str(self.school.id)},
+            {"op": "update", "id": str(self.note.id), "version": 3, "content": "stale"},
+            {"op": "move", "id": str(uuid.uuid4()), "category": str(self.personal.id)},
+        ])
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual(results[0], {"index": 0, "status": "valid"})
+        self.assertIn("version", results[1]["errors"])
+        self.assertIn("id", results[2]["errors"])
+        self.assertEqual(Note.objects.for_user(self.user).count(), 2)
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.content, self.note.version), ("hello", 1))
+
+
+class WriteBehindTests(NotesTestCase):
+    """Delta autosaves buffered and coalesced per note (NOTES_WRITE_BEHIND)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="typist@example.com", password="Passw0rd")
+        category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.note = Note.objects.create(user=self.user, category=category, title="Draft", content="hello")
+        self.client.force_login(self.user)
+        # A window long enough that only the test flushes.
+        self.buffer = writebehind.WriteBehindBuffer(window=3600)
+        patcher = mock.patch.object(writebehind, "_buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings_override = override_settings(NOTES_WRITE_BEHIND=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def autosave(self, version, ops, **params):
+        url = reverse("notes:note-update", args=[self.note.id])
+        if params:
+            url += "?" + "&".join(f"{key}={value}" for key, value in params.items())
+        return self.client.patch(url, {"version": version, "ops": ops}, content_type="application/json")
+
+    def test_autosaves_are_coalesced_and_read_back_before_the_flush(self):
+        text = "hello"
+        for version, word in enumerate([" big", " wide", " world"], start=1):
+            response = self.autosave(version, [{"pos": len(text), "insert": word}])
+            self.assertEqual(response.json()["version"], version + 1)
+            text += word
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.version, self.note.content), (1, "hello"))
+
+        detail = self.client.get(reverse("notes:note-detail", args=[self.note.id])).json()
+        self.assertEqual((detail["version"], detail["content"]), (4, text))
+        listed = self.client.get(reverse("notes:note-list")).json()["results"][0]
+        self.assertEqual(listed["preview"], text)
+
+        # Closing the editor writes the buffered edits once, at the acknowledged version.
+        response = self.client.patch(
+            reverse("notes:note-update", args=[self.note.id]) + "?flush=1", {}, content_type="application/json"
+        )
+        self.assertEqual((response.json()["version"], response.json()["content"]), (4, text))
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.version, self.note.content), (4, text))
+        self.assertEqual(self.buffer.stats(), {"writes_received": 3, "writes_saved": 1, "notes_pending": 0})
+        # A second flush finds nothing left to write.
+        self.buffer.flush(self.note.id)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.version, 4)
+
+    def test_rejected_autosaves_are_not_buffered(self):
+        self.assertEqual(self.autosave(7, [{"pos": 0, "insert": "x"}]).status_code, 409)
+        self.assertEqual(self.autosave(1, [{"pos": 99, "insert": "x"}]).status_code, 400)
+        self.assertEqual(self.buffer.stats()["notes_pending"], 0)
+
+    def test_flush_does_not_overwrite_a_concurrent_writer(self):
+        self.assertEqual(self.autosave(1, [{"pos": 5, "insert": " mine"}]).status_code, 200)
+        # Another process (or a device served by one) saves the note meanwhile.
+        theirs = Note.objects.for_user(self.user).get(id=self.note.id)
+        theirs.content = "hello theirs"
+        theirs.save()
+
+        self.buffer.flush()
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.content, self.note.version), ("hello theirs", 2))
+        detail = self.client.get(reverse("notes:note-detail", args=[self.note.id])).json()
+        self.assertEqual(detail["content"], "hello theirs")
+        # The buffered text is kept as a revision.
+        url = reverse("notes:note-revision-list", args=[self.note.id])
+        texts = [
+            self.client.get(reverse("notes:note-revision-detail", args=[self.note.id, revision["number"]])).json()
+            for revision in self.client.get(url).json()["results"]
+        ]
+        self.assertIn("hello mine", [text["content"] for text in texts])
+
+        # The client learns on its next autosave, reloads and carries on from the stored version.
+        response = self.autosave(2, [{"pos": 0, "insert": "x"}])
+        self.assertEqual((response.status_code, response.json()["version"]), (409, 2))
+        self.assertEqual(self.autosave(2, [{"pos": 0, "insert": "x"}]).status_code, 200)
+        self.buffer.flush(self.note.id)
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.content, self.note.version), ("xhello theirs", 3))
+
+    def test_notes_deleted_while_buffered_are_dropped(self):
+        self.assertEqual(self.autosave(1, [{"pos": 0, "insert": "x"}]).status_code, 200)
+        Note.objects.for_user(self.user).filter(id=self.note.id).delete()
+        self.buffer.flush()
+        self.assertEqual(self.buffer.stats()["notes_pending"], 0)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_LATENCY_BUDGET_MS=0)
+class QueryBudgetTests(NotesTestCase):
+    """Requests over their URL's query budget are logged; ordinary note writes are not."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="budget@example.com", password="Passw0rd")
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.client.force_login(self.user)
+
+    def test_note_writes_stay_within_budget(self):
+        with self.assertNoLogs("notes_project.metrics", "WARNING"):
+            response = self.client.post(
+                reverse("notes:note-create"), {"title": "Draft", "category": str(self.category.id)},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 201)
+            url = reverse("notes:note-update", args=[response.json()["id"]])
+            for body in [{"title": "Renamed"}, {"version": 2, "ops": [{"pos": 0, "insert": "x"}]}]:
+                self.assertEqual(self.client.patch(url, body, content_type="application/json").status_code, 200)
+
+    @override_settings(METRICS_QUERY_BUDGET=1)
+    def test_reads_over_budget_are_logged(self):
+        with self.assertLogs("notes_project.metrics", "WARNING") as logs:
+            self.client.get(reverse("notes:note-list"))
+        self.assertIn("(notes:note-list) over budget", logs.output[0])
+
+
+class ThrottlingTests(NotesTestCase):
+    """Per-user token buckets and load shedding levels."""
+
+    @override_settings(THROTTLE_BUCKETS={"list": (0.5, 2), "autosave": (5, 30)})
+    def test_list_requests_over_the_bucket_get_retry_after(self):
+        user = User.objects.create_user(email="eager@example.com", password="Passw0rd")
+        self.client.force_login(user)
+        url = reverse("notes:note-list")
+        self.assertEqual([self.client.get(url).status_code for _ in range(2)], [200, 200])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+        # Other users have buckets of their own.
+        self.client.force_login(User.objects.create_user(email="calm@example.com", password="Passw0rd"))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(LOAD_SHEDDING_TARGET_MS=100, LOAD_SHEDDING_DB_TARGET_MS=50, LOAD_SHEDDING_SEVERE=2)
+    def test_reads_are_shed_before_autosaves(self):
+        monitor = LoadMonitor()
+        for _ in range(LoadMonitor.MIN_SAMPLES):
+            monitor.observe(0.05, 0.01)
+        self.assertFalse(monitor.should_shed(LOW))
+
+        for _ in range(LoadMonitor.MIN_SAMPLES * 2):
+            monitor.observe(0.15, 0.06)
+        monitor._checked_at = 0
+        self.assertTrue(monitor.should_shed(LOW))
+        self.assertFalse(monitor.should_shed(NORMAL))
+        self.assertFalse(monitor.should_shed(None))
+
+        for _ in range(LoadMonitor.MIN_SAMPLES * 4):
+            monitor.observe(0.05, 0.2)
+        monitor._checked_at = 0
+        self.assertTrue(monitor.should_shed(NORMAL))
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    """The production profile's SQLite backend sets its pragmas and takes the write lock at BEGIN."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "backend.db"
+
+    def connect(self, alias, **options):
+        # Registered under its own alias, so transaction.atomic(using=alias) goes through the backend.
+        connections[alias] = SQLiteDatabaseWrapper(
+            {**connections["default"].settings_dict, "NAME": str(self.path), "OPTIONS": options}, alias
+        )
+        self.addCleanup(connections.__delitem__, alias)
+        self.addCleanup(connections[alias].close)
+        return connections[alias]
+
+    @staticmethod
+    def pragma(connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_set_on_connect(self):
+        writer = self.connect("writer", pragmas={"journal_mode": "WAL", "busy_timeout": 1234})
+        self.assertEqual((self.pragma(writer, "journal_mode"), self.pragma(writer, "busy_timeout")), ("wal", 1234))
+        writer.cursor().execute("CREATE TABLE note (title)")
+
+        reader = self.connect("reader", pragmas={"query_only": "ON"})
+        self.assertEqual(self.pragma(reader, "query_only"), 1)
+        with self.assertRaises(OperationalError):
+            reader.cursor().execute("INSERT INTO note VALUES ('x')")
+
+    def test_immediate_transactions_take_the_write_lock_at_begin(self):
+        writer = self.connect("writer", pragmas={"journal_mode": "WAL"}, transaction_mode="IMMEDIATE")
+        writer.cursor().execute("CREATE TABLE note (title)")
+        self.connect("other", pragmas={"busy_timeout": 0}, transaction_mode="IMMEDIATE")
+        self.connect("deferred", pragmas={"busy_timeout": 0})
+
+        with CaptureQueriesContext(writer) as queries, transaction.atomic(using="writer"):
+            # Nothing written yet, but the lock is held: another IMMEDIATE transaction cannot start.
+            with self.assertRaisesMessage(OperationalError, "database is locked"):
+                with transaction.atomic(using="other"):
+                    pass
+            # A deferred BEGIN takes no lock, so readers still get in.
+            with transaction.atomic(using="deferred"):
+                connections["deferred"].cursor().execute("SELECT count(*) FROM note")
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    """Routing of the production database profile."""
+
+    def test_read_views_read_from_replica(self):
+        router = ReadReplicaRouter()
+        view = read_from_replica(lambda: (router.db_for_read(Note), router.db_for_write(Note)))
+
+        self.assertEqual(view(), (REPLICA, "default"))
+        self.assertEqual(router.db_for_read(Note), "default")
+
+
+@override_settings(NOTES_SHARDS=["shard_1", "shard_2"])
+class ShardRouterTests(SimpleTestCase):
+    """Routing of users' notes data to their shards."""
+
+    def test_notes_follow_their_owner(self):
+        router = ShardRouter()
+        user = User(email="sharded@example.com", shard="shard_2")
+
+        self.assertIn(assign_shard(user.id), settings.NOTES_SHARDS)
+        self.assertEqual(assign_shard(user.id), assign_shard(user.id))
+        self.assertEqual(router.db_for_read(Note, instance=user), "shard_2")
+        self.assertEqual(router.db_for_read(User), "default")
+        with use_shard("shard_1"):
+            self.assertEqual(router.db_for_write(Note), "shard_1")
+            self.assertEqual(router.db_for_read(Category), "shard_1")
+            self.assertEqual(router.db_for_write(Category), "default")
+        note = Note(user_id=user.id)
+        note._state.db = "shard_1"
+        # Revisions and the like of a loaded note are on its database.
+        self.assertEqual(router.db_for_read(Note, instance=note), "shard_1")
+        self.assertFalse(router.allow_migrate("shard_1", "accounts"))
+        self.assertTrue(router.allow_migrate("shard_1", "notes"))
+
+
+@unittest.skipUnless(settings.NOTES_SHARDS, "run with NOTES_SHARD_COUNT=2 to test against shards")
+class ShardingTests(NotesTestCase):
+    """Notes on shard databases, end to end."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="School", color="#a8a378", sort_order=1)
+        self.user = User.objects.create_user(email="sharded@example.com", password="Passw0rd")
+        self.client.force_login(self.user)
+
+    def test_notes_live_on_the_owners_shard_and_move_with_it(self):
+        source = shard_for_user(self.user)
+        self.assertIn(source, settings.NOTES_SHARDS)
+        self.assertTrue(all(Category.objects.using(alias).filter(pk=self.category.pk).exists()
+                            for alias in settings.NOTES_SHARDS))
+        response = self.client.post(
+            reverse("notes:note-create"), {"title": "Sharded", "category": str(self.category.id)},
+            content_type="application/json",
+        )
+        note_id = response.json()["id"]
+        self.assertEqual(Note.objects.using(source).filter(user=self.user).count(), 1)
+        self.assertFalse(Note.objects.using("default").exists())
+
+        target = next(alias for alias in settings.NOTES_SHARDS if alias != source)
+        with self.captureOnCommitCallbacks(execute=True, using="default"):
+            self.assertEqual(move_user(self.user, target), 1)
+        self.assertFalse(Note.objects.using(source).exists())
+        self.assertEqual(CategoryNoteCount.objects.using(target).get(user=self.user).count, 1)
+        self.assertTrue(NoteWatermark.objects.using(target).filter(user=self.user).exists())
+
+        response = self.client.get(reverse("notes:note-list"))
+        self.assertEqual([note["id"] for note in response.json()["results"]], [note_id])
+        response = self.client.get(reverse("notes:note-search"), {"q": "sharded"})
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_stale_cached_user_is_routed_to_the_moved_shard(self):
+        """Another process's cache may still hold the user from before a move."""
+        url = reverse("notes:note-list")
+        self.client.get(url)
+        key = user_cache_key(self.user.pk)
+        stale = cache.get(key)
+        Note.objects.create(user=self.user, category=self.category, title="Moved")
+        target = next(alias for alias in settings.NOTES_SHARDS if alias != stale.shard)
+        with self.captureOnCommitCallbacks(execute=True, using="default"):
+            move_user(self.user, target)
+        cache.set(key, stale)
+
+        response = self.client.get(url)
+        self.assertEqual([note["title"] for note in response.json()["results"]], ["Moved"])
@@ -0,0 +1,22 @@
+import re
+
+PREVIEW_LENGTH = 200
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def build_preview(content, length=PREVIEW_LENGTH):
+    """Collapse runs of whitespace and cut the content to at most `length` characters."""
+    # Collapsing can shrink a prefix to almost nothing (blank lines, indentation), so collapse
+    # growing prefixes until one yields `length` characters, instead of the whole of long notes.
+    end = length * 4
+    while True:
+        preview = _WHITESPACE_RE.sub(" ", content[:end]).strip()
+        if len(preview) >= length or end >= len(content):
+            return preview[:length]
+        end *= 2
+
+
+def count_words(content):
+    """Count whitespace-separated words."""
+    return len(content.split())
@@ -1,19 +1,33 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import (
-    category_list_view,
-    note_create_view,
-    note_detail_view,
-    note_list_view,
-    note_update_view,
-)
+from . import async_views, views
 
 app_name = "notes"
 
-urlpatterns = [
-    path("categories/", category_list_view, name="category-list"),
-    path("notes/", note_list_view, name="note-list"),
-    path("notes/create/", note_create_view, name="note-create"),
-    path("notes/<uuid:note_id>/", note_detail_view, name="note-detail"),
-    path("notes/<uuid:note_id>/update/", note_update_view, name="note-update"),
-]
+
+def note_urlpatterns(use_async=False):
+    """The notes routes, with the async category/list/detail/create/update views if use_async."""
+    core = async_views if use_async else views
+    return [
+        path("categories/", core.category_list_view, name="category-list"),
+        path("events/", async_views.note_events_view, name="events"),
+        path("workspace/bootstrap/", views.workspace_bootstrap_view, name="workspace-bootstrap"),
+        path("notes/", core.note_list_view, name="note-list"),
+        path("notes/create/", core.note_create_view, name="note-create"),
+        path("notes/bulk/", views.note_bulk_view, name="note-bulk"),
+        path("notes/search/", views.note_search_view, name="note-search"),
+        path("notes/changes/", views.note_changes_view, name="note-changes"),
+        path("notes/export/", views.note_export_view, name="note-export"),
+        path("notes/<uuid:note_id>/", core.note_detail_view, name="note-detail"),
+        path("notes/<uuid:note_id>/update/", core.note_update_view, name="note-update"),
+        path("notes/<uuid:note_id>/revisions/", views.note_revision_list_view, name="note-revision-list"),
+        path(
+            "notes/<uuid:note_id>/revisions/<int:number>/",
+            views.note_revision_detail_view,
+            name="note-revision-detail",
+        ),
+    ]
+
+
+urlpatterns = note_urlpatterns(settings.NOTES_ASYNC_VIEWS)
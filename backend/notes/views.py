@@ -1,18 +1,50 @@
+import uuid
+
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Category, Note
-from .serializers import CategorySerializer, NoteDetailSerializer, NoteListSerializer
+from accounts.serializers import UserSerializer
+from notes_project.routers import read_from_replica
+from notes_project.throttling import AutosaveThrottle, ListThrottle
+
+from .bulk import BulkValidationError, apply_operations, max_batch_size
+from .export import FORMATS, export_chunks
+from .feed import DEFAULT_LIMIT, MAX_LIMIT, ResyncRequired, read_changes
+from .models import Category, Note, NoteRevision
+from .pagination import NoteCursorPagination
+from .patching import InvalidTextOperation, VersionConflict, apply_note_patch, parse_if_match
+from .revisions import rebuild_revision
+from .search import MAX_RESULTS, get_search_backend
+from .serializers import (
+    CategorySerializer,
+    NoteDetailSerializer,
+    NoteListSerializer,
+    NotePatchSerializer,
+    NoteRevisionDetailSerializer,
+    NoteRevisionSerializer,
+    NoteSearchResultSerializer,
+    NoteVersionSerializer,
+)
+from .watermarks import conditional_on_watermark
+from .writebehind import get_write_buffer
 
 
+@read_from_replica
+@conditional_on_watermark
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ListThrottle])
 def category_list_view(request):
     """Get all categories with note counts for the current user."""
-    categories = Category.objects.all()
+    categories = Category.objects.with_note_counts(request.user)
     serializer = CategorySerializer(
         categories,
         many=True,
@@ -21,32 +53,212 @@ def category_list_view(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@read_from_replica
+@conditional_on_watermark
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ListThrottle])
 def note_list_view(request):
     """
-    Get all notes for the current user.
-    Optional query parameter: categoryId to filter by category.
+    Get the current user's notes, newest first, one page at a time.
+    Optional query parameters: categoryId to filter by category,
+    limit for the page size and cursor from the previous page's next link.
     """
-    notes = Note.objects.filter(user=request.user)
-    
+    notes = Note.objects.filter(user=request.user).only(*NoteListSerializer.list_columns)
+
     category_id = request.query_params.get("categoryId")
     if category_id:
-        notes = notes.filter(category_id=category_id)
-    
-    serializer = NoteListSerializer(notes, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            notes = notes.filter(category_id=uuid.UUID(category_id))
+        except ValueError:
+            return Response({"categoryId": ["Must be a valid UUID."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = NoteCursorPagination()
+    page = paginator.paginate_queryset(notes, request)
+    buffer = get_write_buffer()
+    if buffer is not None:
+        page = [buffer.overlay(note) for note in page]
+    serializer = NoteListSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@read_from_replica
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def workspace_bootstrap_view(request):
+    """
+    Everything the workspace needs to open, in one response: the current user,
+    a CSRF token, categories with note counts and the first page of notes
+    (`limit` as for the note list). Costs one query each for the categories
+    and the notes, on top of the session lookup.
+    """
+    categories = Category.objects.with_note_counts(request.user)
+    notes = Note.objects.filter(user=request.user).only(*NoteListSerializer.list_columns)
+    paginator = NoteCursorPagination()
+    page = paginator.paginate_queryset(notes, request)
+    buffer = get_write_buffer()
+    if buffer is not None:
+        page = [buffer.overlay(note) for note in page]
+    return Response(
+        {
+            "user": UserSerializer(request.user).data,
+            "csrfToken": get_token(request),
+            "categories": CategorySerializer(categories, many=True).data,
+            "notes": {
+                # Later pages come from the note list, with the same limit.
+                "next": paginator.get_next_link(f"{reverse('notes:note-list')}?{request.GET.urlencode()}"),
+                "results": NoteListSerializer(page, many=True).data,
+            },
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def note_search_view(request):
+    """
+    Full-text search over the current user's notes, best matches first.
+    Query parameters: q (required), categoryId to filter by category, limit.
+    """
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"q": ["This query parameter is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    category_id = request.query_params.get("categoryId")
+    if category_id:
+        try:
+            category_id = uuid.UUID(category_id)
+        except ValueError:
+            return Response({"categoryId": ["Must be a valid UUID."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = min(max(int(request.query_params.get("limit", MAX_RESULTS)), 1), MAX_RESULTS)
+    except ValueError:
+        limit = MAX_RESULTS
+
+    hits = get_search_backend().search(query, user=request.user, category_id=category_id or None, limit=limit)
+    notes = (
+        Note.objects.filter(user=request.user, id__in=[hit.note_id for hit in hits])
+        .only(*NoteListSerializer.list_columns)
+        .in_bulk()
+    )
+    results = []
+    for hit in hits:
+        note = notes.get(hit.note_id)
+        if note is not None:
+            note.title_highlight, note.snippet, note.score = hit.title_highlight, hit.snippet, hit.score
+            results.append(note)
+
+    serializer = NoteSearchResultSerializer(results, many=True)
+    return Response({"results": serializer.data}, status=status.HTTP_200_OK)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def note_changes_view(request):
+    """
+    Get the notes created, updated or deleted after a change cursor, oldest first.
+    Query parameters: since (cursor from the previous response, 0 for a full sync), limit.
+    Deleted notes come back as tombstones. A cursor older than the retained
+    tombstones gets 410 with resync=true; the client should start over from 0.
+    """
+    try:
+        since = int(request.query_params.get("since", 0))
+        limit = int(request.query_params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        return Response({"detail": "since and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+    if since < 0:
+        return Response({"since": ["Must not be negative."]}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(max(limit, 1), MAX_LIMIT)
+
+    try:
+        page = read_changes(request.user, since, limit)
+    except ResyncRequired as resync:
+        return Response(
+            {"detail": str(resync), "resync": True, "cursor": str(resync.cursor)},
+            status=status.HTTP_410_GONE
+        )
+
+    changes = [
+        {"type": "delete", "seq": change.seq, "id": change.note_id}
+        if change.deleted
+        else {"type": "upsert", "seq": change.seq, "note": NoteDetailSerializer(change.note).data}
+        for change in page.changes
+    ]
+    return Response(
+        {"changes": changes, "cursor": str(page.cursor), "has_more": page.has_more},
+        status=status.HTTP_200_OK
+    )
+
+
+@require_GET
+def note_export_view(request):
+    """
+    Download all of the current user's notes as NDJSON (format=ndjson, the default)
+    or as a ZIP of Markdown files (format=zip), streamed as they are read.
+    A plain Django view: DRF reserves the `format` query parameter for choosing a renderer.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_403_FORBIDDEN)
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in FORMATS:
+        return JsonResponse({"format": [f"Must be one of: {', '.join(FORMATS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    buffer = get_write_buffer()
+    if buffer is not None:
+        buffer.flush()
+
+    content_type, extension = FORMATS[fmt]
+    response = StreamingHttpResponse(
+        export_chunks(fmt, Note.objects.for_user(request.user)),
+        content_type=content_type
+    )
+    filename = f"notes-{timezone.now():%Y%m%d}.{extension}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@read_from_replica
+@conditional_on_watermark
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def note_detail_view(request, note_id):
     """Get full details of a specific note."""
     note = get_object_or_404(Note, id=note_id, user=request.user)
+    buffer = get_write_buffer()
+    if buffer is not None:
+        buffer.overlay(note)
     serializer = NoteDetailSerializer(note)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def note_revision_list_view(request, note_id):
+    """List a note's revisions, newest first, without their text."""
+    note = get_object_or_404(Note.objects.only("id"), id=note_id, user=request.user)
+    revisions = note.revisions.only("note", "number", "version", "edited_at", "created_at").order_by("-number")
+    serializer = NoteRevisionSerializer(revisions, many=True)
+    return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def note_revision_detail_view(request, note_id, number):
+    """Get a revision of a note with its title and content, rebuilt from the nearest snapshot."""
+    note = get_object_or_404(Note.objects.only("id"), id=note_id, user=request.user)
+    revision = get_object_or_404(
+        note.revisions.only("note", "number", "version", "edited_at", "created_at"), number=number
+    )
+    try:
+        text = rebuild_revision(note.id, number)
+    except NoteRevision.DoesNotExist:
+        raise Http404
+    revision.title, revision.content = text["title"], text["content"]
+    return Response(NoteRevisionDetailSerializer(revision).data, status=status.HTTP_200_OK)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def note_create_view(request):
@@ -61,18 +273,131 @@ def note_create_view(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def note_bulk_view(request):
+    """
+    Create, update and move many notes in one transaction.
+    Body: {"operations": [{"op": "create" | "update" | "move", "id": ..., "version": ..., "title": ..., ...}]}
+    Either every operation is applied or none is; results are returned per item.
+    Updates and moves with a `version` the note has moved past are rejected.
+    """
+    operations = request.data.get("operations") if isinstance(request.data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return Response({"operations": ["A non-empty list is required."]}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > max_batch_size():
+        return Response(
+            {"operations": [f"At most {max_batch_size()} operations are allowed per request."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(operation, dict) for operation in operations):
+        return Response({"operations": ["Every operation must be an object."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    buffer = get_write_buffer()
+    if buffer is not None:
+        buffer.flush()
+
+    try:
+        results = apply_operations(request.user, operations)
+    except BulkValidationError as error:
+        return Response({"results": error.results}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {
+            "results": [
+                {"index": result["index"], "status": result["status"], "id": result["note"].id,
+                 "version": result["note"].version}
+                for result in results
+            ]
+        },
+        status=status.HTTP_200_OK
+    )
+
+
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([AutosaveThrottle])
 def note_update_view(request, note_id):
-    """Update an existing note (partial update)."""
+    """
+    Update an existing note (partial update).
+    A body with `ops` is applied as text operations (see NotePatchSerializer).
+    The note version may be pinned with an If-Match header (or `version` for ops);
+    edits against a stale version are rejected with 409.
+    With write-behind enabled, ops are buffered and acknowledged immediately;
+    `?flush=1` (sent when the editor closes) writes the buffered edits first.
+    """
+    expected_version = parse_if_match(request.headers.get("If-Match"))
+    buffer = get_write_buffer()
+    if buffer is not None:
+        if "ops" in request.data and not request.query_params.get("flush"):
+            return _patch_note_text(request, note_id, expected_version, buffer)
+        try:
+            buffer.flush(note_id)
+        except VersionConflict as conflict:
+            return _version_conflict_response(conflict.current_version)
+    if "ops" in request.data:
+        return _patch_note_text(request, note_id, expected_version)
+
     note = get_object_or_404(Note, id=note_id, user=request.user)
+    if not request.data:
+        return Response(NoteDetailSerializer(note).data, status=status.HTTP_200_OK)
+    if expected_version is not None and expected_version != note.version:
+        return _version_conflict_response(note.version)
     serializer = NoteDetailSerializer(
         note,
         data=request.data,
         partial=True,
-        context={"request": request}
+        # Checked again by the UPDATE itself, so a save racing this one cannot slip in between.
+        context={"request": request, "expected_version": expected_version}
     )
-    if serializer.is_valid():
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
         serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    except Note.DoesNotExist:
+        raise Http404
+    except VersionConflict as conflict:
+        return _version_conflict_response(conflict.current_version)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def _patch_note_text(request, note_id, expected_version, buffer=None):
+    """Apply a delta autosave with a single version-conditioned UPDATE, or into the write-behind buffer."""
+    serializer = NotePatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    version = serializer.validated_data.get("version", expected_version)
+    if version is None:
+        return Response(
+            {"version": ["A note version is required, either in the body or an If-Match header."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    ops = serializer.validated_data["ops"]
+    try:
+        if buffer is not None:
+            pending = buffer.apply_patch(note_id, request.user, version, ops)
+            values = {
+                "version": pending.version,
+                "word_count": pending.word_count,
+                "char_count": pending.char_count,
+                "last_edited_at": pending.last_edited_at,
+            }
+        else:
+            values = apply_note_patch(note_id, request.user, version, ops)
+    except Note.DoesNotExist:
+        raise Http404
+    except VersionConflict as conflict:
+        return _version_conflict_response(conflict.current_version)
+    except InvalidTextOperation as error:
+        return Response({"ops": [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(NoteVersionSerializer({"id": note_id, **values}).data, status=status.HTTP_200_OK)
+
+
+def _version_conflict_response(current_version):
+    return Response(
+        {"detail": "Note has been modified since this version.", "version": current_version},
+        status=status.HTTP_409_CONFLICT
+    )
@@ -0,0 +1,66 @@
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import NoteWatermark
+
+
+def bump_watermark(user_id, create=True, by=1):
+    """
+    Advance the user's note watermark and return the new counter, which doubles as
+    the change sequence number of the write. Must run inside the transaction of the
+    note write; the row lock it takes orders concurrent writes by the same user.
+    Pass create=False on delete paths, where the owner may itself be being deleted;
+    returns None if the user has no watermark. Batch writes reserve `by` sequence
+    numbers at once, ending at the returned value.
+    """
+    now = timezone.now()
+    watermarks = NoteWatermark.objects.filter(user_id=user_id)
+    if not watermarks.update(counter=F("counter") + by, changed_at=now):
+        if not create:
+            return None
+        NoteWatermark.objects.bulk_create(
+            [NoteWatermark(user_id=user_id, counter=0, changed_at=now)],
+            ignore_conflicts=True,
+        )
+        watermarks.update(counter=F("counter") + by, changed_at=now)
+    return watermarks.values_list("counter", flat=True).get()
+
+
+def bump_all_watermarks(using=None):
+    """Advance every user's watermark (on one shard), for changes to shared data such as categories."""
+    NoteWatermark.objects.using(using).update(counter=F("counter") + 1, changed_at=timezone.now())
+
+
+def get_request_watermark(request):
+    """Load (once per request) the current user's watermark, or None."""
+    if not hasattr(request, "_note_watermark"):
+        user = request.user
+        request._note_watermark = (
+            NoteWatermark.objects.filter(user=user).first() if user.is_authenticated else None
+        )
+    return request._note_watermark
+
+
+def watermark_etag(request, *args, **kwargs):
+    """Strong ETag for a response derived from the user's notes and categories."""
+    from .writebehind import get_write_buffer
+
+    watermark = get_request_watermark(request)
+    if watermark is None:
+        return None
+    etag = f"{watermark.user_id.hex}-{watermark.counter}"
+    buffer = get_write_buffer()
+    if buffer is not None:
+        # Buffered autosaves change responses before they reach the watermark.
+        etag += f"-{buffer.generation(watermark.user_id)}"
+    return etag
+
+
+def watermark_last_modified(request, *args, **kwargs):
+    watermark = get_request_watermark(request)
+    return watermark.changed_at if watermark else None
+
+
+# Answers If-None-Match / If-Modified-Since with 304 before the view runs.
+conditional_on_watermark = condition(etag_func=watermark_etag, last_modified_func=watermark_last_modified)
@@ -0,0 +1,297 @@
+"""
+Opt-in write-behind buffer for delta autosaves (NOTES_WRITE_BEHIND).
+
+Autosaves are acknowledged as soon as they are applied to an in-process copy
+of the note; successive autosaves to the same note within
+NOTES_WRITE_BEHIND_WINDOW seconds are coalesced into one UPDATE by a
+background flusher. Reads in this process overlay the buffered state, other
+writes to a note flush it first, and everything is flushed at exit.
+
+A flush never overwrites a concurrent write (from another process, say): the
+buffered text is kept as a revision of the note instead, reads show the
+stored note again, and the client's next autosave or flush of the note gets
+409 with the current version, so it reconciles.
+
+The buffer is per process: in multi-worker deployments route a user's
+requests to one worker (or keep the window short), since other workers only
+see buffered edits once they are flushed.
+"""
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from notes_project.routers import use_user_shard
+
+from .models import Note
+from .patching import VersionConflict, apply_text_ops, load_note_text, write_note_text
+from .revisions import record_revision
+from .text import build_preview, count_words
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingWrite:
+    """Buffered state of one note."""
+
+    user_id: object
+    category_id: object
+    base_version: int  # version currently stored in the database
+    version: int  # version acknowledged to the client
+    title: str
+    content: str
+    first_buffered_at: float = field(default_factory=time.monotonic)
+    last_edited_at: object = field(default_factory=timezone.now)
+    # Stored version of a concurrent write that the buffered edits lost to.
+    conflict_version: int = None
+
+    @property
+    def word_count(self):
+        return count_words(self.content)
+
+    @property
+    def char_count(self):
+        return len(self.content)
+
+
+class WriteBehindBuffer:
+    """Coalesces delta autosaves per note and flushes them from a background thread."""
+
+    def __init__(self, window):
+        self.window = window
+        self.writes_received = 0
+        self.writes_saved = 0
+        self._pending = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        # Held for each note flush: overlapping flushes of a note would write the same edits twice.
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._closed = False
+
+    def apply_patch(self, note_id, user, version, ops):
+        """Apply ops to the buffered note (loading it on the first write) and return the PendingWrite."""
+        pending = self.get(note_id)
+        if pending is None:
+            current = load_note_text(note_id, user.pk)
+            pending = PendingWrite(
+                user_id=user.pk,
+                category_id=current["category_id"],
+                base_version=current["version"],
+                version=current["version"],
+                title=current["title"],
+                content=current["content"],
+            )
+        if pending.user_id != user.pk:
+            raise Note.DoesNotExist
+
+        with self._lock:
+            # Another request may have registered the note meanwhile.
+            pending = self._pending.get(note_id, pending)
+            if pending.conflict_version is not None:
+                self._pending.pop(note_id, None)
+                raise VersionConflict(pending.conflict_version)
+            if pending.version != version:
+                raise VersionConflict(pending.version)
+            title = apply_text_ops(pending.title, [op for op in ops if op.get("field", "content") == "title"])
+            content = apply_text_ops(pending.content, [op for op in ops if op.get("field", "content") == "content"])
+            pending.title, pending.content = title, content
+            pending.version += 1
+            pending.last_edited_at = timezone.now()
+            # Registered only once the ops applied, so a rejected request schedules no write; this
+            # also re-registers an entry that a flush completed and dropped meanwhile.
+            self._pending[note_id] = pending
+            self.writes_received += 1
+            self._generations[user.pk] = self._generations.get(user.pk, 0) + 1
+        self._ensure_flusher()
+        return pending
+
+    def get(self, note_id):
+        with self._lock:
+            return self._pending.get(note_id)
+
+    def generation(self, user_id):
+        """Number of buffered writes accepted for a user; part of the notes ETags."""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def overlay(self, note):
+        """Show a loaded note instance with its buffered edits applied."""
+        # Callers load notes of the request's user only; list queries do not even load user_id.
+        pending = self.get(note.id)
+        if pending is None or pending.conflict_version is not None:
+            return note
+        note.title = pending.title
+        note.preview = build_preview(pending.content)
+        note.word_count = pending.word_count
+        note.char_count = pending.char_count
+        note.version = pending.version
+        note.last_edited_at = pending.last_edited_at
+        if "content" in note.__dict__:
+            note.content = pending.content
+        return note
+
+    def flush(self, note_id=None):
+        """
+        Write buffered edits now: of one note, or of every note when note_id is None.
+        Raises VersionConflict (and forgets the edits) when note_id's edits lost to a concurrent write.
+        """
+        with self._lock:
+            note_ids = [note_id] if note_id is not None else list(self._pending)
+        for pending_id in note_ids:
+            self._flush_note(pending_id)
+        if note_id is not None:
+            with self._lock:
+                pending = self._pending.get(note_id)
+                if pending is not None and pending.conflict_version is not None:
+                    del self._pending[note_id]
+                    raise VersionConflict(pending.conflict_version)
+
+    def flush_due(self):
+        """Write the notes whose oldest buffered edit is older than the window."""
+        deadline = time.monotonic() - self.window
+        with self._lock:
+            due = [note_id for note_id, pending in self._pending.items() if pending.first_buffered_at <= deadline]
+        for note_id in due:
+            self._flush_note(note_id)
+
+    def close(self):
+        """Flush everything and stop the background flusher."""
+        self._closed = True
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "writes_received": self.writes_received,
+                "writes_saved": self.writes_saved,
+                "notes_pending": len(self._pending),
+            }
+
+    def _flush_note(self, note_id):
+        with self._flush_lock:
+            self._write_pending(note_id)
+
+    def _write_pending(self, note_id):
+        with self._lock:
+            pending = self._pending.get(note_id)
+            if pending is None or pending.conflict_version is not None:
+                return
+            snapshot = (pending.base_version, pending.version, pending.title, pending.content)
+        base_version, version, title, content = snapshot
+
+        current = {"title": title, "content": content, "category_id": pending.category_id}
+        values = {
+            "title": title,
+            "content": content,
+            "preview": build_preview(content),
+            "word_count": count_words(content),
+            "char_count": len(content),
+        }
+        try:
+            try:
+                write_note_text(note_id, pending.user_id, current, values, base_version, version)
+            except VersionConflict as conflict:
+                # Another writer got in between; the client was already told these edits are saved.
+                logger.warning(
+                    "Write-behind flush lost to a concurrent write; keeping the edits as a revision",
+                    extra={"note_id": str(note_id), "expected": base_version, "found": conflict.current_version},
+                )
+                self._keep_as_revision(note_id, pending, title, content, version)
+                with self._lock:
+                    pending.conflict_version = conflict.current_version
+                return
+        except Note.DoesNotExist:
+            # Deleted while buffered: there is nothing left to write the edits to.
+            with self._lock:
+                if self._pending.get(note_id) is pending:
+                    del self._pending[note_id]
+            return
+        except Exception:
+            logger.exception("Write-behind flush failed", extra={"note_id": str(note_id)})
+            return
+
+        with self._lock:
+            self.writes_saved += 1
+            pending.base_version = version
+            if pending.version == version:
+                self._pending.pop(note_id, None)
+            else:
+                # Edits arrived during the flush; keep them buffered on top of what was written.
+                pending.first_buffered_at = time.monotonic()
+
+    @staticmethod
+    def _keep_as_revision(note_id, pending, title, content, version):
+        """Record buffered text that could not be written as the note's next revision, so it can be restored."""
+        with use_user_shard(pending.user_id) as alias, transaction.atomic(using=alias):
+            notes = Note.objects.filter(id=note_id, user_id=pending.user_id)
+            stored = notes.values("revised_at").first()
+            if stored is None:
+                raise Note.DoesNotExist
+            record_revision(note_id, {
+                "title": title,
+                "content": content,
+                "version": version,
+                "last_edited_at": pending.last_edited_at,
+                "revised_at": stored["revised_at"],
+            })
+            if stored["revised_at"] is None:
+                # record_revision() takes a note without revised_at to have no revisions yet.
+                notes.update(revised_at=timezone.now())
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="notes-write-behind", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        interval = max(self.window / 2, 0.05)
+        while not self._closed:
+            time.sleep(interval)
+            try:
+                self.flush_due()
+            except Exception:
+                # Keep the flusher alive; the notes stay buffered for the next tick.
+                logger.exception("Write-behind flusher tick failed")
+            finally:
+                connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """Return the process-wide buffer, or None when write-behind is disabled."""
+    global _buffer
+    if not settings.NOTES_WRITE_BEHIND:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(settings.NOTES_WRITE_BEHIND_WINDOW)
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def collect_metrics():
+    """Buffer counters for the /metrics endpoint (see notes_project.metrics)."""
+    if _buffer is None:
+        return []
+    stats = _buffer.stats()
+    return [
+        ("notes_write_behind_writes_received_total", "counter", "Delta autosaves accepted into the buffer.",
+         stats["writes_received"]),
+        ("notes_write_behind_writes_saved_total", "counter", "Buffered notes written to the database.",
+         stats["writes_saved"]),
+        ("notes_write_behind_notes_pending", "gauge", "Notes with unflushed edits.", stats["notes_pending"]),
+    ]
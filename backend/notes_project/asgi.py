@@ -2,6 +2,8 @@
 ASGI config for notes_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides the API, it serves the note change stream at /api/events/, which
+needs an ASGI server (see notes.events).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -0,0 +1,136 @@
+"""
+Content-Encoding negotiation and encoders for CompressionMiddleware.
+
+gzip is always available; br and zstd are offered only when the brotli and
+zstandard packages are installed. COMPRESSION_ENCODINGS lists the encodings
+in the server's order of preference; the client's Accept-Encoding q-values
+win over it. Levels favour speed, since every response is compressed on the fly.
+"""
+import re
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+# Streamed responses are flushed to the client once this much input has been
+# compressed, rather than after every chunk, which would ruin the ratio for
+# small chunks such as NDJSON lines.
+STREAM_FLUSH_SIZE = 64 * 1024
+
+_ACCEPT_ENCODING = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=4)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+ENCODERS = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+
+
+def negotiate(accept_encoding):
+    """Return the encoder class to use for an Accept-Encoding header, or None."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        match = _ACCEPT_ENCODING.fullmatch(item)
+        if match:
+            try:
+                accepted[match[1].lower()] = float(match[2] or 1)
+            except ValueError:
+                pass
+    available = [name for name in settings.COMPRESSION_ENCODINGS if name in ENCODERS]
+    weights = {name: accepted.get(name, accepted.get("*", 0)) for name in available}
+    candidates = [name for name in available if weights[name] > 0]
+    if not candidates:
+        return None
+    # max() keeps the first of equal weights, i.e. the server's preference.
+    return ENCODERS[max(candidates, key=weights.get)]
+
+
+def compress(encoder_class, data):
+    encoder = encoder_class()
+    return encoder.compress(data) + encoder.finish()
+
+
+def compress_stream(encoder_class, chunks):
+    """Compress an iterator of byte chunks, flushing about every STREAM_FLUSH_SIZE bytes."""
+    encoder, pending = encoder_class(), 0
+    for chunk in chunks:
+        output, pending = _feed(encoder, chunk, pending)
+        if output:
+            yield output
+    yield encoder.finish()
+
+
+async def acompress_stream(encoder_class, chunks):
+    """compress_stream() for an async iterator."""
+    encoder, pending = encoder_class(), 0
+    async for chunk in chunks:
+        output, pending = _feed(encoder, chunk, pending)
+        if output:
+            yield output
+    yield encoder.finish()
+
+
+def _feed(encoder, chunk, pending):
+    output = encoder.compress(chunk)
+    pending += len(chunk)
+    if pending >= STREAM_FLUSH_SIZE:
+        return output + encoder.flush(), 0
+    return output, pending
@@ -0,0 +1,192 @@
+"""
+In-process request metrics in the Prometheus text format.
+
+RequestMetricsMiddleware records, per URL name, the query count, SQL time,
+serialization time, response size and latency of each request into the
+histograms below; metrics_view renders them at /metrics. Values live in the
+memory of each worker process, so every worker is scraped separately.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from .renderers import FastJSONRenderer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """A labelled cumulative histogram with fixed bucket bounds."""
+
+    def __init__(self, name, documentation, buckets, labels=("view",)):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = _format_labels(zip(self.labels + ("le",), label_values + (str(bound),)))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    """Histograms plus collectors: callables returning (name, type, documentation, value) samples."""
+
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, *args, **kwargs):
+        histogram = Histogram(*args, **kwargs)
+        self.histograms.append(histogram)
+        return histogram
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.collect())
+        for collector in self.collectors:
+            for name, kind, documentation, value in collector():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Request latency by URL name.", LATENCY_BUCKETS, ("view", "method")
+)
+REQUEST_QUERIES = registry.histogram("http_request_db_queries", "SQL queries per request.", QUERY_BUCKETS)
+REQUEST_SQL_DURATION = registry.histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per request.", LATENCY_BUCKETS
+)
+REQUEST_SERIALIZATION_DURATION = registry.histogram(
+    "http_request_serialization_seconds", "Time spent in DRF serializers and renderers per request.", LATENCY_BUCKETS
+)
+RESPONSE_SIZE = registry.histogram("http_response_size_bytes", "Response body size.", SIZE_BUCKETS)
+
+
+class RequestSample:
+    """Counters accumulated while one request is handled."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.serialization_depth = 0
+
+
+# A context variable rather than a per-request execute_wrapper: under ASGI, queries run on
+# asgiref's sync thread, whose connection differs from the one the middleware would see.
+_current_sample = contextvars.ContextVar("request_metrics_sample", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request's sample, if any."""
+    sample = _current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.sql_seconds += time.perf_counter() - start
+        sample.queries += 1
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    """connection_created receiver installing record_query on every database connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def current_sample():
+    """The sample for the request being handled, or None outside the metrics middleware."""
+    return _current_sample.get()
+
+
+@contextmanager
+def recording(sample):
+    token = _current_sample.set(sample)
+    try:
+        yield sample
+    finally:
+        _current_sample.reset(token)
+
+
+@contextmanager
+def serialization_timer():
+    """Add the enclosed time to the request's serialization time; nested timers count once."""
+    sample = _current_sample.get()
+    if sample is None:
+        yield
+        return
+    sample.serialization_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.serialization_depth -= 1
+        if not sample.serialization_depth:
+            sample.serialization_seconds += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Counts to_representation towards the request's serialization time."""
+
+    def to_representation(self, instance):
+        with serialization_timer():
+            return super().to_representation(instance)
+
+
+class TimedJSONRenderer(FastJSONRenderer):
+    """FastJSONRenderer that counts encoding towards the request's serialization time."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def metrics_view(request):
+    """Prometheus text exposition, served only to METRICS_ALLOWED_IPS."""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _format_labels(pairs):
+    pairs = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
@@ -0,0 +1,201 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .compression import acompress_stream, compress, compress_stream, negotiate
+from .metrics import (
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_SERIALIZATION_DURATION,
+    REQUEST_SQL_DURATION,
+    RESPONSE_SIZE,
+    RequestSample,
+    current_sample,
+    install_query_recorder,
+    recording,
+)
+from .routers import routing_for_request
+from .throttling import load_monitor, view_priority
+
+logger = logging.getLogger("notes_project.metrics")
+
+# Types worth compressing; images, archives such as ZIP exports and the like already are.
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "text/")
+# Compressed streams are flushed in blocks, which would hold back server-sent events.
+UNBUFFERED_TYPES = ("text/event-stream",)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, SQL time, serialization time, response size and latency
+    per URL name, and log requests over METRICS_QUERY_BUDGET queries or
+    METRICS_LATENCY_BUDGET_MS milliseconds. Place it first so it sees the whole request.
+    Works in both sync and async mode, so async views keep running on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder, dispatch_uid="notes_project.metrics")
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with recording(RequestSample()) as sample:
+            response = self.get_response(request)
+        self.observe(request, response, sample, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        with recording(RequestSample()) as sample:
+            response = await self.get_response(request)
+        self.observe(request, response, sample, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, sample, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        REQUEST_DURATION.observe(elapsed, view, request.method)
+        REQUEST_QUERIES.observe(sample.queries, view)
+        REQUEST_SQL_DURATION.observe(sample.sql_seconds, view)
+        REQUEST_SERIALIZATION_DURATION.observe(sample.serialization_seconds, view)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), view)
+
+        query_budget = settings.METRICS_QUERY_BUDGETS.get(view, settings.METRICS_QUERY_BUDGET)
+        latency_budget = settings.METRICS_LATENCY_BUDGET_MS
+        if (query_budget and sample.queries > query_budget) or (latency_budget and elapsed * 1000 > latency_budget):
+            logger.warning(
+                "%s %s (%s) over budget: %d queries, %.1f ms total, %.1f ms SQL, %.1f ms serialization",
+                request.method,
+                request.path,
+                view,
+                sample.queries,
+                elapsed * 1000,
+                sample.sql_seconds * 1000,
+                sample.serialization_seconds * 1000,
+            )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best encoding the client accepts (zstd, br or
+    gzip; see notes_project.compression). Like Django's GZipMiddleware, it
+    skips bodies under COMPRESSION_MIN_SIZE bytes and weakens strong ETags,
+    which If-None-Match still matches. Streamed responses are compressed as
+    they are sent. Place it right after RequestMetricsMiddleware, which then
+    records the compressed size.
+    """
+
+    def process_response(self, request, response):
+        if not settings.COMPRESSION_ENABLED or response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or content_type.startswith(UNBUFFERED_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoder = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoder is None:
+            return response
+
+        if response.streaming:
+            stream = acompress_stream if response.is_async else compress_stream
+            response.streaming_content = stream(encoder, response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            compressed = compress(encoder, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoder.name
+        return response
+
+
+class LoadSheddingMiddleware(MiddlewareMixin):
+    """
+    Answer 503 with Retry-After instead of running low-priority views while
+    this process is overloaded (see notes_project.throttling), and feed the
+    timings of the requests it does serve back into the decision. Place it
+    after the compression middleware: the check runs before the session is
+    loaded, and SQL time comes from RequestMetricsMiddleware.
+    """
+
+    def process_request(self, request):
+        request._load_started_at = time.perf_counter()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.LOAD_SHEDDING_ENABLED:
+            return None
+        if not load_monitor.should_shed(view_priority(request.resolver_match.view_name)):
+            return None
+        request._load_shed = True
+        response = JsonResponse({"detail": "The server is busy; try again shortly."}, status=503)
+        response["Retry-After"] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+        return response
+
+    def process_response(self, request, response):
+        started_at = getattr(request, "_load_started_at", None)
+        if not settings.LOAD_SHEDDING_ENABLED or started_at is None or getattr(request, "_load_shed", False):
+            return response
+        # Streams such as exports and change events stay open far longer than requests.
+        if not response.streaming:
+            sample = current_sample()
+            load_monitor.observe(time.perf_counter() - started_at, sample.sql_seconds if sample else 0.0)
+        return response
+
+
+class ShardRoutingMiddleware:
+    """
+    Route the notes queries of a request to the shard of request.user (see
+    notes_project.routers). Place it after the authentication middleware. Only
+    installed with NOTES_SHARD_COUNT; streamed response bodies run after it returns,
+    so their querysets must name the shard themselves (Note.objects.for_user).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.NOTES_SHARDS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_for_request(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with routing_for_request(request):
+            return await self.get_response(request)
@@ -0,0 +1,72 @@
+"""
+JSON encoding and decoding for the API.
+
+JSON_BACKEND selects "orjson" (the default when it is installed) or the
+standard library "json". orjson is several times faster on large lists and
+produces the same documents as DRF's JSONRenderer with default settings:
+compact, unescaped non-ASCII, UUIDs as strings, datetimes in ISO 8601 with
+"Z" for UTC, and U+2028/U+2029 escaped. Whatever orjson cannot encode itself
+(lazy strings, Decimals, querysets, ...) goes through DRF's encoder.
+"""
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+_encoder = JSONEncoder()
+# JavaScript line terminators, which DRF escapes so the output is valid JavaScript too.
+_LINE_SEPARATORS = (("\u2028".encode(), b"\\u2028"), ("\u2029".encode(), b"\\u2029"))
+
+
+def use_orjson():
+    return orjson is not None and settings.JSON_BACKEND == "orjson"
+
+
+def dumps(data):
+    """Encode data as compact JSON bytes, like DRF's JSONRenderer."""
+    if use_orjson():
+        encoded = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    else:
+        encoded = json.dumps(
+            data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+    for separator, escaped in _LINE_SEPARATORS:
+        if separator in encoded:
+            encoded = encoded.replace(separator, escaped)
+    return encoded
+
+
+def loads(data):
+    """Decode JSON bytes or text; raises ValueError on malformed input."""
+    return orjson.loads(data) if use_orjson() else json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding through dumps(); indented output (the browsable API) stays with DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding through loads()."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if not use_orjson():
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
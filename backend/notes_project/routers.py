@@ -0,0 +1,178 @@
+"""
+Database routing: read replica and user shards.
+
+Views decorated with read_from_replica run their queries on the "replica"
+alias (production profile), a read-only connection to the same SQLite file:
+under WAL its readers never wait for the autosave writers on "default", and
+it cannot write by accident. Everything else, and every write, goes to "default".
+
+With NOTES_SHARD_COUNT set, ShardRouter keeps each user's notes data (the
+notes app) on the user's shard, recorded in User.shard when the user is
+created: a stable hash of the user id over NOTES_SHARDS. Users placed before
+sharding was enabled keep an empty shard, meaning "default", until they are
+moved with `rebalance_shards`. Notes queries go to the shard of the request's
+user (ShardRoutingMiddleware), of the instance they start from, or of the
+block they run in (use_shard); users, sessions and everything else stay on
+"default". Categories are written to "default" and copied to every shard
+(see notes.sharding), so notes can keep their foreign key to them.
+"""
+import contextvars
+import functools
+import zlib
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+# Apps whose tables live on every shard; their rows belong to one user, except for replicated models.
+SHARDED_APPS = {"notes"}
+REPLICATED_MODELS = {"notes.category"}
+
+_reading_from_replica = contextvars.ContextVar("reading_from_replica", default=False)
+_pinned_shard = contextvars.ContextVar("pinned_shard", default=None)
+_shard_request = contextvars.ContextVar("shard_request", default=None)
+
+
+def read_from_replica(view):
+    """Route the view's reads to the replica (when ReadReplicaRouter is installed)."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = _reading_from_replica.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _reading_from_replica.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _reading_from_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _reading_from_replica.reset(token)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if _reading_from_replica.get() else "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+def shard_aliases():
+    """Every database holding notes: "default" (users placed before sharding) and the shards."""
+    return [DEFAULT_DB_ALIAS, *settings.NOTES_SHARDS]
+
+
+def assign_shard(user_id):
+    """Shard for a new user: a stable hash of the id, or "" (the default database) without shards."""
+    if not settings.NOTES_SHARDS:
+        return ""
+    return settings.NOTES_SHARDS[zlib.crc32(user_id.bytes) % len(settings.NOTES_SHARDS)]
+
+
+def shard_for_user(user):
+    return user.shard or DEFAULT_DB_ALIAS
+
+
+def shard_for_user_id(user_id):
+    """The user's shard, looked up in the directory unless it is the request's user."""
+    if not settings.NOTES_SHARDS:
+        return DEFAULT_DB_ALIAS
+    request = _shard_request.get()
+    if request is not None and request.user.pk == user_id:
+        return shard_for_user(request.user)
+    from django.contrib.auth import get_user_model
+
+    users = get_user_model().objects.using(DEFAULT_DB_ALIAS)
+    return users.filter(pk=user_id).values_list("shard", flat=True).first() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_shard(alias):
+    """Route notes queries without a more specific hint to `alias` inside the block; yields it."""
+    token = _pinned_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _pinned_shard.reset(token)
+
+
+def use_user_shard(user_id):
+    return use_shard(shard_for_user_id(user_id))
+
+
+@contextmanager
+def routing_for_request(request):
+    """Route notes queries of the block to the shard of request.user (resolved when first needed)."""
+    token = _shard_request.set(request)
+    try:
+        yield
+    finally:
+        _shard_request.reset(token)
+
+
+def current_shard():
+    """The shard notes queries go to by default here, or None outside requests and use_shard()."""
+    alias = _pinned_shard.get()
+    if alias is None:
+        request = _shard_request.get()
+        if request is not None and request.user.is_authenticated:
+            alias = shard_for_user(request.user)
+    return alias
+
+
+class ShardRouter:
+    """Sends notes data to the owner's shard and everything else to "default" (or the replica)."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in SHARDED_APPS:
+            return self._shard(hints.get("instance"))
+        if _reading_from_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower in REPLICATED_MODELS:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in SHARDED_APPS:
+            return self._shard(hints.get("instance"))
+        return DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def _shard(instance):
+        from django.contrib.auth import get_user_model
+
+        if isinstance(instance, get_user_model()):
+            # user.notes and the like
+            return shard_for_user(instance)
+        if instance is not None and instance._state.db and instance._meta.app_label in SHARDED_APPS:
+            # Related rows of a loaded note are on its shard; a category's are wherever the query runs.
+            if instance._meta.label_lower not in REPLICATED_MODELS:
+                return instance._state.db
+        alias = current_shard()
+        if alias is None and getattr(instance, "user_id", None) is not None:
+            alias = shard_for_user_id(instance.user_id)
+        return alias or DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Notes point at users on "default" and at categories present on every shard.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA:
+            return False
+        return db == DEFAULT_DB_ALIAS or app_label in SHARDED_APPS
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import copy
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -48,12 +50,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "notes_project.middleware.RequestMetricsMiddleware",
+    "notes_project.middleware.CompressionMiddleware",
+    "notes_project.middleware.LoadSheddingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "accounts.middleware.CachedAuthenticationMiddleware",
+    "notes_project.middleware.ShardRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -82,10 +88,83 @@ WSGI_APPLICATION = 'notes_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DB_PROFILE=production turns on WAL and the tuned pragmas below, persistent
+# connections, and a read-only "replica" connection for the read views
+# (see notes_project/sqlite/base.py and notes_project/routers.py). The test
+# runner leaves the replica out: a TestCase keeps its writes in a transaction
+# that a second connection cannot see (or, on the in-memory test database, is
+# locked out by), so the read views read from "default" there.
+
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': SQLITE_PATH,
+    }
+}
+
+DB_PROFILE = os.getenv("DB_PROFILE", "development")
+if DB_PROFILE == "production":
+    SQLITE_PRAGMAS = {
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536")),  # negative: KiB, not pages
+    }
+    DB_CONNECTION = {
+        "ENGINE": "notes_project.sqlite",
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    DATABASES = {
+        "default": {
+            **DB_CONNECTION,
+            "NAME": SQLITE_PATH,
+            "OPTIONS": {
+                "pragmas": {"journal_mode": "WAL", "synchronous": "NORMAL", **SQLITE_PRAGMAS},
+                "transaction_mode": "IMMEDIATE",
+            },
+        },
+    }
+    if sys.argv[1:2] != ["test"]:
+        DATABASES["replica"] = {
+            **DB_CONNECTION,
+            "NAME": f"{SQLITE_PATH.resolve().as_uri()}?mode=ro",
+            "OPTIONS": {"pragmas": {**SQLITE_PRAGMAS, "query_only": "ON"}},
+        }
+        DATABASE_ROUTERS = ["notes_project.routers.ReadReplicaRouter"]
+
+# NOTES_SHARD_COUNT > 0 stores each user's notes on one of that many extra
+# databases ("shard_1", ...; files next to SQLITE_PATH, with the same profile),
+# picked when the user signs up. Users, sessions and the rest stay on "default",
+# and categories are copied to every shard (see notes_project/routers.py).
+NOTES_SHARD_COUNT = int(os.getenv("NOTES_SHARD_COUNT", "0"))
+NOTES_SHARDS = [f"shard_{number}" for number in range(1, NOTES_SHARD_COUNT + 1)]
+for alias in NOTES_SHARDS:
+    DATABASES[alias] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "NAME": SQLITE_PATH.with_name(f"{SQLITE_PATH.stem}.{alias}{SQLITE_PATH.suffix}"),
+    }
+if NOTES_SHARDS:
+    DATABASE_ROUTERS = ["notes_project.routers.ShardRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# CACHE_BACKEND: locmem (per process), file, or redis (needs the redis package;
+# CACHE_LOCATION like redis://127.0.0.1:6379/0). Use a shared cache when running
+# more than one process.
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / ".cache") if CACHE_BACKEND == "file" else ""),
     }
 }
 
@@ -157,19 +236,41 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "notes_project.metrics.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "notes_project.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 100,
 }
 
 # Password Hashing
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "accounts.hashers.ConfigurableArgon2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
     "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
 ]
 
+# Argon2 cost; stored hashes with other parameters are upgraded on the next login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "102400"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "8"))
+# Login and signup hash on a bounded pool (see accounts.hashing); beyond
+# workers + queue they answer 503 with Retry-After
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASHING_QUEUE = int(os.getenv("PASSWORD_HASHING_QUEUE", "16"))
+PASSWORD_HASHING_RETRY_AFTER = int(os.getenv("PASSWORD_HASHING_RETRY_AFTER", "1"))
+
 # Session Settings
+# django.contrib.sessions.backends.cached_db (or .signed_cookies) skips the session read
+# on warm requests; see CACHES.
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.db")
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = "Lax"
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
@@ -177,5 +278,81 @@ CSRF_COOKIE_HTTPONLY = False
 CSRF_COOKIE_SAMESITE = "Lax"
 CSRF_COOKIE_SECURE = False  # Set to True in production with HTTPS
 
+# Seconds request.user is served from the cache (see accounts.middleware); 0 disables it
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "60"))
+
 # CSRF Settings for CORS
 CSRF_TRUSTED_ORIGINS = os.getenv("CSRF_TRUSTED_ORIGINS", "http://localhost:3000").split(",")
+
+# Metrics Settings (see notes_project.metrics)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+# Requests over either budget are logged; 0 disables the check
+METRICS_QUERY_BUDGET = int(os.getenv("METRICS_QUERY_BUDGET", "10"))
+# Note writes also maintain counters, the watermark, revisions and the search index
+METRICS_WRITE_QUERY_BUDGET = int(os.getenv("METRICS_WRITE_QUERY_BUDGET", "20"))
+# Query budgets by URL name, in place of METRICS_QUERY_BUDGET
+METRICS_QUERY_BUDGETS = {
+    view: METRICS_WRITE_QUERY_BUDGET for view in ("notes:note-create", "notes:note-update", "notes:note-bulk")
+}
+METRICS_LATENCY_BUDGET_MS = float(os.getenv("METRICS_LATENCY_BUDGET_MS", "500"))
+
+# JSON and Compression Settings
+# API JSON is encoded with orjson (falls back to the json module when it is not installed)
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson")
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True") == "True"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes
+# Server preference; br and zstd need the brotli and zstandard packages
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+
+# Notes Settings
+# Seconds a process may serve categories without reloading (see notes.registry)
+NOTES_CATEGORY_REGISTRY_TTL = float(os.getenv("NOTES_CATEGORY_REGISTRY_TTL", "60"))
+# Serve categories, note list/detail/create/update from notes.async_views (for ASGI)
+NOTES_ASYNC_VIEWS = os.getenv("NOTES_ASYNC_VIEWS", "False") == "True"
+NOTES_BULK_MAX_BATCH = int(os.getenv("NOTES_BULK_MAX_BATCH", "500"))
+# Store note content compressed on SQLite (see notes.fields); compress_note_content converts existing rows
+NOTES_CONTENT_COMPRESSION = os.getenv("NOTES_CONTENT_COMPRESSION", "True") == "True"
+NOTES_CONTENT_COMPRESS_MIN_BYTES = int(os.getenv("NOTES_CONTENT_COMPRESS_MIN_BYTES", "256"))
+NOTES_CONTENT_CODEC = os.getenv("NOTES_CONTENT_CODEC", "zlib")  # or zstd, with the zstandard package
+# Id of the dictionary in notes/dictionaries used for new writes (0: none; see train_content_dictionary)
+NOTES_CONTENT_DICTIONARY = int(os.getenv("NOTES_CONTENT_DICTIONARY", "0"))
+# Buffer delta autosaves in-process and coalesce them per note (see notes.writebehind)
+NOTES_WRITE_BEHIND = os.getenv("NOTES_WRITE_BEHIND", "False") == "True"
+NOTES_WRITE_BEHIND_WINDOW = float(os.getenv("NOTES_WRITE_BEHIND_WINDOW", "2.0"))
+# Keep a note revision at most every NOTES_REVISION_INTERVAL seconds, and at the start of
+# each editing session (after NOTES_REVISION_SESSION_GAP idle seconds); see notes.revisions
+NOTES_REVISION_INTERVAL = int(os.getenv("NOTES_REVISION_INTERVAL", "600"))
+NOTES_REVISION_SESSION_GAP = int(os.getenv("NOTES_REVISION_SESSION_GAP", "120"))
+NOTES_REVISION_SNAPSHOT_EVERY = int(os.getenv("NOTES_REVISION_SNAPSHOT_EVERY", "10"))
+# Push note changes to open clients over GET /api/events/ (ASGI only; see notes.events):
+# memory (one process), cache (every process sharing CACHE_BACKEND), or off
+NOTES_EVENTS_BACKEND = os.getenv("NOTES_EVENTS_BACKEND", "memory")
+NOTES_EVENTS_BACKLOG = int(os.getenv("NOTES_EVENTS_BACKLOG", "100"))  # events per connected user, memory backend
+NOTES_EVENTS_TTL = int(os.getenv("NOTES_EVENTS_TTL", "300"))  # seconds, cache backend
+NOTES_EVENTS_POLL_INTERVAL = float(os.getenv("NOTES_EVENTS_POLL_INTERVAL", "0.5"))  # seconds, cache backend
+NOTES_EVENTS_HEARTBEAT = float(os.getenv("NOTES_EVENTS_HEARTBEAT", "15"))
+# Streams end after this many seconds and the browser reconnects from its last event id;
+# the memory backend drops the log of a user idle this long
+NOTES_EVENTS_MAX_AGE = float(os.getenv("NOTES_EVENTS_MAX_AGE", "300"))
+
+# Throttling and Load Shedding Settings (see notes_project.throttling)
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "True") == "True"
+# Per-user token buckets: (tokens added per second, bucket size)
+THROTTLE_BUCKETS = {
+    "autosave": (
+        float(os.getenv("THROTTLE_AUTOSAVE_RATE", "5")),
+        int(os.getenv("THROTTLE_AUTOSAVE_BURST", "30")),
+    ),
+    "list": (
+        float(os.getenv("THROTTLE_LIST_RATE", "2")),
+        int(os.getenv("THROTTLE_LIST_BURST", "30")),
+    ),
+}
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "True") == "True"
+LOAD_SHEDDING_TARGET_MS = float(os.getenv("LOAD_SHEDDING_TARGET_MS", "500"))  # p95 request latency
+LOAD_SHEDDING_DB_TARGET_MS = float(os.getenv("LOAD_SHEDDING_DB_TARGET_MS", "250"))  # p95 SQL time per request
+# Multiple of the targets at which autosaves are shed as well as low-priority reads
+LOAD_SHEDDING_SEVERE = float(os.getenv("LOAD_SHEDDING_SEVERE", "2"))
+LOAD_SHEDDING_WINDOW = float(os.getenv("LOAD_SHEDDING_WINDOW", "5"))  # seconds of requests considered
+LOAD_SHEDDING_RETRY_AFTER = int(os.getenv("LOAD_SHEDDING_RETRY_AFTER", "2"))  # seconds
@@ -0,0 +1,34 @@
+"""
+SQLite backend used by the production database profile (DB_PROFILE=production).
+
+It is Django's sqlite3 backend with two extra OPTIONS:
+
+- "pragmas": {name: value} run on every new connection, e.g. journal_mode=WAL.
+- "transaction_mode": "IMMEDIATE" starts atomic() blocks with BEGIN IMMEDIATE,
+  so a transaction takes the write lock up front and waits busy_timeout for it.
+  With the default deferred BEGIN, a transaction that reads before it writes
+  fails at once with "database is locked" when another writer got there first,
+  because SQLite cannot wait without risking a deadlock. (Django 5.1 has this
+  option built in.)
+"""
+from django.db.backends.sqlite3 import base
+
+EXTRA_OPTIONS = ("pragmas", "transaction_mode")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in EXTRA_OPTIONS:
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode")
+        self.cursor().execute(f"BEGIN {mode}" if mode else "BEGIN")
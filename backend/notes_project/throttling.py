@@ -0,0 +1,173 @@
+"""
+Per-user token-bucket throttling and adaptive load shedding.
+
+Throttles: each user gets a bucket per scope (THROTTLE_BUCKETS) holding up to
+`burst` tokens and refilled at `rate` tokens per second; a request takes one
+token, and with none left it gets 429 with Retry-After set to when the next
+token arrives. Buckets live in the default cache: per process with locmem,
+shared with file or redis. Like DRF's own throttles, the read-modify-write
+is not atomic, so concurrent requests can occasionally slip through.
+
+Load shedding (LoadSheddingMiddleware): each process keeps the latency and
+SQL time (which includes waiting for the SQLite write lock) of the requests
+it served over the last LOAD_SHEDDING_WINDOW seconds. When their p95 goes
+over LOAD_SHEDDING_TARGET_MS or LOAD_SHEDDING_DB_TARGET_MS, low-priority reads
+get 503 with Retry-After; at LOAD_SHEDDING_SEVERE times the target,
+autosaves and other normal-priority requests are shed too. Sign-in, the
+workspace bootstrap and the event stream are never shed.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+LOW, NORMAL = 1, 2
+# Shed first: lists and other reads that clients can retry or refresh later.
+LOW_PRIORITY_VIEWS = {
+    "notes:category-list",
+    "notes:note-list",
+    "notes:note-search",
+    "notes:note-changes",
+    "notes:note-export",
+    "notes:note-revision-list",
+    "notes:note-revision-detail",
+}
+# Shed under severe overload only: autosaves (the editor resends unsaved edits) and other note requests.
+NORMAL_PRIORITY_VIEWS = {
+    "notes:note-detail",
+    "notes:note-create",
+    "notes:note-update",
+    "notes:note-bulk",
+}
+# Throttled requests per scope, for /metrics
+THROTTLE_COUNTS = {}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket per user and `scope`, configured in THROTTLE_BUCKETS as (rate per second, burst)."""
+
+    scope = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED or not request.user.is_authenticated:
+            return True
+        rate, burst = settings.THROTTLE_BUCKETS[self.scope]
+        key = f"throttle:{self.scope}:{request.user.pk}"
+        now = time.time()
+        tokens, updated_at = cache.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        # An untouched bucket is full again after burst / rate seconds, so it can expire then.
+        timeout = math.ceil(burst / rate)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / rate
+            cache.set(key, (tokens, now), timeout)
+            THROTTLE_COUNTS[self.scope] = THROTTLE_COUNTS.get(self.scope, 0) + 1
+            return False
+        cache.set(key, (tokens - 1, now), timeout)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AutosaveThrottle(TokenBucketThrottle):
+    scope = "autosave"
+
+
+class ListThrottle(TokenBucketThrottle):
+    scope = "list"
+
+
+class LoadMonitor:
+    """Recent request timings of this process and the shedding level they call for."""
+
+    # Fewer samples than this in the window never trigger shedding.
+    MIN_SAMPLES = 20
+    # The level is recomputed at most this often (seconds).
+    RECHECK_INTERVAL = 0.25
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._samples = deque()
+        self._checked_at = 0.0
+        self.level = 0
+        self.shed = 0
+
+    def observe(self, seconds, db_seconds):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, db_seconds))
+
+    def should_shed(self, priority):
+        """Whether to turn away a request of the given priority (LOW or NORMAL) now."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.RECHECK_INTERVAL:
+            self._update_level(now)
+        if priority is not None and priority <= self.level:
+            self.shed += 1
+            return True
+        return False
+
+    def _update_level(self, now):
+        with self._lock:
+            self._checked_at = now
+            while self._samples and now - self._samples[0][0] > settings.LOAD_SHEDDING_WINDOW:
+                self._samples.popleft()
+            samples = list(self._samples)
+        if len(samples) < self.MIN_SAMPLES:
+            self.level = 0
+            return
+        index = math.ceil(len(samples) * 0.95) - 1
+        latency = sorted(sample[1] for sample in samples)[index]
+        db_time = sorted(sample[2] for sample in samples)[index]
+        overload = max(
+            latency * 1000 / settings.LOAD_SHEDDING_TARGET_MS,
+            db_time * 1000 / settings.LOAD_SHEDDING_DB_TARGET_MS,
+        )
+        if overload >= settings.LOAD_SHEDDING_SEVERE:
+            self.level = NORMAL
+        elif overload >= 1:
+            self.level = LOW
+        else:
+            self.level = 0
+
+
+load_monitor = LoadMonitor()
+
+
+def view_priority(view_name):
+    """LOW or NORMAL for views that may be shed, None for the rest."""
+    if view_name in LOW_PRIORITY_VIEWS:
+        return LOW
+    if view_name in NORMAL_PRIORITY_VIEWS:
+        return NORMAL
+    return None
+
+
+def collect_metrics():
+    """Throttling and shedding counters for the /metrics endpoint."""
+    samples = [
+        ("http_load_shedding_level", "gauge", "0: serving everything, 1: shedding low-priority reads, "
+         "2: also shedding autosaves.", load_monitor.level),
+        ("http_load_shed_total", "counter", "Requests turned away by load shedding.", load_monitor.shed),
+    ]
+    for scope in settings.THROTTLE_BUCKETS:
+        samples.append(
+            (f"http_throttled_{scope}_total", "counter", f"Requests over the {scope} token bucket.",
+             THROTTLE_COUNTS.get(scope, 0))
+        )
+    return samples
+
+
+registry.register_collector(collect_metrics)
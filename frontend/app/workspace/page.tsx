@@ -1,24 +1,27 @@
 "use client";
 
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { useAuth } from "@/lib/auth-context";
 import { useRouter } from "next/navigation";
 import { WorkspaceNavbar } from "@/components/notes/workspace-navbar";
 import { CategorySidebar } from "@/components/notes/category-sidebar";
 import { NotesGrid } from "@/components/notes/notes-grid";
 import { NoteEditor } from "@/components/notes/note-editor";
-import { getCategories, getNotes, createNote } from "@/lib/api";
-import type { Category, Note } from "@/types";
+import { getNote, getNotes, getWorkspaceBootstrap, createNote, subscribeToNoteEvents } from "@/lib/api";
+import type { Category, Note, NoteEvent, NoteSummary, WorkspaceBootstrap } from "@/types";
 
 export default function WorkspacePage() {
-  const { user, isLoading: authLoading } = useAuth();
+  const { user, isLoading: authLoading, takeBootstrap } = useAuth();
   const router = useRouter();
   const [categories, setCategories] = useState<Category[]>([]);
-  const [notes, setNotes] = useState<Note[]>([]);
+  const [notes, setNotes] = useState<NoteSummary[]>([]);
   const [selectedCategoryId, setSelectedCategoryId] = useState<string | null>(null);
   const [selectedNote, setSelectedNote] = useState<Note | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [isCreating, setIsCreating] = useState(false);
+  // While the change stream is open, saves show up through it instead of a reload.
+  const isLive = useRef(false);
+  const categoryFilter = useRef<string | null>(null);
 
   useEffect(() => {
     if (!authLoading && !user) {
@@ -28,19 +31,37 @@ export default function WorkspacePage() {
 
   useEffect(() => {
     if (user) {
-      loadData();
+      const bootstrap = takeBootstrap();
+      if (bootstrap) {
+        showData(bootstrap);
+        setIsLoading(false);
+      } else {
+        loadData();
+      }
     }
   }, [user]);
 
+  useEffect(() => {
+    if (!user) return;
+    isLive.current = true;
+    const close = subscribeToNoteEvents(applyEvent, () => {
+      isLive.current = false;
+    });
+    return () => {
+      isLive.current = false;
+      close();
+    };
+  }, [user]);
+
+  function showData(data: WorkspaceBootstrap) {
+    setCategories(data.categories);
+    setNotes(data.notes.results);
+  }
+
   async function loadData() {
     setIsLoading(true);
     try {
-      const [categoriesData, notesData] = await Promise.all([
-        getCategories(),
-        getNotes(),
-      ]);
-      setCategories(categoriesData);
-      setNotes(notesData);
+      showData(await getWorkspaceBootstrap());
     } catch (error) {
       console.error("Failed to load data:", error);
     } finally {
@@ -48,12 +69,49 @@ export default function WorkspacePage() {
     }
   }
 
+  function applyEvent(event: NoteEvent) {
+    switch (event.type) {
+      case "note.upserted":
+        setNotes((current) => {
+          const existing = current.find((note) => note.id === event.note.id);
+          // Autosaves carry only the changed fields, so unknown notes need a full summary.
+          if (!existing && !("category" in event.note)) return current;
+          const note = { ...existing, ...event.note } as NoteSummary;
+          const others = current.filter((other) => other.id !== note.id);
+          if (categoryFilter.current && note.category !== categoryFilter.current) return others;
+          // The list is newest first, and the note was just edited.
+          return [note, ...others];
+        });
+        break;
+      case "note.moved":
+        if (categoryFilter.current && event.to !== categoryFilter.current) {
+          setNotes((current) => current.filter((note) => note.id !== event.id));
+        }
+        break;
+      case "note.deleted":
+        setNotes((current) => current.filter((note) => note.id !== event.id));
+        break;
+      case "counts":
+        setCategories((current) =>
+          current.map((category) => ({
+            ...category,
+            note_count: category.note_count + (event.deltas[category.id] ?? 0),
+          }))
+        );
+        break;
+      case "resync":
+        loadData();
+        break;
+    }
+  }
+
   async function handleCategorySelect(categoryId: string | null) {
     setSelectedCategoryId(categoryId);
+    categoryFilter.current = categoryId;
     setIsLoading(true);
     try {
       const notesData = await getNotes(categoryId || undefined);
-      setNotes(notesData);
+      setNotes(notesData.results);
     } catch (error) {
       console.error("Failed to load notes:", error);
     } finally {
@@ -73,7 +131,7 @@ export default function WorkspacePage() {
         category: defaultCategory.id,
       });
       setSelectedNote(newNote);
-      await loadData();
+      if (!isLive.current) await loadData();
     } catch (error) {
       console.error("Failed to create note:", error);
     } finally {
@@ -81,8 +139,13 @@ export default function WorkspacePage() {
     }
   }
 
-  function handleNoteClick(note: Note) {
-    setSelectedNote(note);
+  async function handleNoteClick(note: NoteSummary) {
+    try {
+      // The list only carries previews; load the full content for the editor.
+      setSelectedNote(await getNote(note.id));
+    } catch (error) {
+      console.error("Failed to load note:", error);
+    }
   }
 
   function handleCloseEditor() {
@@ -90,7 +153,7 @@ export default function WorkspacePage() {
   }
 
   async function handleSaveNote() {
-    await loadData();
+    if (!isLive.current) await loadData();
   }
 
   if (authLoading || !user) {
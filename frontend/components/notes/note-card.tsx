@@ -2,10 +2,10 @@
 
 import { formatFriendlyDate, truncateText } from "@/lib/utils";
 import { getCategoryColor } from "@/lib/design-tokens";
-import type { Note } from "@/types";
+import type { NoteSummary } from "@/types";
 
 interface NoteCardProps {
-  note: Note;
+  note: NoteSummary;
   onClick: () => void;
 }
 
@@ -36,7 +36,7 @@ export function NoteCard({ note, onClick }: NoteCardProps) {
         </h3>
 
         <p className="text-xs text-black line-clamp-6 overflow-hidden">
-          {truncateText(note.content, 200)}
+          {truncateText(note.preview, 200)}
         </p>
       </div>
     </button>
@@ -1,10 +1,11 @@
 "use client";
 
-import { useEffect, useState, useCallback } from "react";
+import { useEffect, useState, useCallback, useRef } from "react";
+import { isAxiosError } from "axios";
 import { getCategoryColor } from "@/lib/design-tokens";
-import { formatLastEdited, debounce } from "@/lib/utils";
-import { updateNote } from "@/lib/api";
-import type { Category, Note } from "@/types";
+import { formatLastEdited, debounce, diffText } from "@/lib/utils";
+import { flushNote, patchNoteText, updateNote } from "@/lib/api";
+import type { Category, Note, TextOperation } from "@/types";
 
 interface NoteEditorProps {
   note: Note;
@@ -25,6 +26,10 @@ export function NoteEditor({
   const [isSaving, setIsSaving] = useState(false);
   const [showDropdown, setShowDropdown] = useState(false);
   const [lastEdited, setLastEdited] = useState(note.last_edited_at);
+  // Last state the server acknowledged; autosaves send only the edits made since.
+  const saved = useRef({ title: note.title, content: note.content, version: note.version });
+  // Whether autosaves were sent that the server may still be buffering
+  const hasUnflushedEdits = useRef(false);
 
   const selectedCategory = categories.find((c) => c.id === categoryId);
   const categoryColors = getCategoryColor(selectedCategory?.name || "");
@@ -38,6 +43,11 @@ export function NoteEditor({
     setIsSaving(true);
     try {
       const updatedNote = await updateNote(note.id, updates);
+      saved.current = {
+        title: updatedNote.title,
+        content: updatedNote.content,
+        version: updatedNote.version,
+      };
       setLastEdited(updatedNote.last_edited_at);
     } catch (error) {
       console.error("Failed to save note:", error);
@@ -46,10 +56,43 @@ export function NoteEditor({
     }
   };
 
+  // Send only the text edits made since the last acknowledged version.
+  // A final save (editor closing) also asks the server to write buffered autosaves.
+  const saveText = async (title: string, content: string, final = false) => {
+    const ops: TextOperation[] = [];
+    const titleOp = diffText(saved.current.title, title);
+    if (titleOp) ops.push({ field: "title", ...titleOp });
+    const contentOp = diffText(saved.current.content, content);
+    if (contentOp) ops.push({ field: "content", ...contentOp });
+    if (ops.length === 0) {
+      if (final && hasUnflushedEdits.current) {
+        await flushNote(note.id).catch((error) => console.error("Failed to save note:", error));
+      }
+      return;
+    }
+
+    setIsSaving(true);
+    try {
+      const result = await patchNoteText(note.id, saved.current.version, ops, final);
+      saved.current = { title, content, version: result.version };
+      hasUnflushedEdits.current = !final;
+      setLastEdited(result.last_edited_at);
+    } catch (error) {
+      if (isAxiosError(error) && error.response?.status === 409) {
+        // The note changed elsewhere; fall back to writing the full text.
+        await saveChanges({ title, content });
+      } else {
+        console.error("Failed to save note:", error);
+      }
+    } finally {
+      setIsSaving(false);
+    }
+  };
+
   // Debounced autosave for typing
   const debouncedSave = useCallback(
     debounce((title: string, content: string) => {
-      saveChanges({ title, content });
+      saveText(title, content);
     }, 1000),
     [note.id]
   );
@@ -75,9 +118,7 @@ export function NoteEditor({
 
   // Save on close
   async function handleClose() {
-    if (title !== note.title || content !== note.content || categoryId !== note.category) {
-      await saveChanges({ title, content, category: categoryId });
-    }
+    await saveText(title, content, true);
     onSave();
     onClose();
   }
@@ -1,11 +1,11 @@
 "use client";
 
 import { NoteCard } from "./note-card";
-import type { Note } from "@/types";
+import type { NoteSummary } from "@/types";
 
 interface NotesGridProps {
-  notes: Note[];
-  onNoteClick: (note: Note) => void;
+  notes: NoteSummary[];
+  onNoteClick: (note: NoteSummary) => void;
 }
 
 export function NotesGrid({ notes, onNoteClick }: NotesGridProps) {
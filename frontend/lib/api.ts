@@ -3,10 +3,15 @@ import type {
   Category,
   CreateNoteData,
   Note,
+  NoteEvent,
+  NotePage,
+  NoteVersion,
   SignInData,
   SignUpData,
+  TextOperation,
   UpdateNoteData,
   User,
+  WorkspaceBootstrap,
 } from "@/types";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
@@ -74,6 +79,13 @@ export async function getCurrentUser(): Promise<User> {
   return response.data;
 }
 
+// Workspace API
+// The user, CSRF cookie, categories and first page of notes in one request
+export async function getWorkspaceBootstrap(): Promise<WorkspaceBootstrap> {
+  const response = await api.get<WorkspaceBootstrap>("/workspace/bootstrap/");
+  return response.data;
+}
+
 // Categories API
 export async function getCategories(): Promise<Category[]> {
   const response = await api.get<Category[]>("/categories/");
@@ -81,9 +93,12 @@ export async function getCategories(): Promise<Category[]> {
 }
 
 // Notes API
-export async function getNotes(categoryId?: string): Promise<Note[]> {
-  const params = categoryId ? { categoryId } : {};
-  const response = await api.get<Note[]>("/notes/", { params });
+export async function getNotes(categoryId?: string, cursor?: string): Promise<NotePage> {
+  const params = {
+    ...(categoryId ? { categoryId } : {}),
+    ...(cursor ? { cursor } : {}),
+  };
+  const response = await api.get<NotePage>("/notes/", { params });
   return response.data;
 }
 
@@ -105,4 +120,41 @@ export async function updateNote(
   return response.data;
 }
 
+export async function patchNoteText(
+  id: string,
+  version: number,
+  ops: TextOperation[],
+  flush = false
+): Promise<NoteVersion> {
+  const params = flush ? { flush: 1 } : {};
+  const response = await api.patch<NoteVersion>(`/notes/${id}/update/`, { version, ops }, { params });
+  return response.data;
+}
+
+// Write any autosaves the server is still buffering for this note
+export async function flushNote(id: string): Promise<Note> {
+  const response = await api.patch<Note>(`/notes/${id}/update/`, {}, { params: { flush: 1 } });
+  return response.data;
+}
+
+// Change events API
+const NOTE_EVENT_TYPES: NoteEvent["type"][] = ["note.upserted", "note.moved", "note.deleted", "counts", "resync"];
+
+// Listen for the user's note changes, from this tab and others. The browser
+// reconnects by itself; onUnavailable runs when the server does not offer
+// events (e.g. under WSGI). Returns a function that closes the stream.
+export function subscribeToNoteEvents(
+  onEvent: (event: NoteEvent) => void,
+  onUnavailable: () => void
+): () => void {
+  const source = new EventSource(`${API_URL}/events/`, { withCredentials: true });
+  for (const type of NOTE_EVENT_TYPES) {
+    source.addEventListener(type, (message) => onEvent(JSON.parse((message as MessageEvent).data)));
+  }
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) onUnavailable();
+  };
+  return () => source.close();
+}
+
 export default api;
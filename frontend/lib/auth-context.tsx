@@ -1,13 +1,22 @@
 "use client";
 
-import { createContext, useContext, useEffect, useState } from "react";
-import { useRouter } from "next/navigation";
-import { fetchCsrfToken, getCurrentUser, signIn as apiSignIn, signOut as apiSignOut, signUp as apiSignUp } from "./api";
-import type { SignInData, SignUpData, User } from "@/types";
+import { createContext, useContext, useEffect, useRef, useState } from "react";
+import { usePathname, useRouter } from "next/navigation";
+import {
+  fetchCsrfToken,
+  getCurrentUser,
+  getWorkspaceBootstrap,
+  signIn as apiSignIn,
+  signOut as apiSignOut,
+  signUp as apiSignUp,
+} from "./api";
+import type { SignInData, SignUpData, User, WorkspaceBootstrap } from "@/types";
 
 interface AuthContextType {
   user: User | null;
   isLoading: boolean;
+  // Workspace data loaded along with the user when the app opened on the workspace
+  takeBootstrap: () => WorkspaceBootstrap | null;
   signIn: (data: SignInData) => Promise<void>;
   signUp: (data: SignUpData) => Promise<void>;
   signOut: () => Promise<void>;
@@ -19,6 +28,8 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   const [user, setUser] = useState<User | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const router = useRouter();
+  const pathname = usePathname();
+  const bootstrap = useRef<WorkspaceBootstrap | null>(null);
 
   useEffect(() => {
     checkAuth();
@@ -26,8 +37,13 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
 
   async function checkAuth() {
     try {
-      const currentUser = await getCurrentUser();
-      setUser(currentUser);
+      if (pathname?.startsWith("/workspace")) {
+        // One round trip loads the user and everything the workspace shows.
+        bootstrap.current = await getWorkspaceBootstrap();
+        setUser(bootstrap.current.user);
+      } else {
+        setUser(await getCurrentUser());
+      }
     } catch (error) {
       setUser(null);
     } finally {
@@ -35,6 +51,12 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
     }
   }
 
+  function takeBootstrap() {
+    const data = bootstrap.current;
+    bootstrap.current = null;
+    return data;
+  }
+
   async function signIn(data: SignInData) {
     const userData = await apiSignIn(data);
     setUser(userData);
@@ -54,7 +76,7 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   }
 
   return (
-    <AuthContext.Provider value={{ user, isLoading, signIn, signUp, signOut }}>
+    <AuthContext.Provider value={{ user, isLoading, takeBootstrap, signIn, signUp, signOut }}>
       {children}
     </AuthContext.Provider>
   );
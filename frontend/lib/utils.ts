@@ -85,6 +85,39 @@ export function debounce<T extends (...args: unknown[]) => unknown>(
   };
 }
 
+/**
+ * Describe the change from `previous` to `next` as one splice operation.
+ * Positions count Unicode code points to match the server's string indexing.
+ * Returns null when the texts are equal.
+ */
+export function diffText(
+  previous: string,
+  next: string
+): { pos: number; delete: number; insert: string } | null {
+  if (previous === next) return null;
+
+  const before = Array.from(previous);
+  const after = Array.from(next);
+  let prefix = 0;
+  while (prefix < before.length && prefix < after.length && before[prefix] === after[prefix]) {
+    prefix++;
+  }
+  let suffix = 0;
+  while (
+    suffix < before.length - prefix &&
+    suffix < after.length - prefix &&
+    before[before.length - 1 - suffix] === after[after.length - 1 - suffix]
+  ) {
+    suffix++;
+  }
+
+  return {
+    pos: prefix,
+    delete: before.length - prefix - suffix,
+    insert: after.slice(prefix, after.length - suffix).join(""),
+  };
+}
+
 /**
  * Combine class names
  */
@@ -17,14 +17,42 @@ export interface Note {
   id: string;
   title: string;
   content: string;
+  word_count: number;
+  char_count: number;
   category: string;
   category_name: string;
   category_color: string;
   created_at: string;
   updated_at?: string;
   last_edited_at: string;
+  version: number;
 }
 
+export interface NoteSummary extends Omit<Note, "content" | "updated_at" | "version"> {
+  preview: string;
+}
+
+export interface NotePage {
+  next: string | null;
+  results: NoteSummary[];
+}
+
+// Response of GET /api/workspace/bootstrap/
+export interface WorkspaceBootstrap {
+  user: User;
+  csrfToken: string;
+  categories: Category[];
+  notes: NotePage;
+}
+
+// Change events pushed by GET /api/events/
+export type NoteEvent =
+  | { type: "note.upserted"; note: Partial<NoteSummary> & { id: string } }
+  | { type: "note.moved"; id: string; from: string; to: string }
+  | { type: "note.deleted"; id: string }
+  | { type: "counts"; deltas: Record<string, number> }
+  | { type: "resync" };
+
 export interface SignUpData {
   email: string;
   password: string;
@@ -41,6 +69,21 @@ export interface CreateNoteData {
   category: string;
 }
 
+export interface TextOperation {
+  field: "title" | "content";
+  pos: number;
+  delete: number;
+  insert: string;
+}
+
+export interface NoteVersion {
+  id: string;
+  version: number;
+  word_count: number;
+  char_count: number;
+  last_edited_at: string;
+}
+
 export interface UpdateNoteData {
   title?: string;
   content?: string;